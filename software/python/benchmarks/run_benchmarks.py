@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2023 NextWheel Developers
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the parsing, fetching and analysis hot paths of nextwheel.
+
+The benchmarks run on synthetic recordings of several durations and sampling
+rates (see nextwheel.synthetic). For each benchmark, the throughput in frames/s
+and MB/s, the peak memory allocated and the latency of each call are written
+to a JSON file, which can be compared with the results of another version:
+
+    python benchmarks/run_benchmarks.py --output new.json
+    python benchmarks/run_benchmarks.py --output new.json --compare old.json
+
+Use --quick for a short run, e.g. to check that the benchmarks still work.
+
+The benchmarks only use the public read_dat and the streaming path of
+NextWheel when the other functions are missing, so that they also run on
+older versions. Versions without nextwheel.synthetic cannot generate the
+recordings: keep the recordings generated by a newer version, and pass them
+to the older one:
+
+    python benchmarks/run_benchmarks.py --output new.json --keep recordings
+    python benchmarks/run_benchmarks.py --output old.json \\
+        --recordings recordings
+"""
+
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+import nextwheel
+
+try:
+    from nextwheel.synthetic import generate_dat
+except ImportError:  # Older versions: use --recordings
+    generate_dat = None
+
+# Sampling rates of the synthetic recordings, in Hz
+RATES = {
+    "default": {"adc_rate": 2000, "imu_rate": 240, "encoder_rate": 240},
+    "high": {"adc_rate": 8000, "imu_rate": 1000, "encoder_rate": 1000},
+}
+
+# Durations of the synthetic recordings, in seconds
+DURATIONS = [10, 60, 600]
+QUICK_DURATIONS = [10]
+
+# Number of frames in each message of the simulated stream. The wheel sends
+# messages of about 1400 bytes, i.e., about 48 ADC frames.
+MESSAGE_FRAMES = 48
+
+# Number of messages between two fetches of the simulated stream
+FETCH_PERIOD = 10
+
+# Maximal duration of the recordings used to benchmark the streaming, in
+# seconds. Every message of the recording is kept in memory, and older
+# versions parse them frame by frame, which is slow on long recordings.
+STREAM_MAX_DURATION = 60
+
+# Length of the header of each frame, in bytes
+HEADER_LENGTH = 10
+
+# Type of the superframes, which group the frames of a message
+SUPERFRAME = 255
+
+
+def _stream_messages(recording: bytes) -> tuple[list[bytes], int]:
+    """
+    Group the frames of a recording in messages, as streamed by the wheel.
+
+    Parameters
+    ----------
+    recording
+        The content of a dat file.
+
+    Returns
+    -------
+    messages
+        One superframe of at most MESSAGE_FRAMES frames per message.
+    frames
+        The number of frames of the recording.
+
+    """
+    offsets = []  # type: list[int]
+    offset = 0
+    while offset + HEADER_LENGTH <= len(recording):
+        offsets.append(offset)
+        offset += HEADER_LENGTH + recording[offset + HEADER_LENGTH - 1]
+    offsets.append(offset)
+
+    messages = []  # type: list[bytes]
+    for first in range(0, len(offsets) - 1, MESSAGE_FRAMES):
+        last = min(first + MESSAGE_FRAMES, len(offsets) - 1)
+        start = offsets[first]
+        header = bytearray(recording[start : start + HEADER_LENGTH])
+        header[0] = SUPERFRAME
+        header[-1] = last - first
+        messages.append(bytes(header) + recording[start : offsets[last]])
+    return messages, len(offsets) - 1
+
+
+def _decoder(nw: nextwheel.NextWheel) -> Callable[[bytes], object]:
+    """Return the function that parses a message, without any queue."""
+    if hasattr(nw, "_decode_message"):
+        return nw._decode_message
+    return lambda message: nw._on_message(None, message)  # Older versions
+
+
+def _accepts(function: Callable, *names: str) -> bool:
+    """Tell whether a function accepts every one of these keywords."""
+    return all(
+        name in inspect.signature(function).parameters for name in names
+    )
+
+
+def _new_wheel(max_samples: int) -> nextwheel.NextWheel:
+    """Create a NextWheel that is not connected to any wheel."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        nw = nextwheel.NextWheel("127.0.0.1")
+    nw.max_imu_samples = max_samples
+    nw.max_analog_samples = max_samples
+    nw.max_encoder_samples = max_samples
+    nw.max_power_samples = max_samples
+    return nw
+
+
+def _measure(
+    function: Callable[[], object], repeats: int
+) -> tuple[list[float], int]:
+    """
+    Time a function and measure its peak memory.
+
+    The function is timed without tracing the memory allocations, then run
+    once more with tracemalloc to measure its peak memory.
+
+    Parameters
+    ----------
+    function
+        The function to benchmark. Its latency is the duration of one call.
+    repeats
+        The number of timed calls.
+
+    Returns
+    -------
+    latencies
+        The duration of each call, in seconds.
+    peak_memory
+        The peak memory allocated during one call, in bytes.
+
+    """
+    latencies = []  # type: list[float]
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return latencies, peak_memory
+
+
+def _summarize(latencies: list[float]) -> dict[str, float]:
+    """Return the statistics of a series of latencies, in seconds."""
+    values = np.array(latencies)
+    return {
+        "min": float(values.min()),
+        "median": float(np.median(values)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def _result(
+    name: str,
+    recording: dict,
+    latencies: list[float],
+    peak_memory: int,
+    *,
+    frames: int,
+    size: int,
+    call_latencies: list[float] | None = None,
+) -> dict:
+    """
+    Build the result of one benchmark.
+
+    Parameters
+    ----------
+    name
+        The name of the benchmark.
+    recording
+        The description of the synthetic recording.
+    latencies
+        The duration of each run of the benchmark, in seconds.
+    peak_memory
+        The peak memory allocated during one run, in bytes.
+    frames, size
+        The number of frames and bytes processed in each run.
+    call_latencies
+        Optional. The duration of each call within the runs, when a run
+        makes many calls (e.g. one per message). The default is to use
+        latencies.
+
+    Returns
+    -------
+    dict
+        The result, as written in the JSON file.
+
+    """
+    best = min(latencies)
+    return {
+        "benchmark": name,
+        "recording": recording["name"],
+        "duration": recording["duration"],
+        "rates": recording["rates"],
+        "frames": frames,
+        "bytes": size,
+        "runs": len(latencies),
+        "time": _summarize(latencies),
+        "frames_per_s": frames / best,
+        "mb_per_s": size / best / 1e6,
+        "peak_memory": peak_memory,
+        "latency": _summarize(
+            latencies if call_latencies is None else call_latencies
+        ),
+    }
+
+
+def bench_read_dat(recording: dict, repeats: int) -> list[dict]:
+    """Benchmark read_dat, iter_dat and the force calibration."""
+    filename = recording["filename"]
+    frames = recording["frames"]
+    size = recording["bytes"]
+    duration = recording["duration"]
+    results = []  # type: list[dict]
+
+    def read_channels(**kwargs) -> None:
+        data = nextwheel.read_dat(filename, **kwargs)
+        for sensor in data.values():
+            for values in sensor.values():
+                np.asarray(values)
+
+    variants = {
+        "read_dat": {},
+        "read_dat_mmap": {"mmap": True},
+        "read_dat_float32": {"dtype": "float32"},
+        "read_dat_raw": {"dtype": "raw"},
+        "read_dat_us": {"timebase": "us"},
+    }
+    for name, kwargs in variants.items():
+        if not _accepts(nextwheel.read_dat, *kwargs):
+            continue
+        latencies, peak_memory = _measure(
+            lambda: read_channels(**kwargs), repeats
+        )
+        results.append(
+            _result(
+                name,
+                recording,
+                latencies,
+                peak_memory,
+                frames=frames,
+                size=size,
+            )
+        )
+
+    # Time range of 10 % of the recording, with a warm index
+    if hasattr(nextwheel, "index_dat"):
+        nextwheel.index_dat(filename)
+        latencies, peak_memory = _measure(
+            lambda: read_channels(
+                t_start=0.45 * duration, t_end=0.55 * duration
+            ),
+            repeats,
+        )
+        results.append(
+            _result(
+                "read_dat_time_range",
+                recording,
+                latencies,
+                peak_memory,
+                frames=frames // 10,
+                size=size // 10,
+            )
+        )
+        os.remove(filename + ".idx")
+
+    if not hasattr(nextwheel, "iter_dat"):
+        return results
+
+    def iterate() -> None:
+        for _ in nextwheel.iter_dat(filename, chunk_size=1 << 22):
+            pass
+
+    latencies, peak_memory = _measure(iterate, repeats)
+    results.append(
+        _result(
+            "iter_dat",
+            recording,
+            latencies,
+            peak_memory,
+            frames=frames,
+            size=size,
+        )
+    )
+
+    # Analysis: force calibration with a 6x6 matrix
+    if not hasattr(nextwheel, "DatDecoder"):
+        return results
+    decoder = nextwheel.DatDecoder()
+    decoder.CALIBRATION_MATRIX = np.eye(6) * 0.01
+    decoder.CALIBRATION_OFFSET = np.full(6, -32768.0)
+    forces = nextwheel.read_dat(filename, sensors=["Analog"])["Analog"]
+    latencies, peak_memory = _measure(
+        lambda: decoder._calibrate_forces(forces["Force"]), repeats
+    )
+    results.append(
+        _result(
+            "calibrate_forces",
+            recording,
+            latencies,
+            peak_memory,
+            frames=len(forces["Time"]),
+            size=forces["Force"].nbytes,
+        )
+    )
+    return results
+
+
+def bench_streaming(recording: dict, repeats: int) -> list[dict]:
+    """Benchmark the parsing of streamed messages and fetch."""
+    messages = recording["messages"]
+    frames = recording["frames"]
+    size = sum(len(message) for message in messages)
+    results = []  # type: list[dict]
+
+    # Parsing only, without contention
+    message_latencies = []  # type: list[float]
+
+    def parse() -> None:
+        decode = _decoder(_new_wheel(frames))
+        for message in messages:
+            start = time.perf_counter()
+            decode(message)
+            message_latencies.append(time.perf_counter() - start)
+
+    latencies, peak_memory = _measure(parse, repeats)
+    del message_latencies[repeats * len(messages) :]  # Traced run
+    results.append(
+        _result(
+            "on_message",
+            recording,
+            latencies,
+            peak_memory,
+            frames=frames,
+            size=size,
+            call_latencies=message_latencies,
+        )
+    )
+
+    # Parsing with a fetch every FETCH_PERIOD messages
+    fetch_latencies = []  # type: list[float]
+
+    def parse_and_fetch() -> None:
+        nw = _new_wheel(frames)
+        decode = _decoder(nw)
+        for i_message, message in enumerate(messages):
+            decode(message)
+            if i_message % FETCH_PERIOD == FETCH_PERIOD - 1:
+                start = time.perf_counter()
+                nw.fetch()
+                fetch_latencies.append(time.perf_counter() - start)
+
+    latencies, peak_memory = _measure(parse_and_fetch, repeats)
+    del fetch_latencies[repeats * (len(messages) // FETCH_PERIOD) :]
+    results.append(
+        _result(
+            "on_message_fetch",
+            recording,
+            latencies,
+            peak_memory,
+            frames=frames,
+            size=size,
+            call_latencies=fetch_latencies,
+        )
+    )
+    return results
+
+
+def make_recording(
+    directory: str, rate_name: str, duration: float, *, generate: bool = True
+) -> dict:
+    """
+    Generate a synthetic recording.
+
+    Parameters
+    ----------
+    directory
+        The directory where the dat file is written.
+    rate_name
+        The sampling rates of the recording, as a key of RATES.
+    duration
+        The duration of the recording, in seconds.
+    generate
+        Optional. If False, use the dat file already in directory, e.g.,
+        generated by a newer version. The default is True.
+
+    Returns
+    -------
+    dict
+        The description of the recording, with its filename, its number of
+        frames and bytes, and the messages that the wheel would send to
+        stream it (only for recordings of at most STREAM_MAX_DURATION).
+
+    """
+    rates = RATES[rate_name]
+    name = f"{rate_name}_{duration}s"
+    filename = os.path.join(directory, name + ".dat")
+    if generate:
+        generate_dat(filename, duration, seed=0, **rates)
+
+    with open(filename, "rb") as fid:
+        messages, frames = _stream_messages(fid.read())
+    recording = {
+        "name": name,
+        "filename": filename,
+        "duration": duration,
+        "rates": rates,
+        "bytes": os.path.getsize(filename),
+        "frames": frames,
+        "messages": messages if duration <= STREAM_MAX_DURATION else [],
+    }
+    return recording
+
+
+def _environment() -> dict:
+    """Describe the machine and the versions that ran the benchmarks."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: dict, reference: dict) -> None:
+    """Print the speed-up of each benchmark relative to a reference."""
+    reference_results = {
+        (result["benchmark"], result["recording"]): result
+        for result in reference["results"]
+    }
+    print(
+        f"{'benchmark':<22}{'recording':<16}"
+        f"{'frames/s':>14}{'speed-up':>10}{'memory':>10}"
+    )
+    for result in results["results"]:
+        key = (result["benchmark"], result["recording"])
+        line = f"{key[0]:<22}{key[1]:<16}{result['frames_per_s']:>14.4g}"
+        if key in reference_results:
+            old = reference_results[key]
+            speed_up = result["frames_per_s"] / old["frames_per_s"]
+            memory = result["peak_memory"] / max(old["peak_memory"], 1)
+            line += f"{speed_up:>9.2f}x{memory:>9.2f}x"
+        print(line)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="JSON file where the results are written",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="REFERENCE",
+        help="JSON file of previous results to compare with",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only use short recordings, with fewer repeats",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="number of timed runs"
+    )
+    parser.add_argument(
+        "--only",
+        choices=["read", "stream"],
+        help="only run the file or the streaming benchmarks",
+    )
+    parser.add_argument(
+        "--keep",
+        metavar="DIRECTORY",
+        help="keep the generated recordings in this directory",
+    )
+    parser.add_argument(
+        "--recordings",
+        metavar="DIRECTORY",
+        help="use the recordings kept by --keep instead of generating them",
+    )
+    args = parser.parse_args(argv)
+    if args.recordings is None and generate_dat is None:
+        parser.error(
+            "This version of nextwheel cannot generate the recordings. Use "
+            "--recordings with recordings kept by a newer version."
+        )
+
+    durations = QUICK_DURATIONS if args.quick else DURATIONS
+    repeats = 2 if args.quick else args.repeats
+
+    results = {"environment": _environment(), "results": []}
+    with contextlib.ExitStack() as stack:
+        directory = args.recordings or args.keep
+        if directory is None:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(directory, exist_ok=True)
+        for rate_name in RATES:
+            for duration in durations:
+                recording = make_recording(
+                    directory,
+                    rate_name,
+                    duration,
+                    generate=args.recordings is None,
+                )
+                print(
+                    f"{recording['name']}: {recording['frames']} frames, "
+                    f"{recording['bytes'] / 1e6:.1f} MB",
+                    file=sys.stderr,
+                )
+                if args.only != "stream":
+                    results["results"] += bench_read_dat(recording, repeats)
+                if args.only != "read" and len(recording["messages"]) > 0:
+                    results["results"] += bench_streaming(recording, repeats)
+                if args.keep is None and args.recordings is None:
+                    os.remove(recording["filename"])
+
+    with open(args.output, "w") as fid:
+        json.dump(results, fid, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as fid:
+            compare(results, json.load(fid))
+    else:
+        compare(results, {"results": []})
+    return results
+
+
+if __name__ == "__main__":
+    main()
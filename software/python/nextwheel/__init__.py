@@ -20,18 +20,40 @@ intrumented wheel.
 """
 
 import websocket
-import struct
+import socket
 import threading
+import queue
+import traceback
+import logging
 import numpy as np
 from enum import IntEnum
 import requests
 import os
 import json
+import copy
+import hashlib
+import shutil
+import tempfile
+import mmap as memory_map
+from bisect import bisect_left
+from collections.abc import Mapping
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from multiprocessing import resource_tracker, shared_memory
+from time import perf_counter, sleep
+from typing import Any, Callable, Iterator
 
 # Constants
 
 GRAVITY = 9.80665
 
+# Logger of the periodic streaming statistics (see NextWheel.start_streaming)
+_logger = logging.getLogger(__name__)
+
 
 class FrameType(IntEnum):
     """Identify frame type from websocket message."""
@@ -44,6 +66,495 @@ class FrameType(IntEnum):
     SUPERFRAME = 255
 
 
+# Binary layout of the frames, as written by the firmware. Every frame starts
+# with a 10-byte header (frame type, timestamp in microseconds, data size),
+# followed by data_size bytes of payload. The superframe header is followed by
+# data_size complete frames instead of a payload.
+HEADER_DTYPE = np.dtype(
+    [("type", "u1"), ("timestamp", "<u8"), ("size", "u1")]
+)
+CONFIG_DTYPE = np.dtype(
+    [
+        ("accel_range", "<u4"),
+        ("gyro_range", "<u4"),
+        ("mag_range", "<u4"),
+        ("imu_sampling_rate", "<u4"),
+        ("adc_sampling_rate", "<u4"),
+        ("encoder_sampling_rate", "<u4"),
+    ]
+)
+ADC_DTYPE = np.dtype([("force", "<u2", (6,)), ("spare", "<u2", (2,))])
+IMU_DTYPE = np.dtype(
+    [("accel", "<i2", (3,)), ("gyro", "<i2", (3,)), ("mag", "<i2", (3,))]
+)
+POWER_DTYPE = np.dtype(
+    [
+        ("voltage", "<f4"),
+        ("current", "<f4"),
+        ("power", "<f4"),
+        ("state", "u1"),
+    ]
+)
+ENCODER_DTYPE = np.dtype([("angle", "<i8")])
+
+PAYLOAD_DTYPES = {
+    FrameType.CONFIG: CONFIG_DTYPE,
+    FrameType.ADC: ADC_DTYPE,
+    FrameType.IMU: IMU_DTYPE,
+    FrameType.POWER: POWER_DTYPE,
+    FrameType.ENCODER: ENCODER_DTYPE,
+}
+
+# A whole frame (header and payload) of each frame type, to read every field
+# of a frame at once.
+FRAME_DTYPES = {
+    frame_type: np.dtype([("header", HEADER_DTYPE), ("payload", dtype)])
+    for frame_type, dtype in PAYLOAD_DTYPES.items()
+}
+
+
+# Number of bytes examined at once when scanning for frames.
+SCAN_BLOCK_SIZE = 1 << 18
+
+# _FrameIndex.scan indexes long streams by ranges of about SCAN_RANGE_SIZE
+# bytes, so that the temporary arrays of _scan_frames stay small.
+SCAN_RANGE_SIZE = 1 << 23
+
+# Number of frames decoded at once into each channel, so that the
+# temporary arrays of the conversion and calibration stay small.
+DECODE_BLOCK_FRAMES = 1 << 16
+
+# Streams up to this size, such as websocket messages, are scanned by
+# following the chain of headers in Python, which is faster than the bulk
+# search for a few frames.
+SCAN_WALK_SIZE = 1 << 12
+
+# To find a frame boundary in the middle of a stream, _sync_frames looks for
+# SYNC_FRAMES consecutive linked frames in the next SYNC_WINDOW bytes.
+SYNC_WINDOW = 1 << 16
+SYNC_FRAMES = 16
+
+# Streams from this size are scanned by _lane_frames, which follows the chain
+# of headers from a frame boundary near the start of each SCAN_LANE_SIZE
+# bytes, all lanes at once. Each boundary is looked for in the first
+# SCAN_LANE_WINDOW bytes of its lane, which hold at least one frame header.
+SCAN_LANES_MIN_SIZE = 1 << 21
+SCAN_LANE_SIZE = 1 << 12
+SCAN_LANE_WINDOW = 48
+
+# Data size of each frame type, indexed by frame type (zero for unknown
+# types), and frame type of each data size, indexed by data size. Used to
+# find and validate frames in bulk.
+_FRAME_SIZES = [dtype.itemsize for dtype in PAYLOAD_DTYPES.values()]
+_PAYLOAD_SIZES = np.zeros(256, dtype=np.uint8)
+_FRAME_TYPES = np.zeros(256, dtype=np.uint8)
+for _frame_type, _dtype in PAYLOAD_DTYPES.items():
+    _PAYLOAD_SIZES[_frame_type] = _dtype.itemsize
+    _FRAME_TYPES[_dtype.itemsize] = _frame_type
+del _frame_type, _dtype
+
+
+def _frame_candidates(
+    raw: np.ndarray, start: int, stop: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the positions whose header looks like a valid frame.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    start, stop
+        Look for headers that start in this range of positions.
+
+    Returns
+    -------
+    candidates
+        The position of each candidate header, sorted, as an int64 array.
+    next_candidates
+        The position following each candidate frame.
+
+    """
+    header_length = HEADER_DTYPE.itemsize
+    end = len(raw)
+    stop = min(stop, end - header_length + 1)
+    if stop <= start:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    types = raw[start:stop]
+    sizes = raw[start + 9 : stop + 9]
+    is_frame = sizes == _FRAME_SIZES[0]
+    for size in _FRAME_SIZES[1:]:
+        is_frame |= sizes == size
+    candidates = np.flatnonzero(is_frame)
+    candidates = candidates[
+        _FRAME_TYPES[sizes[candidates]] == types[candidates]
+    ]
+    next_candidates = candidates + header_length + sizes[candidates]
+
+    # A superframe header is a candidate if a candidate with a close
+    # timestamp (same 3 most significant bytes) follows it.
+    superframes = candidates[candidates >= header_length] - header_length
+    superframes = superframes[types[superframes] == FrameType.SUPERFRAME]
+    for i_byte in range(start + 6, start + 9):
+        superframes = superframes[
+            raw[superframes + i_byte]
+            == raw[superframes + header_length + i_byte]
+        ]
+    if len(superframes) > 0:
+        candidates = np.concatenate([candidates, superframes])
+        next_candidates = np.concatenate(
+            [next_candidates, superframes + header_length]
+        )
+        order = np.argsort(candidates, kind="stable")
+        candidates = candidates[order]
+        next_candidates = next_candidates[order]
+
+    candidates = candidates.astype(np.int64) + start
+    next_candidates = next_candidates.astype(np.int64) + start
+
+    # An incomplete frame at the end is not a candidate
+    complete = next_candidates <= end
+    candidates = candidates[complete]
+    next_candidates = next_candidates[complete]
+
+    # Drop the false candidates that lie inside a frame whose next frame is
+    # the following candidate, so that they do not split the runs of linked
+    # candidates.
+    (breaks,) = np.nonzero(next_candidates[:-1] != candidates[1:])
+    inside = breaks[breaks + 2 < len(candidates)]
+    inside = inside[next_candidates[inside] == candidates[inside + 2]]
+    if len(inside) > 0:
+        candidates = np.delete(candidates, inside + 1)
+        next_candidates = np.delete(next_candidates, inside + 1)
+
+    return candidates, next_candidates
+
+
+def _scan_frames(stream, offset: int = 0) -> tuple[np.ndarray, int]:
+    """
+    Find the position of every data frame in a stream.
+
+    Superframe headers are stepped over, so that the frames they contain are
+    returned as any other frame. Only the header of each frame is read.
+
+    Frames cannot be located without following the chain of headers from the
+    start, since each header gives the position of the next one. To avoid
+    doing this byte by byte in Python, every position whose header looks like
+    a valid frame (known type with the expected data size) is first found in
+    bulk. The chain is then followed in Python only where two consecutive
+    candidates do not link to each other, which mostly happens when a payload
+    byte happens to look like a header. Long streams are rather followed in
+    many lanes at once by _lane_frames, which reads only the headers.
+
+    Parameters
+    ----------
+    stream
+        The received message or the data stored in the dat file. Any object
+        that supports the buffer protocol.
+    offset
+        Start scanning at this position in the stream.
+
+    Returns
+    -------
+    offsets
+        The position of the header of each complete frame, as an int64 array.
+    offset
+        The position following the last complete frame. An incomplete frame
+        at the end of the stream is not included.
+
+    """
+    header_length = HEADER_DTYPE.itemsize
+    raw = np.frombuffer(stream, dtype=np.uint8)
+    end = len(raw)
+    if end - offset <= SCAN_WALK_SIZE:
+        return _walk_frames(raw, offset)
+    if end - offset >= SCAN_LANES_MIN_SIZE:
+        lanes = _lane_frames(raw, offset)
+        if lanes is not None:
+            return lanes
+
+    found = []  # type: list[np.ndarray]
+    has_superframes = False
+
+    while offset + header_length <= end:
+        block_end = min(offset + SCAN_BLOCK_SIZE, end - header_length + 1)
+        candidates, next_candidates = _frame_candidates(raw, offset, block_end)
+        if not has_superframes:
+            has_superframes = bool(
+                np.any(raw[candidates] == FrameType.SUPERFRAME)
+            )
+        (breaks,) = np.nonzero(next_candidates[:-1] != candidates[1:])
+        breaks = np.append(breaks, len(candidates) - 1)
+
+        # Follow the chain
+        truncated = False
+        while offset < block_end:
+            i = np.searchsorted(candidates, offset)
+            if i < len(candidates) and candidates[i] == offset:
+                # Follow every linked candidate at once
+                j = breaks[np.searchsorted(breaks, i)]
+                found.append(candidates[i : j + 1])
+                offset = int(next_candidates[j])
+            elif raw[offset] == FrameType.SUPERFRAME:
+                has_superframes = True
+                offset += header_length
+            else:
+                next_offset = offset + header_length + int(raw[offset + 9])
+                if next_offset > end:
+                    truncated = True
+                    break
+                found.append(np.array([offset], dtype=np.int64))
+                offset = next_offset
+
+        if truncated:
+            break
+
+    if len(found) == 0:
+        return np.zeros(0, dtype=np.int64), offset
+
+    offsets = np.concatenate(found)
+    if has_superframes:
+        offsets = offsets[raw[offsets] != FrameType.SUPERFRAME]
+    return offsets, offset
+
+
+def _walk_frames(raw: np.ndarray, offset: int) -> tuple[np.ndarray, int]:
+    """
+    Follow the chain of headers of a short stream, frame by frame.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    offset
+        Start scanning at this position in the stream.
+
+    Returns
+    -------
+    offsets, offset
+        See _scan_frames.
+
+    """
+    header_length = HEADER_DTYPE.itemsize
+    superframe = int(FrameType.SUPERFRAME)
+    view = memoryview(raw)
+    end = len(view)
+    offsets = []  # type: list[int]
+    while offset + header_length <= end:
+        if view[offset] == superframe:
+            offset += header_length
+            continue
+        next_offset = offset + header_length + view[offset + 9]
+        if next_offset > end:
+            break
+        offsets.append(offset)
+        offset = next_offset
+    return np.array(offsets, dtype=np.int64), offset
+
+
+def _lane_frames(
+    raw: np.ndarray, offset: int
+) -> tuple[np.ndarray, int] | None:
+    """
+    Follow the chain of headers of a long stream, in lanes.
+
+    The stream is split at a frame boundary near every SCAN_LANE_SIZE bytes,
+    found by _sync_lanes. The chain of headers is then followed from every
+    boundary at once, one frame per step, until each lane reaches the
+    boundary of the next one. A lane that reaches it exactly proves that
+    this boundary is on the chain that starts at offset, so that the frames
+    of every lane are those that _walk_frames would find.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    offset
+        Start scanning at this position in the stream.
+
+    Returns
+    -------
+    tuple[np.ndarray, int] | None
+        The offsets and offset, as returned by _scan_frames, or None if a
+        lane missed the boundary of the next one.
+
+    """
+    header_length = HEADER_DTYPE.itemsize
+    superframe = int(FrameType.SUPERFRAME)
+    starts = np.arange(offset, len(raw), SCAN_LANE_SIZE, dtype=np.int64)
+    boundaries = _sync_lanes(raw, starts)
+    boundaries[0] = offset
+    boundaries = boundaries[boundaries >= 0]
+    boundaries = boundaries[
+        np.concatenate([[True], boundaries[1:] > boundaries[:-1]])
+    ]
+
+    # Every lane but the last one ends at a complete frame header, so that
+    # the lanes never read past the end of the stream.
+    ends = boundaries[1:]
+    positions = boundaries[:-1].copy()
+    steps = []  # type: list[np.ndarray]
+    walking = positions < ends
+    while np.any(walking):
+        headers = np.minimum(positions, ends)
+        is_frame = raw[headers] != superframe
+        steps.append(np.where(walking & is_frame, positions, -1))
+        sizes = np.where(is_frame, raw[headers + 9], 0)
+        positions = np.where(
+            walking, positions + header_length + sizes, positions
+        )
+        walking = positions < ends
+    if not np.array_equal(positions, ends):
+        return None
+
+    offsets = np.zeros(0, dtype=np.int64)
+    if len(steps) > 0:
+        offsets = np.stack(steps).T.ravel()
+        del steps
+        offsets = offsets[offsets >= 0]
+    last_offsets, offset = _walk_frames(raw, int(boundaries[-1]))
+    return np.concatenate([offsets, last_offsets]), offset
+
+
+def _sync_lanes(raw: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Find a frame boundary near the start of each lane, all lanes at once.
+
+    As in _sync_frames, a candidate header starts a boundary if it starts a
+    chain of SYNC_FRAMES linked frames, and the fourth frame of the chain is
+    returned.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    starts
+        The start of each lane, every SCAN_LANE_SIZE bytes.
+
+    Returns
+    -------
+    np.ndarray
+        The position of a frame header in each lane, or -1 if none was found
+        in its first SCAN_LANE_WINDOW bytes.
+
+    """
+    header_length = HEADER_DTYPE.itemsize
+    superframe = int(FrameType.SUPERFRAME)
+    end = len(raw)
+    candidates = (starts[:, np.newaxis] + np.arange(SCAN_LANE_WINDOW)).ravel()
+    candidates = candidates[candidates + header_length <= end]
+    sizes = raw[candidates + 9]
+    is_frame = _PAYLOAD_SIZES[raw[candidates]] == sizes
+    is_frame &= sizes > 0
+    candidates = candidates[is_frame]
+
+    # Follow the chain from every candidate at once
+    positions = candidates
+    is_linked = np.ones(len(candidates), dtype=bool)
+    for i_link in range(SYNC_FRAMES):
+        if i_link == 3:
+            boundaries = positions
+        headers = np.minimum(positions, end - header_length)
+        types = raw[headers]
+        sizes = raw[headers + 9]
+        is_superframe = types == superframe
+        is_linked &= is_superframe | (_PAYLOAD_SIZES[types] == sizes)
+        positions = positions + header_length + np.where(
+            is_superframe, 0, sizes
+        )
+    is_linked &= positions <= end
+
+    # Keep the first linked candidate of each lane
+    (linked,) = np.nonzero(is_linked)
+    lanes = (candidates[linked] - starts[0]) // SCAN_LANE_SIZE
+    found = np.full(len(starts), -1, dtype=np.int64)
+    found[lanes[::-1]] = boundaries[linked[::-1]]
+    return found
+
+
+def _sync_frames(raw: np.ndarray, start: int) -> int | None:
+    """
+    Find a frame boundary near a position, without scanning from the start.
+
+    A position whose header looks like a valid frame is a frame boundary if
+    it starts a chain of SYNC_FRAMES linked frames. A false candidate inside
+    a payload may be the head of such a chain if it happens to link to a
+    real frame, so the fourth frame of the chain is returned instead of its
+    head. The caller must still check that the frames of the previous range
+    end exactly at this position.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    start
+        Look for a frame boundary from this position.
+
+    Returns
+    -------
+    int | None
+        The position of a frame header, or None if none was found in the
+        next SYNC_WINDOW bytes.
+
+    """
+    candidates, next_candidates = _frame_candidates(
+        raw, start, start + SYNC_WINDOW
+    )
+    n_candidates = len(candidates)
+    if n_candidates == 0:
+        return None
+
+    # Follow the chain from every candidate at once
+    chains = np.arange(n_candidates)
+    is_linked = np.ones(n_candidates, dtype=bool)
+    for i_link in range(SYNC_FRAMES):
+        if i_link == 3:
+            boundaries = candidates[chains]
+        following = np.minimum(
+            np.searchsorted(candidates, next_candidates[chains]),
+            n_candidates - 1,
+        )
+        is_linked &= candidates[following] == next_candidates[chains]
+        chains = following
+
+    if not np.any(is_linked):
+        return None
+    return int(boundaries[np.argmax(is_linked)])
+
+
+def _gather(
+    raw: np.ndarray, offsets: np.ndarray, dtype: np.dtype
+) -> np.ndarray:
+    """
+    Copy fixed-size records at arbitrary positions of a byte array.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    offsets
+        The position of each record in raw.
+    dtype
+        The dtype of a record.
+
+    Returns
+    -------
+    np.ndarray
+        A 1-dimension array of len(offsets) records.
+
+    """
+    # View every position of raw as the start of an opaque record, so that
+    # fancy indexing copies each record at once.
+    records = np.ndarray(
+        shape=(max(len(raw) - dtype.itemsize + 1, 0),),
+        dtype=np.dtype((np.void, dtype.itemsize)),
+        buffer=raw,
+        strides=(1,),
+    )
+    return records[offsets].view(dtype)
+
+
 class GlobalConfig:
     """
     Global configuration of the instrumented wheel.
@@ -182,705 +693,5230 @@ class GlobalConfig:
             raise ValueError("Invalid mag range")
 
 
-class NextWheel:
+def _config_from_frame(
+    previous: GlobalConfig, payload: np.void
+) -> GlobalConfig:
+    """Return a copy of a configuration, updated from a CONFIG frame."""
+    config = copy.copy(previous)
+    config.accel_range = int(payload["accel_range"])
+    config.gyro_range = int(payload["gyro_range"])
+    config.mag_range = int(payload["mag_range"])
+    config.imu_sampling_rate = int(payload["imu_sampling_rate"])
+    config.adc_sampling_rate = int(payload["adc_sampling_rate"])
+    config.encoder_sampling_rate = int(payload["encoder_sampling_rate"])
+    return config
+
+
+def _file_mapping(raw: np.ndarray) -> memory_map.mmap | None:
     """
-    Communicate with the instrumented wheel.
+    Return the memory map of a stream, if its pages can be released.
 
-    The class permit to communicate with the instrumented wheel with 3 methods:
-        - NextWheel.connect() allows to start a connection with the server via
-        the WebSocketApp.
-        - NextWheel.fetch() return the streamed data in a nested dictionary
-        with all the usefull informations. Also clear the buffer.
-        - NextWheel.close() close the connection with the instrumented wheel.
-    It needs an IP address like in the example below.
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
 
-    Exemple
+    Returns
     -------
-    >>> from nextwheel import NextWheel
-    >>> nw = NextWheel("196.168.1.254")
-    >>> nw.connect()
+    mmap.mmap | None
+        The memory map of a whole file, as opened by _open_dat with mmap, or
+        None if raw is not one or if the platform cannot release its pages.
 
-    >>> print(nw.fetch())
+    """
+    base = raw
+    while isinstance(base, np.ndarray):
+        base = base.base
+    if (
+        isinstance(base, memory_map.mmap)
+        and len(base) == len(raw)
+        and hasattr(memory_map, "MADV_DONTNEED")
+    ):
+        return base
+    return None
 
-    >>> nw.close()
 
+def _release_pages(
+    mapping: memory_map.mmap | None, start: int, stop: int
+) -> None:
     """
+    Release the memory of a range of a memory-mapped file once it was read.
 
-    def __init__(self, IP: str, *, debug: bool = False):
-        # General configuration
-        self.IP = IP
-        self.HEADER_LENGTH = 10
-        self.TIME_ZERO = 0
-        self.max_imu_samples = 0
-        self.max_analog_samples = 0
-        self.max_encoder_samples = 0
-        self.max_power_samples = 0
-        self._config = GlobalConfig()
-        self._debug = debug
+    The pages are removed from the resident memory of the process, and read
+    again from the file if they are accessed later, so that scanning or
+    decoding a file larger than the available memory does not keep all of
+    it resident.
 
-        # Communication stuff
-        self.ws = None
-        self._mutex = threading.Lock()
-        self._thread_is_running = False
+    Parameters
+    ----------
+    mapping
+        The memory map, as returned by _file_mapping. Nothing is done if
+        None.
+    start, stop
+        The range of positions read. Only the pages that are entirely in
+        this range are released.
 
-        # Data buffers. In these arrays, column 0 is the time
-        self._adc_values = []  # type: list[np.ndarray]
-        self._imu_values = []  # type: list[np.ndarray]
-        self._power_values = []  # type: list[np.ndarray]
-        self._encoder_values = []  # type: list[np.ndarray]
+    """
+    if mapping is None:
+        return
+    start = -(-start // memory_map.PAGESIZE) * memory_map.PAGESIZE
+    stop = stop // memory_map.PAGESIZE * memory_map.PAGESIZE
+    if stop > start:
+        mapping.madvise(memory_map.MADV_DONTNEED, start, stop - start)
 
-        # Calibration constants
 
-        try:
-            self.file_download("Calibration.json")
-            with open("Calibration.json", "r") as json_file:
-                self.CALIBRATION = json.load(json_file)
-            self.CALIBRATION_MATRIX = np.array(self.CALIBRATION["Matrix"])
-            self.CALIBRATION_OFFSET = np.array(self.CALIBRATION["Offset"])
-        except:
-            self.CALIBRATION_MATRIX = np.identity(6)
-            self.CALIBRATION_OFFSET = np.zeros((6,))
-            print("No Calibration File Detected")
+def _offset_dtype(length: int) -> np.dtype:
+    """Return the smallest dtype of the positions in a stream."""
+    if length <= np.iinfo(np.uint32).max:
+        return np.dtype(np.uint32)
+    return np.dtype(np.int64)
+
+
+def _split_frames(
+    raw: np.ndarray, offsets: np.ndarray, skip_invalid: bool
+) -> tuple[dict[FrameType, np.ndarray], int, int]:
+    """
+    Validate the frames found by _scan_frames and split them by frame type.
+
+    Parameters
+    ----------
+    raw
+        The stream, as a uint8 array.
+    offsets
+        The position of the frames, as returned by _scan_frames.
+    skip_invalid
+        See _FrameIndex.from_offsets.
+
+    Returns
+    -------
+    offsets
+        The position of the frames of each frame type, in the dtype given
+        by _offset_dtype.
+    unknown_frames, short_frames
+        The number of invalid frames skipped.
+
+    """
+    # Index with the final dtype, which is smaller than int64 for most files.
+    offsets = offsets.astype(_offset_dtype(len(raw)), copy=False)
+    types = raw[offsets]
+    sizes = raw[offsets + 9]
+    expected_sizes = _PAYLOAD_SIZES[types]
+    unknown_frames = short_frames = 0
+    if skip_invalid:
+        unknown = expected_sizes == 0
+        invalid = unknown | (sizes < expected_sizes)
+        if np.any(invalid):
+            unknown_frames = int(np.count_nonzero(unknown))
+            short_frames = int(np.count_nonzero(invalid)) - unknown_frames
+            offsets = offsets[~invalid]
+            types = types[~invalid]
+    else:
+        for i_frame in np.flatnonzero(sizes != expected_sizes):
+            if expected_sizes[i_frame] == 0:
+                raise ValueError(
+                    f"Received an unknown frame type: {types[i_frame]}"
+                )
+            if sizes[i_frame] < expected_sizes[i_frame]:
+                raise ValueError(
+                    "Received a "
+                    f"{FrameType(types[i_frame]).name} frame that is "
+                    "too short."
+                )
+    del sizes, expected_sizes
+
+    split = {
+        frame_type: offsets[types == int(frame_type)]
+        for frame_type in PAYLOAD_DTYPES
+    }
+    return split, unknown_frames, short_frames
+
+
+class _FrameIndex:
+    """
+    Position, time and configuration of the frames of a stream.
+
+    The payloads are decoded only when requested, one frame type or one field
+    at a time, so that a large memory-mapped file can be indexed without
+    being read entirely. Use _FrameIndex.scan to index every frame of a
+    stream.
+
+    Parameters
+    ----------
+    stream
+        The received message or the data stored in the dat file. Any object
+        that supports the buffer protocol.
+    offsets
+        The position of the frames, for each frame type. Every CONFIG frame
+        that precedes a data frame must be included.
+    time_zero
+        The time, in seconds, of the last CONFIG frame before these frames.
+    config
+        The configuration in effect before these frames.
+    end
+        The position following the last frame.
+
+    """
+
+    def __init__(
+        self,
+        stream,
+        offsets: dict[FrameType, np.ndarray],
+        time_zero: float = 0,
+        config: GlobalConfig | None = None,
+        end: int = 0,
+    ):
+        if config is None:
+            config = GlobalConfig()
 
-    def _parse_message(self, stream: bytes, offset: int = 0) -> int:
+        self.raw = np.frombuffer(stream, dtype=np.uint8)
+        self.offsets = {
+            frame_type: offsets.get(frame_type, np.zeros(0, dtype=np.int64))
+            for frame_type in PAYLOAD_DTYPES
+        }
+        self.end = end
+
+        # Invalid frames skipped by from_offsets(skip_invalid=True)
+        self.unknown_frames = 0
+        self.short_frames = 0
+
+        # Whole frames of some frame types, already read by decode, from
+        # which the timestamps and payloads are taken instead of raw.
+        self.frames = {}  # type: dict[FrameType, np.ndarray]
+
+        # Configuration in effect for each frame. Segment 0 holds the state
+        # before the first CONFIG frame of this stream.
+        self.time_zeros = [time_zero]
+        self.time_zeros_us = [round(time_zero * 1e6)]
+        self.configs = [config]
+        if len(self.offsets[FrameType.CONFIG]) == 0:
+            return
+        for timestamp, payload in zip(
+            self.timestamps(FrameType.CONFIG),
+            self.payload(FrameType.CONFIG),
+        ):
+            self.time_zeros.append(int(timestamp) / 1e6)
+            self.time_zeros_us.append(int(timestamp))
+            self.configs.append(_config_from_frame(self.configs[-1], payload))
+
+    @classmethod
+    def scan(
+        cls,
+        stream,
+        offset: int = 0,
+        time_zero: float = 0,
+        config: GlobalConfig | None = None,
+        *,
+        skip_invalid: bool = False,
+    ) -> "_FrameIndex":
         """
-        Parse a series of bytes corresponding to a messages.
+        Index every complete frame of a stream.
 
-        It only parses the first message from the stream, then returns the
-        position of the next message in the stream. If the received message
-        is a superframe, all messages from the superframe are parsed and
-        processed.
+        A long stream is scanned by ranges of about SCAN_RANGE_SIZE bytes,
+        each ending where the last complete frame of the range ends, and
+        only the compact positions of each range are kept. The memory used
+        is then mostly that of the index itself.
 
         Parameters
         ----------
         stream
-            The received message or the data stored in the dat file.
+            The received message or the data stored in the dat file. Any
+            object that supports the buffer protocol.
         offset
             Start processing at this position in the stream.
+        time_zero
+            The time, in seconds, of the last CONFIG frame before this
+            stream.
+        config
+            The configuration in effect before this stream.
+        skip_invalid
+            See from_offsets.
 
         Returns
         -------
-        offset
-            The position of the next message in the stream.
-            
+        _FrameIndex
 
         """
-        if type(stream) is not bytes:
-            return
-        
-        if offset >= len(stream):
-            return offset
-        
-        # Extract the type of message
-        (frame_type, timestamp, data_size) = struct.unpack(
-            "<BQB", stream[offset:offset+10]
-        )
-        offset += 10
-        time = timestamp / 1e6 - self.TIME_ZERO
-        
-        # Process the frame
-        if frame_type == FrameType.CONFIG:
-
-            # Config frame (should always be first)
-            data = stream[offset:offset + data_size]
-            offset += data_size
-        
-            self.TIME_ZERO = timestamp / 1e6
-
-            (
-                accel_range,
-                gyro_range,
-                mag_range,
-                imu_sampling_rate,
-                adc_sampling_rate,
-                encoder_sampling_rate,
-            ) = struct.unpack("<6I", data)
-
-            # Update configuration
-            self._config.accel_range = accel_range
-            self._config.gyro_range = gyro_range
-            self._config.mag_range = mag_range
-            self._config.imu_sampling_rate = imu_sampling_rate
-            self._config.adc_sampling_rate = adc_sampling_rate
-            self._config.encoder_sampling_rate = encoder_sampling_rate
-
-        elif frame_type == FrameType.ADC:  # frame type of the ADC values
-            data = stream[offset:offset + data_size]
-            offset += data_size
-
-            self._adc_values.append(
-                np.hstack([[time], struct.unpack("<8H", data)])
-            )
-
-            if len(self._adc_values) > self.max_analog_samples:
-                self._adc_values.pop(0)
-
-        elif frame_type == FrameType.IMU:  # frame type of the IMU
-            data = stream[offset:offset + data_size]
-            offset += data_size
-
-            self._imu_values.append(
-                np.hstack(
-                    [
-                        [time],
-                        self._config.convert_accel_values(
-                            np.array(struct.unpack_from("<3h", data[:6]))
-                        ),
-                        self._config.convert_gyro_values(
-                            np.array(struct.unpack_from("<3h", data[6:12]))
-                        ),
-                        self._config.convert_mag_values(
-                            np.array(struct.unpack_from("<3h", data[12:18]))
-                        ),
-                    ]
-                )
+        raw = np.frombuffer(stream, dtype=np.uint8)
+        mapping = _file_mapping(raw)
+        ranges = {frame_type: [] for frame_type in PAYLOAD_DTYPES}
+        unknown_frames = short_frames = 0
+        end = offset
+        while True:
+            stop = end + SCAN_RANGE_SIZE
+            if stop + SCAN_RANGE_SIZE // 2 >= len(raw):
+                stop = len(raw)
+            start = end
+            offsets, end = _scan_frames(raw[:stop], start)
+            split, unknown, short = _split_frames(raw, offsets, skip_invalid)
+            del offsets
+            for frame_type, frame_offsets in split.items():
+                ranges[frame_type].append(frame_offsets)
+            unknown_frames += unknown
+            short_frames += short
+            _release_pages(mapping, start, end)
+            if stop == len(raw):
+                break
+
+        offsets = {}
+        for frame_type, frame_ranges in ranges.items():
+            offsets[frame_type] = (
+                frame_ranges[0]
+                if len(frame_ranges) == 1
+                else np.concatenate(frame_ranges)
             )
+            frame_ranges.clear()
+        index = cls(stream, offsets, time_zero, config, end)
+        index.unknown_frames = unknown_frames
+        index.short_frames = short_frames
+        return index
+
+    @classmethod
+    def from_offsets(
+        cls,
+        stream,
+        offsets: np.ndarray,
+        time_zero: float = 0,
+        config: GlobalConfig | None = None,
+        end: int = 0,
+        *,
+        skip_invalid: bool = False,
+    ) -> "_FrameIndex":
+        """
+        Index the frames found by _scan_frames, after validating them.
 
-            if len(self._imu_values) > self.max_imu_samples:
-                self._imu_values.pop(0)
+        Parameters
+        ----------
+        stream
+            The received message or the data stored in the dat file. Any
+            object that supports the buffer protocol.
+        offsets
+            The position of the frames, as returned by _scan_frames.
+        time_zero
+            The time, in seconds, of the last CONFIG frame before these
+            frames.
+        config
+            The configuration in effect before these frames.
+        end
+            The position following the last frame.
+        skip_invalid
+            If True, the frames of unknown type and the frames that are too
+            short are left out of the index, and counted in its
+            unknown_frames and short_frames attributes. The default is to
+            raise a ValueError.
 
-        elif frame_type == FrameType.POWER:  # frame type of the POWER
-            data = stream[offset:offset + data_size]
-            offset += data_size
+        Returns
+        -------
+        _FrameIndex
 
-            self._power_values.append(
-                np.hstack([[time], struct.unpack_from("<3fB", data)])
-            )
+        """
+        split, unknown_frames, short_frames = _split_frames(
+            np.frombuffer(stream, dtype=np.uint8), offsets, skip_invalid
+        )
+        index = cls(stream, split, time_zero, config, end)
+        index.unknown_frames = unknown_frames
+        index.short_frames = short_frames
+        return index
 
-            if len(self._power_values) > self.max_power_samples:
-                self._power_values.pop(0)
+    def select(self, frame_types) -> "_FrameIndex":
+        """
+        Return an index restricted to some frame types.
 
-        elif frame_type == FrameType.ENCODER:  # frame type of the ENCODER
-            data = stream[offset:offset + data_size]
-            offset += data_size
+        Parameters
+        ----------
+        frame_types
+            The data frame types to keep. CONFIG frames are always kept.
 
-            self._encoder_values.append(
-                np.hstack([[time], struct.unpack_from("<q", data)])
-            )
+        Returns
+        -------
+        _FrameIndex
 
-            if len(self._encoder_values) > self.max_encoder_samples:
-                self._encoder_values.pop(0)
+        """
+        return _FrameIndex(
+            self.raw,
+            {
+                frame_type: frame_offsets
+                for frame_type, frame_offsets in self.offsets.items()
+                if frame_type in frame_types
+                or frame_type == FrameType.CONFIG
+            },
+            self.time_zeros[0],
+            self.configs[0],
+            self.end,
+        )
 
-        elif frame_type == FrameType.SUPERFRAME:
+    def segments(self, frame_type: FrameType) -> np.ndarray:
+        """Return the index in configs of the configuration of each frame."""
+        return np.searchsorted(
+            self.offsets[FrameType.CONFIG], self.offsets[frame_type]
+        )
 
-            for sub_count in range(data_size):  # data_size = number of frames
-                offset = self._parse_message(stream, offset)
-                
+    def timestamps(self, frame_type: FrameType) -> np.ndarray:
+        """Return the raw timestamps of a frame type, in microseconds."""
+        if frame_type in self.frames:
+            return self.frames[frame_type]["header"]["timestamp"]
+        return _gather(self.raw, self.offsets[frame_type] + 1, np.dtype("<u8"))
+
+    def time(self, frame_type: FrameType) -> np.ndarray:
+        """Return the time of a frame type, in seconds since TIME_ZERO."""
+        time = self.timestamps(frame_type) / 1e6
+        if len(self.time_zeros) > 1:
+            time -= np.array(self.time_zeros)[self.segments(frame_type)]
         else:
-            raise ValueError(f"Received an unknown frame type: {frame_type}")
-            
-        return offset
-
+            time -= self.time_zeros[0]
+        return time
+
+    def time_us(self, frame_type: FrameType) -> np.ndarray:
+        """Return the time of a frame type, in microseconds since TIME_ZERO."""
+        time = self.timestamps(frame_type).astype(np.int64)
+        if len(self.time_zeros_us) > 1:
+            time -= np.array(self.time_zeros_us)[self.segments(frame_type)]
+        else:
+            time -= self.time_zeros_us[0]
+        return time
 
-    def _on_message(self, ws, message):
+    def payload(self, frame_type: FrameType, field: str = "") -> np.ndarray:
         """
-        React to WebSocketApp message received.
-
-        Simply a wrapper to the more generic _parse_messages function.
+        Return the payloads of a frame type, or only one of their fields.
 
         Parameters
         ----------
-        ws : _app.WebSocketApp
-            DESCRIPTION.
-        message : bytes
-            Information containing data in bytes.
+        frame_type
+            The frame type.
+        field
+            Optional. The name of a field of the payload dtype. Only the bytes
+            of this field are read.
 
         Returns
         -------
-        None.
+        np.ndarray
+            A structured array of payloads, or an array of field values.
 
         """
-        self._mutex.acquire()
-        self._parse_message(message)
-        self._mutex.release()
+        if frame_type in self.frames:
+            payloads = self.frames[frame_type]["payload"]
+            return payloads if field == "" else payloads[field]
+
+        dtype = PAYLOAD_DTYPES[frame_type]
+        offsets = self.offsets[frame_type] + HEADER_DTYPE.itemsize
+        if field == "":
+            return _gather(self.raw, offsets, dtype)
+        field_dtype, field_offset = dtype.fields[field][:2]
+        return _gather(self.raw, offsets + field_offset, field_dtype)
+
+    def imu(
+        self, field: str, raw_values: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        Return an IMU field, converted with the configuration of each frame.
 
-    def _on_open(self, ws):
-        """Reaction of the WebSocketApp when the connection is open."""
-        if self._debug:
-            print("Connected: ", self.ws)
+        Parameters
+        ----------
+        field
+            "accel", "gyro" or "mag".
+        raw_values
+            Optional. The values of this field in the payloads, if they were
+            already read. The default is to read them.
 
-    def _on_error(self, ws, error):
-        """Reaction of the WebSocketApp when there is an error."""
-        print(self.ws, error)
-        self.stop_streaming()
+        Returns
+        -------
+        np.ndarray
+            An nx3 array of converted values.
 
-    def _on_close(self, ws, close_status_code, close_msg):
-        """Reaction of the WebSocketApp when the connection is close."""
-        if self._debug:
-            print("Closed: ", self.ws, close_status_code, close_msg)
+        """
+        if raw_values is None:
+            raw_values = self.payload(FrameType.IMU, field)
+        if len(self.configs) == 1:
+            return getattr(self.configs[0], f"convert_{field}_values")(
+                raw_values
+            )
 
-    def start_streaming(
-        self,
-        max_imu_samples: int = 1000,
-        max_analog_samples: int = 1000,
-        max_encoder_samples: int = 100,
-        max_power_samples: int = 10,
-    ):
+        values = np.empty(raw_values.shape)
+        segments = self.segments(FrameType.IMU)
+        bounds = np.searchsorted(segments, np.arange(len(self.configs) + 1))
+        for i_segment, config in enumerate(self.configs):
+            block = slice(bounds[i_segment], bounds[i_segment + 1])
+            if block.start == block.stop:
+                continue
+            convert = getattr(config, f"convert_{field}_values")
+            values[block] = convert(raw_values[block])
+        return values
+
+    def imu_scales(self, field: str) -> np.ndarray:
         """
-        Start streaming.
+        Return the factor that converts an IMU field, for each frame.
 
         Parameters
         ----------
-        max_imu_samples : int, optional
-            Maximum IMU data to keep in memory. The default is 1000.
-        max_analog_samples : int, optional
-            Maximum ADC data to keep in memory. The default is 1000.
-        max_encoder_samples : int, optional
-            Maximum encoder data to keep in memory. The default is 100.
-        max_power_samples : int, optional
-            Maximum Power data to keep in memory. The default is 10.
+        field
+            "accel", "gyro" or "mag".
 
         Returns
         -------
-        None.
+        np.ndarray
+            An nx1 array, so that imu(field) equals payload(FrameType.IMU,
+            field) * imu_scales(field).
 
         """
-        if self._thread_is_running:
-            return
+        scales = np.empty((len(self.offsets[FrameType.IMU]), 1))
+        segments = self.segments(FrameType.IMU)
+        bounds = np.searchsorted(segments, np.arange(len(self.configs) + 1))
+        for i_segment, config in enumerate(self.configs):
+            block = slice(bounds[i_segment], bounds[i_segment + 1])
+            if block.start == block.stop:
+                continue
+            convert = getattr(config, f"convert_{field}_values")
+            scales[block] = convert(np.ones(1))
+        return scales
+
+    def values(self, frame_type: FrameType, timebase: str = "s") -> np.ndarray:
+        """
+        Return every sample of a data frame type in a single array.
 
-        self.max_imu_samples = max_imu_samples
-        self.max_analog_samples = max_analog_samples
-        self.max_encoder_samples = max_encoder_samples
-        self.max_power_samples = max_power_samples
+        Parameters
+        ----------
+        frame_type
+            FrameType.ADC, FrameType.IMU, FrameType.ENCODER or
+            FrameType.POWER.
+        timebase
+            Optional. The unit of the time: "s" for seconds or "us" for
+            integer microseconds. The default is "s".
 
-        self.ws = websocket.WebSocketApp(
-            f"ws://{self.IP}:81/",
-            on_open=self._on_open,
-            on_message=self._on_message,
-            on_error=self._on_error,
-            on_close=self._on_close,
-        )
+        Returns
+        -------
+        np.ndarray
+            An array where column 0 is the time, followed by the 8 raw ADC
+            channels (6 forces and 2 spares), the converted acceleration,
+            angular velocity and magnetic field of the IMU, the encoder angle,
+            or the voltage, current, power and state of the power frames.
 
+        """
+        if timebase == "us":
+            time = self.time_us(frame_type)
+        else:
+            time = self.time(frame_type)
+
+        if frame_type == FrameType.ADC:
+            # The force and spare channels follow each other in the payload
+            payload = self.payload(frame_type).view("<u2").reshape(-1, 8)
+            values = np.empty((len(time), 9))
+            values[:, 1:] = payload
+        elif frame_type == FrameType.IMU:
+            payload = self.payload(frame_type)
+            values = np.empty((len(time), 10))
+            values[:, 1:4] = self.imu("accel", payload["accel"])
+            values[:, 4:7] = self.imu("gyro", payload["gyro"])
+            values[:, 7:10] = self.imu("mag", payload["mag"])
+        elif frame_type == FrameType.POWER:
+            payload = self.payload(frame_type)
+            values = np.empty((len(time), 5))
+            values[:, 1] = payload["voltage"]
+            values[:, 2] = payload["current"]
+            values[:, 3] = payload["power"]
+            values[:, 4] = payload["state"]
+        elif frame_type == FrameType.ENCODER:
+            values = np.empty((len(time), 2))
+            values[:, 1] = self.payload(frame_type, "angle")
+        else:
+            raise ValueError(f"Cannot return values for {frame_type}.")
+
+        values[:, 0] = time
+        return values
+
+    def decode(
+        self,
+        frame_type: FrameType,
+        channels: dict[str, tuple[Callable[["_FrameIndex"], Any], Any]],
+    ) -> dict[str, np.ndarray]:
+        """
+        Decode channels of a frame type into new arrays of given dtypes.
+
+        The frames are read by blocks of DECODE_BLOCK_FRAMES whole frames,
+        once for every channel, and the values of each block are written
+        into the output arrays, so that the temporary arrays stay small. The
+        pages of a memory-mapped file are released after each block.
+
+        Parameters
+        ----------
+        frame_type
+            The frame type.
+        channels
+            For each channel, a function that returns its values for the
+            frames of an index (e.g., lambda index: index.time(frame_type)),
+            and the dtype of the output array.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            For each channel, its values for every frame of this frame type,
+            the same as getter(self).astype(dtype). The arrays are empty
+            1-dimension arrays if there is no frame.
+
+        """
+        offsets = self.offsets[frame_type]
+        if len(offsets) == 0:
+            return {
+                name: np.array([], dtype=dtype)
+                for name, (_, dtype) in channels.items()
+            }
+
+        mapping = _file_mapping(self.raw)
+        values = {}  # type: dict[str, np.ndarray]
+        block = copy.copy(self)
+        block.offsets = dict(self.offsets)
+        for start in range(0, len(offsets), DECODE_BLOCK_FRAMES):
+            stop = start + DECODE_BLOCK_FRAMES
+            block_offsets = offsets[start:stop]
+            block.offsets[frame_type] = block_offsets
+            block.frames = {
+                frame_type: _gather(
+                    self.raw, block_offsets, FRAME_DTYPES[frame_type]
+                )
+            }
+            for name, (getter, dtype) in channels.items():
+                block_values = getter(block)
+                if len(block_offsets) == len(offsets):
+                    values[name] = np.ascontiguousarray(block_values, dtype)
+                    continue
+                if name not in values:
+                    values[name] = np.empty(
+                        (len(offsets),) + block_values.shape[1:], dtype
+                    )
+                values[name][start:stop] = block_values
+            _release_pages(
+                mapping, int(block_offsets[0]), int(block_offsets[-1])
+            )
+        return values
+
+
+class _LazyDict(Mapping):
+    """
+    Read-only dictionary whose values are computed on first access.
+
+    Parameters
+    ----------
+    getters
+        A dictionary of key: function, where function takes no argument and
+        returns the value of this key.
+
+    """
+
+    def __init__(self, getters: dict[str, Callable[[], Any]]):
+        self._getters = getters
+        self._values = {}  # type: dict[str, Any]
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._values:
+            self._values[key] = self._getters[key]()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._getters)
+
+    def __len__(self) -> int:
+        return len(self._getters)
+
+    def __repr__(self) -> str:
+        return f"_LazyDict({list(self._getters)})"
+
+
+class _RingBuffer:
+    """
+    Fixed-capacity buffer of the latest samples of a sensor.
+
+    When the buffer is full, appending a sample overwrites the oldest one.
+    The count attribute is the number of samples ever appended, so that a
+    reader can find the samples appended since it last read the buffer.
+
+    Parameters
+    ----------
+    n_columns
+        The number of columns of each sample, where column 0 is the time.
+    capacity
+        Optional. The maximal number of samples. The default is 0.
+
+    """
+
+    def __init__(self, n_columns: int, capacity: int = 0):
+        self._values = np.zeros((capacity, n_columns))
+        self._start = 0  # Position of the oldest sample
+        self._length = 0
+        self.count = 0
+
+    @property
+    def capacity(self) -> int:
+        """The maximal number of samples."""
+        return len(self._values)
+
+    def resize(self, capacity: int) -> None:
+        """Change the capacity, keeping the latest samples."""
+        # The samples are allocated in advance, so there is no unlimited
+        # capacity (such as np.inf).
+        if not np.isfinite(capacity) or capacity < 0:
+            raise ValueError(
+                f"Invalid number of samples {capacity}. Use a finite, "
+                "non-negative number of samples."
+            )
+        capacity = int(capacity)
+        values = self.to_array()[max(len(self) - capacity, 0) :]
+        self._values = np.zeros((capacity, self._values.shape[1]))
+        self._start = 0
+        self._length = len(values)
+        self._values[: self._length] = values
+
+    def append(self, sample) -> None:
+        """Append one sample, given as a sequence of n_columns values."""
+        capacity = len(self._values)
+        self.count += 1
+        if capacity == 0:
+            return
+        if self._length < capacity:
+            self._values[(self._start + self._length) % capacity] = sample
+            self._length += 1
+        else:
+            self._values[self._start] = sample
+            self._start = (self._start + 1) % capacity
+
+    def extend(self, samples: np.ndarray) -> None:
+        """Append many samples, given as an array of n_columns columns."""
+        capacity = len(self._values)
+        self.count += len(samples)
+        samples = samples[max(len(samples) - capacity, 0) :]
+        n_samples = len(samples)
+        if n_samples == 0:
+            return
+
+        # Write in at most two blocks, wrapping at the end of the array
+        position = (self._start + self._length) % capacity
+        first = min(n_samples, capacity - position)
+        self._values[position : position + first] = samples[:first]
+        self._values[: n_samples - first] = samples[first:]
+
+        overflow = max(self._length + n_samples - capacity, 0)
+        self._start = (self._start + overflow) % capacity
+        self._length += n_samples - overflow
+
+    def to_array(self, n: int | None = None) -> np.ndarray:
+        """
+        Return a copy of the samples, from the oldest to the latest.
+
+        Parameters
+        ----------
+        n
+            Optional. Return only the latest n samples. The default is to
+            return every sample.
+
+        Returns
+        -------
+        np.ndarray
+
+        """
+        if n is None or n > self._length:
+            n = self._length
+        views = self._views(max(n, 0))
+        if len(views) == 1:
+            return views[0].copy()
+        return np.concatenate(views)
+
+    def _views(self, n: int) -> list[np.ndarray]:
+        """Return one or two views of the latest n samples, in order."""
+        capacity = len(self._values)
+        start = self._start + self._length - n
+        if start >= capacity:
+            start -= capacity
+        stop = start + n
+        if stop <= capacity:
+            return [self._values[start:stop]]
+        return [self._values[start:], self._values[: stop - capacity]]
+
+    def since(self, count: int) -> np.ndarray:
+        """
+        Return a copy of the samples appended after a given count.
+
+        Parameters
+        ----------
+        count
+            The value of the count attribute at the previous read. The
+            samples that were overwritten since are not returned.
+
+        Returns
+        -------
+        np.ndarray
+
+        """
+        return self.to_array(max(self.count - count, 0))
+
+    def span(self, count: int) -> tuple[int, list[np.ndarray]]:
+        """
+        Return the samples appended after a given count, without copying.
+
+        Parameters
+        ----------
+        count
+            The value of the count attribute at the previous read, as in
+            since.
+
+        Returns
+        -------
+        first
+            The count of the first sample returned. The sample of count
+            first + i is overwritten when the sample of count first + i +
+            capacity is appended.
+        views
+            One or two views of the buffer that hold the samples, from the
+            oldest.
+
+        """
+        n = min(max(self.count - count, 0), self._length)
+        return self.count - n, self._views(n)
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class _LockWaits:
+    """Statistics of the time spent waiting to acquire a lock."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Restart the statistics from zero."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait: float) -> None:
+        """Add the wait of one acquisition, in seconds."""
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    def to_dict(self) -> dict[str, float]:
+        """Return the statistics, in seconds."""
+        return {
+            "count": self.count,
+            "total_wait": self.total,
+            "mean_wait": self.total / self.count if self.count > 0 else 0.0,
+            "max_wait": self.max,
+        }
+
+
+# Upper edges of the bins of the timing histograms, in seconds: four bins
+# per decade from 1 µs to 1 s.
+HISTOGRAM_EDGES = tuple(float(10 ** (e / 4)) for e in range(-24, 1))
+
+
+class _Histogram:
+    """Histogram of durations, in the logarithmic bins of HISTOGRAM_EDGES."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Restart the histogram from zero."""
+        self.counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        """Add one duration, in seconds."""
+        self.counts[bisect_left(HISTOGRAM_EDGES, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the histogram, in seconds."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+            "edges": list(HISTOGRAM_EDGES),
+            "counts": list(self.counts),
+        }
+
+
+class _StreamStats:
+    """Counters and timings of the messages received by a NextWheel."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Restart the statistics from zero."""
+        self.start = perf_counter()
+        self.messages = 0
+        self.frames = {sensor: 0 for sensor in SENSOR_FRAME_TYPES}
+        self.evicted = {sensor: 0 for sensor in SENSOR_FRAME_TYPES}
+        self.unknown_frames = 0
+        self.short_frames = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.latency = _Histogram()
+        self.queue_time = _Histogram()
+        self.parse = _Histogram()
+        self.wait = _Histogram()
+
+    def add(self, index: "_FrameIndex", evicted: dict[str, int]) -> None:
+        """Count the frames of a message and the samples it evicted."""
+        self.messages += 1
+        for sensor, frame_type in SENSOR_FRAME_TYPES.items():
+            self.frames[sensor] += len(index.offsets[frame_type])
+            self.evicted[sensor] += evicted.get(sensor, 0)
+        self.unknown_frames += index.unknown_frames
+        self.short_frames += index.short_frames
+
+    def to_dict(
+        self, config: GlobalConfig, messages: queue.Queue
+    ) -> dict[str, Any]:
+        """Return the statistics, with the rates and queue of a stream."""
+        elapsed = perf_counter() - self.start
+        configured_rates = {
+            "IMU": getattr(config, "imu_sampling_rate", None),
+            "Analog": getattr(config, "adc_sampling_rate", None),
+            "Encoder": getattr(config, "encoder_sampling_rate", None),
+            "Power": None,
+        }
+        return {
+            "duration": elapsed,
+            "messages": self.messages,
+            "unknown_frames": self.unknown_frames,
+            "short_frames": self.short_frames,
+            "queue": {
+                "depth": messages.qsize(),
+                "max_depth": self.max_depth,
+                "size": messages.maxsize,
+                "dropped": self.dropped,
+            },
+            "sensors": {
+                sensor: {
+                    "frames": self.frames[sensor],
+                    "evicted": self.evicted[sensor],
+                    "rate": self.frames[sensor] / elapsed,
+                    "configured_rate": configured_rates[sensor],
+                }
+                for sensor in SENSOR_FRAME_TYPES
+            },
+            "latency": self.latency.to_dict(),
+            "queue_time": self.queue_time.to_dict(),
+            "parse": self.parse.to_dict(),
+            "wait": self.wait.to_dict(),
+        }
+
+
+def _calibrate(
+    values: np.ndarray, matrix: np.ndarray, offset: np.ndarray
+) -> np.ndarray:
+    """
+    Convert the six force channels using calibration constants.
+
+    Parameters
+    ----------
+    values
+        An nx6 array of ADC values.
+    matrix, offset
+        The calibration matrix (6x6) and offset (6), as in DatDecoder.
+
+    Returns
+    -------
+    np.ndarray
+        An nx6 array of calibrated forces and moments.
+
+    """
+    # Converting first is faster than letting matmul mix the dtypes.
+    forces = values.astype(np.result_type(values, matrix)) @ matrix.T
+    forces -= offset
+    return forces
+
+
+def _format_samples(
+    adc_values: np.ndarray,
+    imu_values: np.ndarray,
+    encoder_values: np.ndarray,
+    power_values: np.ndarray,
+    calibration_matrix: np.ndarray,
+    calibration_offset: np.ndarray,
+    timebase: str = "s",
+    dtype="float64",
+) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Calibrate the forces and arrange the samples in a nested dictionary.
+
+    Parameters
+    ----------
+    adc_values, imu_values, encoder_values, power_values
+        Arrays of samples where column 0 is the time, as accumulated in the
+        buffers of NextWheel or returned by DatDecoder._decode_index.
+    calibration_matrix, calibration_offset
+        The force calibration, as in DatDecoder.
+    timebase
+        Optional. "s" or "us". See DatDecoder. The default is "s".
+    dtype
+        Optional. The floating-point dtype of every channel but "Time". The
+        default is "float64".
+
+    Returns
+    -------
+    data : dict[str, dict[str, np.ndarray]]
+        See NextWheel.fetch.
+
+    """
+    has_imu = len(imu_values) > 0
+    has_adc = len(adc_values) > 0
+    has_enc = len(encoder_values) > 0
+    has_pow = len(power_values) > 0
+
+    forces = np.array([])
+    if has_adc:
+        forces = _calibrate(
+            adc_values[:, 1:7], calibration_matrix, calibration_offset
+        )
+
+    # Output
+    data = {
+        "IMU": {
+            "Time": imu_values[:, 0] if has_imu > 0 else np.array([]),
+            "Acc": imu_values[:, 1:4] if has_imu > 0 else np.array([]),
+            "Gyro": imu_values[:, 4:7] if has_imu > 0 else np.array([]),
+            "Mag": imu_values[:, 7:] if has_imu > 0 else np.array([]),
+        },
+        "Analog": {
+            "Time": adc_values[:, 0] if has_adc > 0 else np.array([]),
+            "Force": forces,
+            "Spare": adc_values[:, 7:] if has_adc > 0 else np.array([]),
+        },
+        "Encoder": {
+            "Time": encoder_values[:, 0] if has_enc > 0 else np.array([]),
+            "Angle": encoder_values[:, 1] if has_enc > 0 else np.array([]),
+        },
+        "Power": {
+            "Time": power_values[:, 0] if has_pow > 0 else np.array([]),
+            "Voltage": power_values[:, 1] if has_pow > 0 else np.array([]),
+            "Current": power_values[:, 2] if has_pow > 0 else np.array([]),
+            "Power": power_values[:, 3] if has_pow > 0 else np.array([]),
+        },
+    }
+
+    if timebase == "us":
+        for sensor in data:
+            data[sensor]["Time"] = data[sensor]["Time"].astype(np.int64)
+
+    if np.dtype(dtype) != np.float64:
+        for sensor in data:
+            for channel in data[sensor]:
+                if channel != "Time":
+                    data[sensor][channel] = data[sensor][channel].astype(
+                        dtype
+                    )
+
+    return data
+
+
+class DatDecoder:
+    """
+    Decode the frames recorded or streamed by the instrumented wheel.
+
+    A DatDecoder owns only the parsing state (the time of the last CONFIG
+    frame and the configuration it gave), the force calibration and an
+    optional cache. It does no input/output besides reading the files it is
+    given and using its cache, so that it can be used offline and reused for
+    any number of files.
+
+    Parameters
+    ----------
+    calibration
+        Optional. The force calibration, either as a dictionary with the keys
+        "Matrix" (6x6) and "Offset" (6), or as the name of a json file with
+        this content, such as the Calibration.json file of the instrumented
+        wheel. The default is to keep the raw ADC values.
+    cache
+        Optional. A DatCache, or the name of its directory, to keep the
+        decoded files on disk for the next reads. The default is to decode
+        the files at each read.
+    timebase
+        Optional. The unit of the "Time" channels: "s" for float seconds, or
+        "us" for int64 microseconds. Integer microseconds are computed from
+        the raw timestamps without any rounding, so that samples of different
+        sensors can be matched exactly. Convert them to seconds when needed,
+        e.g., data["Analog"]["Time"] / 1e6. The default is "s".
+    dtype
+        Optional. The dtype of every channel but "Time", e.g., "float32" to
+        halve the memory used. If "raw", the channels keep the type of the
+        frames' payloads (uint16 for the ADC, int16 for the IMU, int64 for
+        the encoder, float32 for the power), without calibration nor
+        conversion. The IMU dictionary then also holds "AccScale",
+        "GyroScale" and "MagScale", nx1 arrays of the factor that converts
+        each sample, e.g., data["IMU"]["Acc"] * data["IMU"]["AccScale"]. The
+        default is "float64".
+
+    Exemple
+    -------
+    >>> from nextwheel import DatDecoder
+    >>> decoder = DatDecoder("Calibration.json")
+    >>> for filename in filenames:
+    ...     data = decoder.read_dat(filename)
+
+    """
+
+    def __init__(
+        self,
+        calibration: dict | str | None = None,
+        *,
+        cache: "DatCache | str | None" = None,
+        timebase: str = "s",
+        dtype="float64",
+    ):
+        self.TIME_ZERO = 0
+        self._config = GlobalConfig()
+
+        if dtype != "raw":
+            dtype = np.dtype(dtype)
+            if dtype.kind != "f":
+                raise ValueError(
+                    f"Invalid dtype {dtype}. Use a floating-point dtype or "
+                    "raw."
+                )
+        self.dtype = dtype
+
+        if timebase not in ("s", "us"):
+            raise ValueError(
+                f"Unknown timebase {timebase}. Valid timebases are s and us."
+            )
+        self.timebase = timebase
+
+        if cache is not None and not isinstance(cache, DatCache):
+            cache = DatCache(cache)
+        self.cache = cache
+
+        if calibration is None:
+            self.CALIBRATION_MATRIX = np.identity(6)
+            self.CALIBRATION_OFFSET = np.zeros((6,))
+            return
+
+        if not isinstance(calibration, Mapping):
+            with open(calibration, "r") as json_file:
+                calibration = json.load(json_file)
+        self.CALIBRATION = calibration
+        self.CALIBRATION_MATRIX = np.array(calibration["Matrix"])
+        self.CALIBRATION_OFFSET = np.array(calibration["Offset"])
+
+    @property
+    def config(self) -> GlobalConfig:
+        """The configuration given by the last CONFIG frame decoded."""
+        return self._config
+
+    def reset(self) -> None:
+        """Forget TIME_ZERO and the configuration, as for a new recording."""
+        self.TIME_ZERO = 0
+        self._config = GlobalConfig()
+
+    def _decode_index(
+        self, index: "_FrameIndex", frame_types=None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Decode indexed frames and update TIME_ZERO and the configuration.
+
+        Parameters
+        ----------
+        index
+            The frames to decode, indexed using the current TIME_ZERO and
+            configuration.
+        frame_types
+            Optional. Decode only these data frame types. The values of the
+            other types are empty. The default is to decode every type.
+
+        Returns
+        -------
+        values
+            A tuple of (adc_values, imu_values, encoder_values, power_values).
+            See _FrameIndex.values.
+
+        """
+        # Leave the state of the last CONFIG frame for the next stream
+        self.TIME_ZERO = index.time_zeros[-1]
+        self._config = index.configs[-1]
+
+        if frame_types is not None:
+            index = index.select(frame_types)
+
+        return (
+            index.values(FrameType.ADC, self.timebase),
+            index.values(FrameType.IMU, self.timebase),
+            index.values(FrameType.ENCODER, self.timebase),
+            index.values(FrameType.POWER, self.timebase),
+        )
+
+    def _format_data(
+        self,
+        adc_values: np.ndarray,
+        imu_values: np.ndarray,
+        encoder_values: np.ndarray,
+        power_values: np.ndarray,
+        dtype=None,
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Calibrate the forces and arrange the samples in a nested dictionary.
+
+        Parameters
+        ----------
+        adc_values, imu_values, encoder_values, power_values
+            Arrays of samples where column 0 is the time, as accumulated in
+            the buffers of NextWheel or returned by _decode_index.
+        dtype
+            Optional. The floating-point dtype of every channel but "Time".
+            The default is the decoder's dtype.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See NextWheel.fetch.
+
+        """
+        return _format_samples(
+            adc_values,
+            imu_values,
+            encoder_values,
+            power_values,
+            self.CALIBRATION_MATRIX,
+            self.CALIBRATION_OFFSET,
+            self.timebase,
+            self.dtype if dtype is None else dtype,
+        )
+
+    def _format_raw_data(
+        self, index: "_FrameIndex"
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Arrange the raw payloads of an index in a nested dictionary.
+
+        Parameters
+        ----------
+        index
+            The frames to arrange.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See DatDecoder and NextWheel.fetch.
+
+        """
+        if self.timebase == "us":
+            time_getter, time_type = _FrameIndex.time_us, np.int64
+        else:
+            time_getter, time_type = _FrameIndex.time, np.float64
+
+        def time(frame_type: FrameType) -> np.ndarray:
+            """Return the time of a frame type, decoded by blocks."""
+            return index.decode(
+                frame_type,
+                {
+                    "Time": (
+                        lambda block: time_getter(block, frame_type),
+                        time_type,
+                    )
+                },
+            )["Time"]
+
+        imu = index.payload(FrameType.IMU)
+        adc = index.payload(FrameType.ADC)
+        power = index.payload(FrameType.POWER)
+
+        return {
+            "IMU": {
+                "Time": time(FrameType.IMU),
+                "Acc": imu["accel"],
+                "Gyro": imu["gyro"],
+                "Mag": imu["mag"],
+                "AccScale": index.imu_scales("accel"),
+                "GyroScale": index.imu_scales("gyro"),
+                "MagScale": index.imu_scales("mag"),
+            },
+            "Analog": {
+                "Time": time(FrameType.ADC),
+                "Force": adc["force"],
+                "Spare": adc["spare"],
+            },
+            "Encoder": {
+                "Time": time(FrameType.ENCODER),
+                "Angle": index.payload(FrameType.ENCODER, "angle"),
+            },
+            "Power": {
+                "Time": time(FrameType.POWER),
+                "Voltage": power["voltage"],
+                "Current": power["current"],
+                "Power": power["power"],
+            },
+        }
+
+    def _format_index(self, index: "_FrameIndex", frame_types=None) -> dict:
+        """
+        Decode indexed frames into a nested dictionary, in the decoder's dtype.
+
+        TIME_ZERO and the configuration are updated as by _decode_index. The
+        channels of each sensor are decoded together, reading each frame
+        once, without the arrays of samples of _decode_index, which are only
+        needed to append the samples to buffers.
+
+        Parameters
+        ----------
+        index
+            The frames to decode, indexed using the current TIME_ZERO and
+            configuration.
+        frame_types
+            Optional. Decode only these data frame types. The default is to
+            decode every type.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See NextWheel.fetch.
+
+        """
+        self.TIME_ZERO = index.time_zeros[-1]
+        self._config = index.configs[-1]
+        if frame_types is not None:
+            index = index.select(frame_types)
+        if self.dtype == "raw":
+            return self._format_raw_data(index)
+        return {
+            sensor: index.decode(frame_type, channels)
+            for sensor, (frame_type, channels) in self._channels().items()
+        }
+
+    def _format_lazy_data(self, index: "_FrameIndex") -> dict[str, Mapping]:
+        """
+        Arrange the frames of an index in a nested dictionary, lazily.
+
+        Each channel is decoded, converted and calibrated only when it is
+        first accessed, straight into an array of the decoder's dtype (see
+        _FrameIndex.decode).
+
+        Parameters
+        ----------
+        index
+            The frames to arrange.
+
+        Returns
+        -------
+        data : dict[str, Mapping[str, np.ndarray]]
+            See NextWheel.fetch.
+
+        """
+
+        def channel(frame_type: FrameType, name: str, spec: tuple):
+            """Return a getter that decodes a single channel."""
+            return lambda: index.decode(frame_type, {name: spec})[name]
+
+        return {
+            sensor: _LazyDict(
+                {
+                    name: channel(frame_type, name, spec)
+                    for name, spec in channels.items()
+                }
+            )
+            for sensor, (frame_type, channels) in self._channels().items()
+        }
+
+    def _channels(
+        self,
+    ) -> dict[str, tuple[FrameType, dict[str, tuple[Callable, Any]]]]:
+        """
+        Return how to decode each channel, as given to _FrameIndex.decode.
+
+        Returns
+        -------
+        dict[str, tuple[FrameType, dict[str, tuple[Callable, Any]]]]
+            For each sensor, its frame type and, for each of its channels,
+            the function that returns its values for the frames of an index
+            and the dtype of these values.
+
+        """
+        float_type = self.dtype
+        if self.timebase == "us":
+            time_getter, time_type = _FrameIndex.time_us, np.int64
+        else:
+            time_getter, time_type = _FrameIndex.time, np.float64
+
+        def time(frame_type: FrameType) -> tuple[Callable, Any]:
+            """Return the time of a frame type."""
+            return (lambda index: time_getter(index, frame_type), time_type)
+
+        def field(frame_type: FrameType, name: str) -> tuple[Callable, Any]:
+            """Return a payload field, as float_type."""
+            return (lambda index: index.payload(frame_type, name), float_type)
+
+        def imu(name: str) -> tuple[Callable, Any]:
+            """Return a converted IMU field."""
+            return (lambda index: index.imu(name), float_type)
+
+        def forces(index: "_FrameIndex") -> np.ndarray:
+            """Return the calibrated forces."""
+            return self._calibrate_forces(
+                index.payload(FrameType.ADC, "force")
+            )
+
+        return {
+            "IMU": (
+                FrameType.IMU,
+                {
+                    "Time": time(FrameType.IMU),
+                    "Acc": imu("accel"),
+                    "Gyro": imu("gyro"),
+                    "Mag": imu("mag"),
+                },
+            ),
+            "Analog": (
+                FrameType.ADC,
+                {
+                    "Time": time(FrameType.ADC),
+                    "Force": (forces, float_type),
+                    "Spare": field(FrameType.ADC, "spare"),
+                },
+            ),
+            "Encoder": (
+                FrameType.ENCODER,
+                {
+                    "Time": time(FrameType.ENCODER),
+                    "Angle": field(FrameType.ENCODER, "angle"),
+                },
+            ),
+            "Power": (
+                FrameType.POWER,
+                {
+                    "Time": time(FrameType.POWER),
+                    "Voltage": field(FrameType.POWER, "voltage"),
+                    "Current": field(FrameType.POWER, "current"),
+                    "Power": field(FrameType.POWER, "power"),
+                },
+            ),
+        }
+
+    def _calibrate_forces(self, values: np.ndarray) -> np.ndarray:
+        """
+        Convert the six force channels using the calibration constants.
+
+        Parameters
+        ----------
+        values
+            An nx6 array of ADC values.
+
+        Returns
+        -------
+        np.ndarray
+            An nx6 array of calibrated forces and moments.
+
+        """
+        return _calibrate(
+            values, self.CALIBRATION_MATRIX, self.CALIBRATION_OFFSET
+        )
+
+    def read_dat(
+        self,
+        filename,
+        *,
+        mmap: bool = False,
+        t_start: float | None = None,
+        t_end: float | None = None,
+        sensors=None,
+        workers: int = 1,
+    ) -> dict:
+        """
+        Read a dat file downloaded from the instrumented wheel.
+
+        Parameters
+        ----------
+        filename
+            The name of the local file to read.
+        mmap
+            Optional. If True, the file is memory-mapped instead of being
+            read in memory, and each channel (e.g., data["Analog"]["Force"])
+            is decoded only when it is first accessed. This allows opening
+            files that are larger than the available memory. The default is
+            False.
+        t_start, t_end
+            Optional. Read only the samples in this time range, in seconds,
+            inclusively. The file is then accessed through its sidecar index
+            (see index_dat), which is built on the first time-range read, so
+            that only the parts of the file that contain this time range are
+            decoded. The default is to read every sample.
+        sensors
+            Optional. Read only these sensors, among "IMU", "Analog",
+            "Encoder" and "Power". The channels of the other sensors are
+            empty. The default is to read every sensor.
+        workers
+            Optional. Split the file in up to this number of ranges and decode
+            them in parallel on a pool of processes. Each range is at least
+            PARALLEL_MIN_SIZE bytes. Only used when reading the whole file in
+            memory (mmap is False and no time range). The default is 1.
+
+        Returns
+        -------
+        dict
+            A dictionary with the same structure as given by NextWheel.fetch.
+            If mmap is True, the inner dictionaries are read-only mappings.
+            If the decoder has a cache, the arrays are read-only memory maps
+            of the cache, and mmap is not used.
+
+        """
+        frame_types = _sensor_frame_types(sensors)
+
+        if self.cache is not None:
+            return self._read_dat_cached(
+                filename, frame_types, t_start, t_end, workers
+            )
+        return self._read_dat(
+            filename, frame_types, mmap, t_start, t_end, workers
+        )
+
+    def _read_dat(
+        self,
+        filename,
+        frame_types: list[FrameType],
+        mmap: bool,
+        t_start: float | None,
+        t_end: float | None,
+        workers: int,
+    ) -> dict:
+        """Decode a dat file, without cache. See DatDecoder.read_dat."""
+        # Each file starts with its own CONFIG frame
+        self.reset()
+
+        if (
+            workers > 1
+            and self.dtype != "raw"
+            and not mmap
+            and t_start is None
+            and t_end is None
+        ):
+            values = self._read_dat_parallel(filename, frame_types, workers)
+            if values is not None:
+                return self._format_data(*values)
+
+        if t_start is None and t_end is None:
+            index = _FrameIndex.scan(_open_dat(filename, mmap))
+            index = index.select(frame_types)
+        else:
+            index = _read_time_range(
+                _open_dat(filename, mmap=True),
+                index_dat(filename),
+                -np.inf if t_start is None else t_start,
+                np.inf if t_end is None else t_end,
+                frame_types,
+            )
+
+        if mmap and self.dtype != "raw":
+            return self._format_lazy_data(index)
+
+        return self._format_index(index)
+
+    def _read_dat_cached(
+        self,
+        filename,
+        frame_types: list[FrameType],
+        t_start: float | None,
+        t_end: float | None,
+        workers: int,
+    ) -> dict:
+        """
+        Read a dat file from the cache, after caching it if needed.
+
+        The whole file is cached, then the sensors and time range are
+        selected from the cached arrays. See DatDecoder.read_dat.
+        """
+        key = self.cache.key(filename, self)
+        data = self.cache.load(key)
+        if data is None:
+            data = self._read_dat(
+                filename,
+                list(SENSOR_FRAME_TYPES.values()),
+                False,
+                None,
+                None,
+                workers,
+            )
+            self.cache.save(key, data)
+            data = self.cache.load(key) or data
+
+        for sensor, frame_type in SENSOR_FRAME_TYPES.items():
+            if frame_type not in frame_types:
+                # Empty channels of the dtype of the cached ones, with the
+                # shapes given by _format_raw_data or _format_data (1-D)
+                data[sensor] = {
+                    channel: (
+                        values[:0]
+                        if self.dtype == "raw"
+                        else values[:0].reshape(0)
+                    )
+                    for channel, values in data[sensor].items()
+                }
+            elif t_start is not None or t_end is not None:
+                time = data[sensor]["Time"]
+                if len(time) == 0:
+                    continue
+                scale = 1e6 if self.timebase == "us" else 1
+                keep = (
+                    time >= (-np.inf if t_start is None else t_start * scale)
+                ) & (time <= (np.inf if t_end is None else t_end * scale))
+                data[sensor] = {
+                    channel: values[keep]
+                    for channel, values in data[sensor].items()
+                }
+        return data
+
+    def _read_dat_parallel(
+        self, filename, frame_types: list[FrameType], workers: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None:
+        """
+        Decode ranges of a dat file in parallel and stitch them together.
+
+        The ranges are split at frame boundaries found by _sync_frames. Each
+        range is decoded by _decode_range without knowing the state at its
+        start. The state is then carried from one range to the next here, to
+        correct the time and IMU values of the frames that precede the first
+        CONFIG frame of each range.
+
+        Parameters
+        ----------
+        filename
+            The name of the local file to read.
+        frame_types
+            The data frame types to decode.
+        workers
+            The maximal number of ranges.
+
+        Returns
+        -------
+        values
+            A tuple of (adc_values, imu_values, encoder_values, power_values)
+            as returned by _decode_index, or None if the file is too small
+            to be split or if the ranges do not link to each other, in which
+            case it must be decoded serially.
+
+        """
+        size = os.path.getsize(filename)
+        n_ranges = min(workers, size // PARALLEL_MIN_SIZE)
+        if n_ranges < 2:
+            return None
+
+        raw = _open_dat(filename, mmap=True)
+        starts = [0]
+        for i_range in range(1, n_ranges):
+            start = _sync_frames(raw, size * i_range // n_ranges)
+            if start is not None and start > starts[-1]:
+                starts.append(start)
+        if len(starts) < 2:
+            return None
+        stops = starts[1:] + [size]
+
+        with _process_pool(max_workers=len(starts)) as executor:
+            futures = [
+                executor.submit(
+                    _decode_range,
+                    filename,
+                    start,
+                    stop,
+                    frame_types,
+                    self.timebase,
+                )
+                for start, stop in zip(starts, stops)
+            ]
+            try:
+                results = []
+                for future in futures:
+                    name, layout, *info = future.result()
+                    results.append((_receive_arrays(name, layout), *info))
+            except ValueError:
+                # Maybe a range started inside a payload. Let the serial
+                # decoder tell.
+                return None
+            finally:
+                _discard_shared(futures[len(results) :])
+
+        time_zero = self.TIME_ZERO
+        time_zero_us = round(self.TIME_ZERO * 1e6)
+        config = self._config
+        pieces = [[], [], [], []]  # type: list[list[np.ndarray]]
+        for i_range, (arrays, heads, timestamps, payloads, end) in enumerate(
+            results
+        ):
+            if i_range < len(results) - 1 and end != stops[i_range]:
+                return None
+
+            # Correct the frames that precede the range's first CONFIG frame
+            *values, imu_heads = arrays
+            for frame_values, head in zip(values, heads):
+                if self.timebase == "us":
+                    frame_values[:head, 0] -= time_zero_us
+                else:
+                    frame_values[:head, 0] -= time_zero
+            imu_values = values[1]
+            imu_values[: heads[1], 1:4] = config.convert_accel_values(
+                imu_heads["accel"]
+            )
+            imu_values[: heads[1], 4:7] = config.convert_gyro_values(
+                imu_heads["gyro"]
+            )
+            imu_values[: heads[1], 7:10] = config.convert_mag_values(
+                imu_heads["mag"]
+            )
+
+            for timestamp, payload in zip(timestamps, payloads):
+                time_zero = int(timestamp) / 1e6
+                time_zero_us = int(timestamp)
+                config = _config_from_frame(config, payload)
+
+            for piece, frame_values in zip(pieces, values):
+                piece.append(frame_values)
+
+        return tuple(np.concatenate(piece) for piece in pieces)
+
+    def iter_dat(
+        self,
+        filename,
+        *,
+        chunk_size: int = 1 << 24,
+        duration: float | None = None,
+        sensors=None,
+    ) -> Iterator[dict]:
+        """
+        Read a dat file by chunks, with constant memory.
+
+        The file is read and decoded progressively. TIME_ZERO and the
+        configuration given by the CONFIG frames are carried from one chunk
+        to the next, so that concatenating every chunk gives the same samples
+        as read_dat.
+
+        Parameters
+        ----------
+        filename
+            The name of the local file to read.
+        chunk_size
+            Optional. The number of bytes read from the file at once. If
+            duration is None, each chunk holds the frames of chunk_size bytes
+            of file. The default is 16 MiB.
+        duration
+            Optional. If set, each chunk holds the frames of this duration in
+            seconds, in the order of the file: a chunk ends before the first
+            frame whose timestamp is at least duration seconds after the
+            timestamp of the chunk's first frame. The default is None.
+        sensors
+            Optional. Read only these sensors, among "IMU", "Analog",
+            "Encoder" and "Power". The channels of the other sensors are
+            empty. The default is to read every sensor.
+
+        Yields
+        ------
+        dict
+            A dictionary with the same structure as given by NextWheel.fetch.
+            The chunks without samples of the read sensors are skipped.
+
+        """
+        frame_types = _sensor_frame_types(sensors)
+
+        # Each file starts with its own CONFIG frame
+        self.reset()
+
+        buffer = b""
+        chunk_start = None  # Timestamp in us of the current chunk's start
+        with open(filename, "rb") as fid:
+            at_end = False
+            while not at_end:
+                data = fid.read(chunk_size)
+                at_end = len(data) == 0
+                buffer = buffer + data
+                offsets, end = _scan_frames(buffer)
+
+                if at_end or duration is None:
+                    cuts = [end]
+                else:
+                    cuts, chunk_start = _duration_cuts(
+                        buffer, offsets, chunk_start, duration
+                    )
+
+                position = 0
+                for cut in cuts:
+                    chunk_offsets = offsets[
+                        np.searchsorted(offsets, position) : np.searchsorted(
+                            offsets, cut
+                        )
+                    ]
+                    position = cut
+                    if len(chunk_offsets) == 0:
+                        continue
+                    index = _FrameIndex.from_offsets(
+                        buffer,
+                        chunk_offsets,
+                        self.TIME_ZERO,
+                        self._config,
+                        end=cut,
+                    )
+                    data = self._format_index(index, frame_types)
+                    if all(
+                        len(channels["Time"]) == 0
+                        for channels in data.values()
+                    ):
+                        continue  # e.g., only a CONFIG frame before the cut
+                    yield data
+
+                buffer = buffer[position:]
+
+
+class Subscription:
+    """
+    Delivery of the live samples of a NextWheel to a callback.
+
+    Use NextWheel.subscribe to create a subscription. The samples of each
+    message are queued by the decoder thread, then batched and passed to
+    the callback by a dispatcher thread, so that a slow callback never
+    delays the reception. When the queue is full, the samples of the new
+    messages are dropped and counted.
+
+    Attributes
+    ----------
+    sensors
+        The sensors delivered to the callback.
+    delivered
+        The number of samples passed to the callback.
+    dropped
+        The number of samples dropped because the queue was full.
+    batches
+        The number of calls to the callback.
+    error
+        The exception that stopped the dispatcher thread, or None. The
+        exceptions of the callback are printed and do not stop it. It is
+        raised again when the subscription is cancelled.
+
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[dict], Any],
+        format_data: Callable[..., dict],
+        sensors: list[str],
+        min_batch: int,
+        max_latency: float,
+        queue_size: int,
+        dtype,
+    ):
+        self.sensors = sensors
+        self.delivered = 0
+        self.dropped = 0
+        self.batches = 0
+        self.error = None  # type: Exception | None
+        self._callback = callback
+        self._format_data = format_data
+        self._min_batch = min_batch
+        self._max_latency = max_latency
+        self._dtype = dtype
+
+        # Position of each sensor in the values tuple of _put
+        positions = {"Analog": 0, "IMU": 1, "Encoder": 2, "Power": 3}
+        self._positions = [positions[sensor] for sensor in sensors]
+
+        self._queue = queue.Queue(queue_size)  # type: queue.Queue
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _count(self, values: tuple) -> int:
+        """Return the number of samples of the subscribed sensors."""
+        return sum(len(values[position]) for position in self._positions)
+
+    def _put(self, values: tuple) -> None:
+        """
+        Queue the samples of a message, without waiting.
+
+        Parameters
+        ----------
+        values
+            A tuple of (adc_values, imu_values, encoder_values,
+            power_values), as returned by DatDecoder._decode_index.
+
+        """
+        n_samples = self._count(values)
+        if n_samples == 0:
+            return
+        try:
+            self._queue.put_nowait(values)
+        except queue.Full:
+            self.dropped += n_samples
+
+    def _run(self) -> None:
+        """Batch the queued samples and pass them to the callback."""
+        try:
+            self._dispatch()
+        except Exception as error:
+            # Raised again by _cancel
+            self.error = error
+
+    def _dispatch(self) -> None:
+        """Deliver the queued samples in batches, until cancelled."""
+        pending = []  # type: list[tuple]
+        n_pending = 0
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - perf_counter(), 0) if pending else None
+            try:
+                values = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                values = ()  # max_latency elapsed
+
+            if values is None:  # Cancelled
+                break
+            if len(values) > 0:
+                if len(pending) == 0:
+                    deadline = perf_counter() + self._max_latency
+                pending.append(values)
+                n_pending += self._count(values)
+                if (
+                    n_pending < self._min_batch
+                    and perf_counter() < deadline
+                ):
+                    continue
+
+            self._deliver(pending)
+            pending = []
+            n_pending = 0
+
+        if len(pending) > 0:
+            self._deliver(pending)
+
+    def _deliver(self, pending: list[tuple]) -> None:
+        """Pass a batch of queued samples to the callback."""
+        values = [
+            np.concatenate([item[i_sensor] for item in pending])
+            for i_sensor in range(4)
+        ]
+        data = self._format_data(*values, self._dtype)
+        self.delivered += sum(len(values[i]) for i in self._positions)
+        self.batches += 1
+        try:
+            self._callback({sensor: data[sensor] for sensor in self.sensors})
+        except Exception:
+            traceback.print_exc()
+
+    def _cancel(self) -> None:
+        """Deliver the queued samples, stop the thread and raise any error."""
+        _stop_thread(self._thread, self._queue)
+        if self.error is not None:
+            raise self.error
+
+
+def _stop_thread(thread: threading.Thread, items: queue.Queue) -> None:
+    """
+    Queue the None that stops a thread, then wait for the thread to end.
+
+    The None is queued only while the thread runs, so that a thread that
+    stopped on an error, with its queue full, does not block the caller.
+    """
+    while thread.is_alive():
+        try:
+            items.put(None, timeout=0.1)
+            break
+        except queue.Full:
+            pass
+    thread.join()
+
+
+class StreamRecorder:
+    """
+    Recording of the raw messages of a NextWheel stream to dat files.
+
+    Use NextWheel.start_streaming(record=...) to create a recorder. Each
+    message is queued by the decoder thread, then written byte for byte by
+    a writer thread, in batches, so that writing never delays the reception.
+    When the queue is full, the new messages are dropped and counted.
+
+    The messages are written to filename_000.dat, filename_001.dat, etc. A
+    new file is started when the current one would exceed max_size bytes or
+    was started max_duration seconds ago. It starts with a copy of the last
+    CONFIG frame, so that each file can be read on its own by read_dat. The
+    sidecar index of each file (see index_dat) is built while writing and
+    saved when the file is closed, so that time-range reads do not scan the
+    file first.
+
+    Attributes
+    ----------
+    filenames
+        The names of the files written so far.
+    messages
+        The number of messages written.
+    dropped
+        The number of messages dropped because the queue was full.
+    error
+        The exception that stopped the writer thread, or None. It is raised
+        again when the recorder is closed.
+
+    """
+
+    def __init__(
+        self,
+        filename,
+        *,
+        max_size: int | None = None,
+        max_duration: float | None = None,
+        queue_size: int = 1000,
+    ):
+        stem, extension = os.path.splitext(os.fspath(filename))
+        self._stem = stem if extension == ".dat" else os.fspath(filename)
+        self._max_size = max_size
+        self._max_duration = max_duration
+
+        self.filenames = []  # type: list[str]
+        self.messages = 0
+        self.dropped = 0
+        self.error = None  # type: Exception | None
+
+        # Last CONFIG frame written, copied at the start of the next file
+        self._config_frame = None  # type: bytes | None
+        self._fid = None
+
+        self._closed = False
+        self._queue = queue.Queue(queue_size)  # type: queue.Queue
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(
+        self, message: bytes, offsets: dict[FrameType, np.ndarray]
+    ) -> None:
+        """
+        Queue a message, without waiting.
+
+        Parameters
+        ----------
+        message
+            The message, as received.
+        offsets
+            The position of its frames, for each frame type, as in the
+            offsets attribute of _FrameIndex.
+
+        """
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait((message, offsets))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        """Write the queued messages in batches, until closed."""
+        closed = False
+        try:
+            while not closed:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    closed = True
+                    batch = batch[: batch.index(None)]
+
+                for message, offsets in batch:
+                    if self._must_rotate(len(message)):
+                        self._open_file()
+                    self._add(message, offsets)
+                    self.messages += 1
+                    self._file_messages += 1
+                self._write()
+            self._close_file()
+        except Exception as error:
+            # e.g., OSError on a full disk; raised again by _close
+            self.error = error
+
+    def _must_rotate(self, size: int) -> bool:
+        """Return whether a message of this size must start a new file."""
+        if self._fid is None:
+            return True
+        if self._file_messages == 0:
+            return False
+        if (
+            self._max_size is not None
+            and self._position + size > self._max_size
+        ):
+            return True
+        return (
+            self._max_duration is not None
+            and perf_counter() - self._opened >= self._max_duration
+        )
+
+    def _open_file(self) -> None:
+        """Close the current file and start the next one."""
+        self._write()
+        self._close_file()
+
+        filename = f"{self._stem}_{len(self.filenames):03d}.dat"
+        self._fid = open(filename, "wb")
+        self.filenames.append(filename)
+        self._opened = perf_counter()
+        self._file_messages = 0
+
+        # Parsing state and index of the file
+        self._position = 0
+        self._pending = []  # type: list[tuple[int, bytes, dict]]
+        self._time_zero = 0.0
+        self._config = GlobalConfig()
+        self._chunk_offsets = []  # type: list[int]
+        self._time_min = []  # type: list[np.ndarray]
+        self._time_max = []  # type: list[np.ndarray]
+        self._config_offsets = []  # type: list[np.ndarray]
+
+        if self._config_frame is not None:
+            self._add(
+                self._config_frame,
+                {FrameType.CONFIG: np.zeros(1, dtype=np.int64)},
+            )
+
+    def _add(self, message: bytes, offsets: dict) -> None:
+        """Append a message to the messages to write."""
+        self._pending.append((self._position, message, offsets))
+        self._position += len(message)
+
+    def _write(self) -> None:
+        """Write the pending messages at once, and index them."""
+        if self._fid is None or len(self._pending) == 0:
+            return
+        start = self._pending[0][0]
+        data = b"".join([message for _, message, _ in self._pending])
+        empty = np.zeros(0, dtype=np.int64)
+        index = _FrameIndex(
+            data,
+            {
+                frame_type: np.concatenate(
+                    [
+                        offsets.get(frame_type, empty) + position - start
+                        for position, _, offsets in self._pending
+                    ]
+                )
+                for frame_type in PAYLOAD_DTYPES
+            },
+            self._time_zero,
+            self._config,
+        )
+        self._time_zero = index.time_zeros[-1]
+        self._config = index.configs[-1]
+
+        # Start a chunk on the first message after each INDEX_CHUNK_SIZE
+        # bytes, as _build_index does on frames.
+        for position, _, _ in self._pending:
+            if (
+                len(self._chunk_offsets) == 0
+                or position // INDEX_CHUNK_SIZE
+                > self._chunk_offsets[-1] // INDEX_CHUNK_SIZE
+            ):
+                self._chunk_offsets.append(position)
+                self._time_min.append(np.full(len(SENSOR_FRAME_TYPES), np.nan))
+                self._time_max.append(np.full(len(SENSOR_FRAME_TYPES), np.nan))
+
+        for i_sensor, frame_type in enumerate(SENSOR_FRAME_TYPES.values()):
+            if len(index.offsets[frame_type]) == 0:
+                continue
+            time = index.time(frame_type)
+            chunks = (
+                np.searchsorted(
+                    self._chunk_offsets,
+                    index.offsets[frame_type].astype(np.int64) + start,
+                    side="right",
+                )
+                - 1
+            )
+            chunks, starts = np.unique(chunks, return_index=True)
+            for chunk, time_min, time_max in zip(
+                chunks,
+                np.minimum.reduceat(time, starts),
+                np.maximum.reduceat(time, starts),
+            ):
+                self._time_min[chunk][i_sensor] = np.fmin(
+                    self._time_min[chunk][i_sensor], time_min
+                )
+                self._time_max[chunk][i_sensor] = np.fmax(
+                    self._time_max[chunk][i_sensor], time_max
+                )
+
+        config_offsets = index.offsets[FrameType.CONFIG]
+        if len(config_offsets) > 0:
+            self._config_offsets.append(
+                config_offsets.astype(np.int64) + start
+            )
+            offset = int(config_offsets[-1])
+            self._config_frame = data[
+                offset : offset + HEADER_DTYPE.itemsize + data[offset + 9]
+            ]
+
+        self._fid.write(data)
+        self._pending = []
+
+    def _close_file(self) -> None:
+        """Close the current file and save its index."""
+        if self._fid is None:
+            return
+        self._fid.close()
+        self._fid = None
+
+        filename = self.filenames[-1]
+        stat = os.stat(filename)
+        index = {
+            "version": np.array(INDEX_VERSION),
+            "size": np.array(stat.st_size),
+            "mtime_ns": np.array(stat.st_mtime_ns),
+            "chunk_offsets": np.array(
+                self._chunk_offsets + [self._position], dtype=np.int64
+            ),
+            "time_min": np.reshape(
+                self._time_min, (-1, len(SENSOR_FRAME_TYPES))
+            ),
+            "time_max": np.reshape(
+                self._time_max, (-1, len(SENSOR_FRAME_TYPES))
+            ),
+            "config_offsets": np.concatenate(
+                [np.zeros(0, dtype=np.int64)] + self._config_offsets
+            ),
+        }
+        try:
+            with open(f"{filename}.idx", "wb") as fid:
+                np.savez(fid, **index)
+        except OSError:
+            pass
+
+    def _close(self) -> None:
+        """Write the queued messages, close the file and raise any error."""
+        if self._closed:
+            return
+        self._closed = True
+        _stop_thread(self._thread, self._queue)
+        if self.error is not None:
+            raise self.error
+
+
+# Layout of the header of the shared memory block of SharedBuffers. The
+# arrays of each sensor follow, in the order of SENSOR_FRAME_TYPES, each
+# aligned on SHARED_ALIGNMENT bytes.
+SHARED_VERSION = 1
+SHARED_HEADER_DTYPE = np.dtype(
+    [
+        ("version", "<u8"),
+        ("time_zero", "<f8"),
+        ("calibration_matrix", "<f8", (6, 6)),
+        ("calibration_offset", "<f8", (6,)),
+        ("sequence", "<u8", (4,)),
+        ("count", "<u8", (4,)),
+        ("capacity", "<u8", (4,)),
+        ("n_columns", "<u8", (4,)),
+    ]
+)
+
+# A reader of SharedBuffers waits SHARED_READ_BACKOFF seconds between its
+# attempts while samples are being written, and gives up after
+# SHARED_READ_TIMEOUT seconds.
+SHARED_READ_BACKOFF = 0.0001
+SHARED_READ_TIMEOUT = 1.0
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a shared memory block created by another process."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        # Otherwise, the block is freed when this process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedBuffers:
+    """
+    Latest samples of a NextWheel stream, shared with other processes.
+
+    NextWheel.publish copies the samples of each message to ring buffers in
+    a shared memory block. Any local process can attach to this block by its
+    name and read the latest samples, without connecting to the wheel.
+
+    The arrays attribute holds the ring buffers themselves, for zero-copy
+    reads. For each sensor, the header holds the count of the samples ever
+    written, so that sample k is at row k % capacity, and a sequence number
+    that is odd while samples are being written and is incremented after.
+    A read is consistent if the sequence number was even and did not change
+    during the read. peek, latest and read_since return such consistent
+    copies, as the NextWheel methods of the same name, and raise TimeoutError
+    if the sequence number stays odd for SHARED_READ_TIMEOUT seconds, as when
+    the publisher died while writing.
+
+    Parameters
+    ----------
+    name
+        The name of the shared memory block, as returned by
+        NextWheel.publish.
+    capacities
+        Optional. Create a new block where each sensor keeps this number of
+        samples, instead of attaching to an existing block. Used by
+        NextWheel.publish.
+
+    Attributes
+    ----------
+    name
+        The name of the shared memory block.
+    arrays
+        For each sensor, its ring buffer, where column 0 is the time.
+    TIME_ZERO
+        The TIME_ZERO of the publisher.
+
+    Exemple
+    -------
+    >>> from nextwheel import SharedBuffers
+    >>> shared = SharedBuffers(name)  # In another process
+    >>> data = shared.latest()
+    >>> shared.close()
+
+    """
+
+    def __init__(
+        self, name: str | None, *, capacities: dict[str, int] | None = None
+    ):
+        n_columns = {"IMU": 10, "Analog": 9, "Encoder": 2, "Power": 5}
+        header_size = -(-SHARED_HEADER_DTYPE.itemsize // SHARED_ALIGNMENT)
+        header_size *= SHARED_ALIGNMENT
+
+        if capacities is None:
+            self._shm = _attach_shared_memory(name)
+            self._header = np.ndarray(
+                (), SHARED_HEADER_DTYPE, buffer=self._shm.buf
+            )
+            if self._header["version"] != SHARED_VERSION:
+                self._header = None
+                self._shm.close()
+                raise ValueError(
+                    f"The shared memory block {name} is not from this "
+                    "version of nextwheel."
+                )
+            capacity = [int(value) for value in self._header["capacity"]]
+        else:
+            capacity = [capacities[sensor] for sensor in SENSOR_FRAME_TYPES]
+            size = header_size
+            for sensor, n_samples in zip(SENSOR_FRAME_TYPES, capacity):
+                nbytes = n_samples * n_columns[sensor] * 8
+                size += -(-nbytes // SHARED_ALIGNMENT) * SHARED_ALIGNMENT
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=size
+            )
+            self._header = np.ndarray(
+                (), SHARED_HEADER_DTYPE, buffer=self._shm.buf
+            )
+            self._header["version"] = SHARED_VERSION
+            self._header["calibration_matrix"] = np.identity(6)
+            self._header["capacity"] = capacity
+            self._header["n_columns"] = list(n_columns.values())
+        self._owner = capacities is not None
+        self.name = self._shm.name
+
+        self.arrays = {}  # type: dict[str, np.ndarray]
+        offset = header_size
+        for sensor, n_samples in zip(SENSOR_FRAME_TYPES, capacity):
+            self.arrays[sensor] = np.ndarray(
+                (n_samples, n_columns[sensor]),
+                np.float64,
+                buffer=self._shm.buf,
+                offset=offset,
+            )
+            nbytes = self.arrays[sensor].nbytes
+            offset += -(-nbytes // SHARED_ALIGNMENT) * SHARED_ALIGNMENT
+
+    @property
+    def TIME_ZERO(self) -> float:
+        """The TIME_ZERO of the publisher. See NextWheel."""
+        return float(self._header["time_zero"])
+
+    def _extend(
+        self, values: dict[str, np.ndarray], time_zero: float
+    ) -> None:
+        """
+        Append the samples of a message. Only used by the publisher.
+
+        Parameters
+        ----------
+        values
+            For each sensor, an array of samples where column 0 is the time.
+        time_zero
+            The TIME_ZERO of the publisher.
+
+        """
+        header = self._header
+        header["time_zero"] = time_zero
+        for i_sensor, sensor in enumerate(SENSOR_FRAME_TYPES):
+            samples = values[sensor]
+            ring = self.arrays[sensor]
+            capacity = len(ring)
+            if len(samples) == 0 or capacity == 0:
+                continue
+            count = int(header["count"][i_sensor])
+            samples = samples[-capacity:]
+            rows = (count + np.arange(len(samples))) % capacity
+
+            header["sequence"][i_sensor] += 1  # Odd: writing
+            ring[rows] = samples
+            header["count"][i_sensor] = count + len(values[sensor])
+            header["sequence"][i_sensor] += 1  # Even: done
+
+    def _read(
+        self, i_sensor: int, n: int | None, since: int | None
+    ) -> tuple[np.ndarray, int]:
+        """
+        Return a consistent copy of the latest samples of a sensor.
+
+        Parameters
+        ----------
+        i_sensor
+            The position of the sensor in SENSOR_FRAME_TYPES.
+        n
+            Return at most the latest n samples, or every sample if None.
+        since
+            Return only the samples after this count, if not None.
+
+        Returns
+        -------
+        values
+            The samples, from the oldest.
+        count
+            The count of the samples written, up to the last returned one.
+
+        """
+        header = self._header
+        sensor = list(self.arrays)[i_sensor]
+        ring = self.arrays[sensor]
+        capacity = len(ring)
+        deadline = perf_counter() + SHARED_READ_TIMEOUT
+        while True:
+            sequence = int(header["sequence"][i_sensor])
+            if sequence % 2 == 1:  # Being written
+                if perf_counter() > deadline:
+                    raise TimeoutError(
+                        f"The samples of {sensor} in "
+                        f"the shared memory block {self.name} have been "
+                        f"written for more than {SHARED_READ_TIMEOUT} s. "
+                        "The publisher may have stopped while writing."
+                    )
+                sleep(SHARED_READ_BACKOFF)
+                continue
+            count = int(header["count"][i_sensor])
+            n_samples = min(count, capacity)
+            if n is not None:
+                n_samples = min(n_samples, max(n, 0))
+            if since is not None:
+                n_samples = min(n_samples, max(count - since, 0))
+            values = ring[np.arange(count - n_samples, count) % capacity]
+            if int(header["sequence"][i_sensor]) == sequence:
+                return values, count
+
+    def _format(
+        self, values: list[np.ndarray], dtype
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """Format the samples of each sensor, as read by _read."""
+        imu_values, adc_values, encoder_values, power_values = values
+        return _format_samples(
+            adc_values,
+            imu_values,
+            encoder_values,
+            power_values,
+            self._header["calibration_matrix"].copy(),
+            self._header["calibration_offset"].copy(),
+            dtype=dtype,
+        )
+
+    def peek(
+        self, n: int | None = None, *, dtype="float64"
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Return the latest samples of each sensor. See NextWheel.peek.
+
+        Parameters
+        ----------
+        n : optional
+            Return at most the latest n samples of each sensor. The default
+            is to return every sample kept.
+        dtype : optional
+            See NextWheel.fetch.
+
+        Returns
+        -------
+        dict[str, dict[str, np.ndarray]]
+            See NextWheel.fetch.
+
+        """
+        values = [self._read(i, n, None)[0] for i in range(4)]
+        return self._format(values, dtype)
+
+    def latest(self, dtype="float64") -> dict[str, dict[str, np.ndarray]]:
+        """Return the latest sample of each sensor. See NextWheel.latest."""
+        return self.peek(1, dtype=dtype)
+
+    def cursor(self) -> dict[str, int]:
+        """Return the current position of the reader. See read_since."""
+        return {
+            sensor: int(count)
+            for sensor, count in zip(SENSOR_FRAME_TYPES, self._header["count"])
+        }
+
+    def read_since(
+        self, cursor: dict[str, int], dtype="float64"
+    ) -> tuple[dict[str, dict[str, np.ndarray]], dict[str, int]]:
+        """
+        Return the samples written since a cursor. See NextWheel.read_since.
+
+        Parameters
+        ----------
+        cursor
+            The cursor returned by cursor or by the previous read_since.
+        dtype : optional
+            See NextWheel.fetch.
+
+        Returns
+        -------
+        data
+            See NextWheel.fetch.
+        cursor
+            The cursor to pass to the next read_since.
+
+        """
+        values = []
+        new_cursor = {}
+        for i_sensor, sensor in enumerate(SENSOR_FRAME_TYPES):
+            sensor_values, count = self._read(i_sensor, None, cursor[sensor])
+            values.append(sensor_values)
+            new_cursor[sensor] = count
+        return self._format(values, dtype), new_cursor
+
+    def close(self) -> None:
+        """Detach from the shared memory block, and free it if owned."""
+        if self._header is None:
+            return
+        self._header = None
+        self.arrays = {}
+        self._shm.close()
+        if self._owner:
+            # A reader in this process may have unregistered the block from
+            # the resource tracker (see _attach_shared_memory).
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+
+
+class NextWheel(DatDecoder):
+    """
+    Communicate with the instrumented wheel.
+
+    The class permit to communicate with the instrumented wheel with 3 methods:
+        - NextWheel.connect() allows to start a connection with the server via
+        the WebSocketApp.
+        - NextWheel.fetch() return the streamed data in a nested dictionary
+        with all the usefull informations received since the previous
+        fetch.
+        - NextWheel.close() close the connection with the instrumented wheel.
+    It needs an IP address like in the example below.
+
+    To share a single connection to the wheel between several programs, run
+    a nextwheel.relay.Relay and pass its address as relay: either its URL,
+    e.g. "ws://localhost:8081/", or the path of its Unix socket. Only the
+    stream goes through the relay; the other requests are sent to IP. Unix
+    sockets are not available on Windows, where start_streaming raises a
+    ValueError for a path.
+
+    Exemple
+    -------
+    >>> from nextwheel import NextWheel
+    >>> nw = NextWheel("196.168.1.254")
+    >>> nw.connect()
+
+    >>> print(nw.fetch())
+
+    >>> nw.close()
+
+    """
+
+    def __init__(
+        self, IP: str, *, debug: bool = False, relay: str | None = None
+    ):
+        super().__init__()
+
+        # General configuration
+        self.IP = IP
+        self.relay = relay
+        self.HEADER_LENGTH = 10
+        self._skipped_frame_types = set()  # type: set[FrameType]
+        self._debug = debug
+
+        # Communication stuff
+        self.ws = None
+        self._mutex = threading.Lock()
+        self._thread_is_running = False
+
+        # Raw messages queued by the websocket thread, with their time of
+        # reception, and the thread that decodes them. The websocket thread
+        # only queues the messages, so that decoding never delays the
+        # reception of the next ones.
+        self._messages = queue.Queue(1000)  # type: queue.Queue
+        self._decoder = None  # type: threading.Thread | None
+
+        # Data buffers of the latest max_*_samples samples of each sensor,
+        # where column 0 is the time. They are never cleared: fetch, peek
+        # and read_since all copy from them, and their count attribute is
+        # the position of the readers. _fetched is the position of fetch.
+        self._histories = {
+            "IMU": _RingBuffer(10),
+            "Analog": _RingBuffer(9),
+            "Encoder": _RingBuffer(2),
+            "Power": _RingBuffer(5),
+        }
+        self._fetched = {sensor: 0 for sensor in self._histories}
+
+        # Only one fetch at a time may copy from the buffers, which are not
+        # resized meanwhile
+        self._fetch_mutex = threading.Lock()
+
+        # Subscriptions to the samples of each message. Replaced, never
+        # modified, so that the decoder thread can iterate over it.
+        self._subscriptions = ()  # type: tuple[Subscription, ...]
+
+        # Time spent waiting for _mutex by the decoder thread, fetch, and
+        # peek or read_since
+        self._lock_waits = {
+            "ingest": _LockWaits(),
+            "fetch": _LockWaits(),
+            "peek": _LockWaits(),
+        }
+
+        # Counters and timings of the received messages, and the event that
+        # stops their periodic logging
+        self._stats = _StreamStats()
+        self._stats_stop = threading.Event()
+
+        # Recorder of the raw messages, set by start_streaming(record=...)
+        self.recorder = None  # type: StreamRecorder | None
+
+        # Copy of the histories in shared memory, set by publish
+        self._shared = None  # type: SharedBuffers | None
+
+        # Calibration constants
+
+        try:
+            self.file_download("Calibration.json")
+            with open("Calibration.json", "r") as json_file:
+                self.CALIBRATION = json.load(json_file)
+            self.CALIBRATION_MATRIX = np.array(self.CALIBRATION["Matrix"])
+            self.CALIBRATION_OFFSET = np.array(self.CALIBRATION["Offset"])
+        except:
+            # Keep the raw ADC values set by DatDecoder
+            print("No Calibration File Detected")
+
+    @property
+    def max_imu_samples(self) -> int:
+        """
+        The number of IMU samples kept until the next fetch.
+
+        It must be finite: the buffers are allocated when it is set.
+        """
+        return self._histories["IMU"].capacity
+
+    @max_imu_samples.setter
+    def max_imu_samples(self, value: int) -> None:
+        with self._fetch_mutex, self._mutex:
+            self._histories["IMU"].resize(value)
+
+    @property
+    def max_analog_samples(self) -> int:
+        """
+        The number of analog samples kept until the next fetch.
+
+        It must be finite: the buffers are allocated when it is set.
+        """
+        return self._histories["Analog"].capacity
+
+    @max_analog_samples.setter
+    def max_analog_samples(self, value: int) -> None:
+        with self._fetch_mutex, self._mutex:
+            self._histories["Analog"].resize(value)
+
+    @property
+    def max_encoder_samples(self) -> int:
+        """
+        The number of encoder samples kept until the next fetch.
+
+        It must be finite: the buffers are allocated when it is set.
+        """
+        return self._histories["Encoder"].capacity
+
+    @max_encoder_samples.setter
+    def max_encoder_samples(self, value: int) -> None:
+        with self._fetch_mutex, self._mutex:
+            self._histories["Encoder"].resize(value)
+
+    @property
+    def max_power_samples(self) -> int:
+        """
+        The number of power samples kept until the next fetch.
+
+        It must be finite: the buffers are allocated when it is set.
+        """
+        return self._histories["Power"].capacity
+
+    @max_power_samples.setter
+    def max_power_samples(self, value: int) -> None:
+        with self._fetch_mutex, self._mutex:
+            self._histories["Power"].resize(value)
+
+    def _acquire(self, waits: _LockWaits) -> float:
+        """Acquire _mutex, add the time waited to waits and return it."""
+        start = perf_counter()
+        self._mutex.acquire()
+        wait = perf_counter() - start
+        waits.add(wait)
+        return wait
+
+    def lock_stats(self, reset: bool = False) -> dict[str, dict[str, float]]:
+        """
+        Return the time spent waiting for the data buffers to be unlocked.
+
+        The decoder thread ("ingest") locks the buffers to append the
+        samples of each message, fetch ("fetch") locks them only to move its
+        position and, after its copy, to check which samples were
+        overwritten meanwhile, and peek, latest and read_since ("peek") lock
+        them to copy the requested samples. A long wait of the decoder
+        thread delays the decoding of the next messages.
+
+        Parameters
+        ----------
+        reset : optional
+            If True, restart the statistics from zero after returning them.
+            The default is False.
+
+        Returns
+        -------
+        dict[str, dict[str, float]]
+            For "ingest", "fetch" and "peek", a dictionary with the number of
+            acquisitions ("count") and the total, mean and maximal wait in
+            seconds ("total_wait", "mean_wait" and "max_wait").
+
+        """
+        with self._mutex:
+            stats = {
+                name: waits.to_dict()
+                for name, waits in self._lock_waits.items()
+            }
+            if reset:
+                for waits in self._lock_waits.values():
+                    waits.clear()
+        return stats
+
+    def stats(self, reset: bool = False) -> dict[str, Any]:
+        """
+        Return statistics on the messages received since start_streaming.
+
+        The statistics help finding why the live data is late or choppy:
+        the frames counts and rates show the data sent by the wheel, the
+        evicted samples show a consumer that fetches too rarely, the depth
+        of the queue shows a decoder thread that falls behind the wheel,
+        and the timings show the time spent on each message.
+
+        Parameters
+        ----------
+        reset : optional
+            If True, restart the statistics from zero after returning them.
+            The default is False.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictionary with:
+                - "duration": the time since the statistics started, in s;
+                - "messages": the number of messages received;
+                - "unknown_frames" and "short_frames": the number of frames
+                  of unknown type or too short, which are skipped;
+                - "queue": the number of messages received but not decoded
+                  yet ("depth"), its maximum ("max_depth"), the size of the
+                  queue ("size") and the number of messages dropped because
+                  the queue was full ("dropped");
+                - "sensors": for "IMU", "Analog", "Encoder" and "Power", the
+                  number of frames received ("frames"), the number of
+                  samples overwritten before being fetched because of
+                  max_*_samples ("evicted"), the number of frames received
+                  per second ("rate") and the sampling rate of the last
+                  CONFIG frame, or None ("configured_rate");
+                - "latency", "queue_time", "parse" and "wait": histograms of
+                  the time from the reception of a message to the commit of
+                  its samples, of the time spent in the queue, of the time
+                  spent decoding it, and of the time spent waiting for the
+                  data buffers. Each histogram has a
+                  "count", a "mean" and a "max" in seconds, and "counts",
+                  the number of times up to each of the "edges" in seconds
+                  and, last, above them.
+
+        """
+        with self._mutex:
+            stats = self._stats.to_dict(self._config, self._messages)
+            if reset:
+                self._stats.clear()
+        return stats
+
+    def _log_stats(self, interval: float, stop: threading.Event) -> None:
+        """Log the statistics every interval seconds, until stop is set."""
+        while not stop.wait(interval):
+            _logger.info(
+                "NextWheel %s stats: %s", self.IP, json.dumps(self.stats())
+            )
+
+    def _on_message(self, ws, message):
+        """
+        React to WebSocketApp message received.
+
+        The message is only queued, without waiting, for the decoder thread.
+        When the queue is full, the message is dropped and counted in the
+        statistics.
+
+        Parameters
+        ----------
+        ws : _app.WebSocketApp
+            DESCRIPTION.
+        message : bytes
+            Information containing data in bytes.
+
+        Returns
+        -------
+        None.
+
+        """
+        if type(message) is not bytes:
+            return
+
+        messages = self._messages
+        try:
+            messages.put_nowait((message, perf_counter()))
+        except queue.Full:
+            with self._mutex:
+                self._stats.dropped += 1
+            return
+        # Only take the lock of the statistics, as stats does, on a new
+        # maximum, so that the reception rarely waits for the decoder.
+        depth = messages.qsize()
+        if depth > self._stats.max_depth:
+            with self._mutex:
+                self._stats.max_depth = max(self._stats.max_depth, depth)
+
+    def _decode_messages(self, messages: queue.Queue) -> None:
+        """Decode the queued messages, until None is queued."""
+        while (item := messages.get()) is not None:
+            try:
+                self._decode_message(*item)
+            except Exception as error:
+                # _decode_message released _mutex. stop_streaming does not
+                # wait for the decoder thread when called from it.
+                print(self.ws, error)
+                self.stop_streaming()
+                return
+
+    def _decode_message(
+        self, message: bytes, received: float | None = None
+    ) -> None:
+        """
+        Decode a message and append its samples to the buffers.
+
+        The whole message (usually a superframe) is decoded in bulk by
+        _decode_index.
+        The mutex is only held to append the decoded samples to the buffers.
+        The frames of unknown type or too short are skipped and counted in
+        the statistics.
+
+        Parameters
+        ----------
+        message
+            The message received.
+        received
+            Optional. The time of reception of the message, as given by
+            perf_counter. The default is now.
+
+        """
+        dequeued = perf_counter()
+        if received is None:
+            received = dequeued
+
+        frame_types = None
+        if len(self._skipped_frame_types) > 0:
+            frame_types = [
+                frame_type
+                for frame_type in SENSOR_FRAME_TYPES.values()
+                if frame_type not in self._skipped_frame_types
+            ]
+
+        index = _FrameIndex.scan(
+            message, 0, self.TIME_ZERO, self._config, skip_invalid=True
+        )
+        adc_values, imu_values, encoder_values, power_values = (
+            self._decode_index(index, frame_types)
+        )
+        parsed = perf_counter()
+
+        wait = self._acquire(self._lock_waits["ingest"])
+        try:
+            evicted = {}
+            for sensor, values in [
+                ("Analog", adc_values),
+                ("IMU", imu_values),
+                ("Encoder", encoder_values),
+                ("Power", power_values),
+            ]:
+                # Samples not fetched yet that the new ones overwrite
+                history = self._histories[sensor]
+                unfetched = min(
+                    history.count - self._fetched[sensor], len(history)
+                )
+                evicted[sensor] = max(
+                    unfetched + len(values) - history.capacity, 0
+                )
+            self._histories["Analog"].extend(adc_values)
+            self._histories["IMU"].extend(imu_values)
+            self._histories["Encoder"].extend(encoder_values)
+            self._histories["Power"].extend(power_values)
+            if self._shared is not None:
+                self._shared._extend(
+                    {
+                        "IMU": imu_values,
+                        "Analog": adc_values,
+                        "Encoder": encoder_values,
+                        "Power": power_values,
+                    },
+                    self.TIME_ZERO,
+                )
+            self._stats.add(index, evicted)
+            self._stats.queue_time.add(dequeued - received)
+            self._stats.parse.add(parsed - dequeued)
+            self._stats.wait.add(wait)
+            self._stats.latency.add(perf_counter() - received)
+        finally:
+            self._mutex.release()
+
+        values = (adc_values, imu_values, encoder_values, power_values)
+        for subscription in self._subscriptions:
+            subscription._put(values)
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder._put(message, index.offsets)
+
+    def _on_open(self, ws):
+        """Reaction of the WebSocketApp when the connection is open."""
+        if self._debug:
+            print("Connected: ", self.ws)
+
+    def _on_error(self, ws, error):
+        """Reaction of the WebSocketApp when there is an error."""
+        print(self.ws, error)
+        self.stop_streaming()
+
+    def _on_close(self, ws, close_status_code, close_msg):
+        """Reaction of the WebSocketApp when the connection is close."""
+        if self._debug:
+            print("Closed: ", self.ws, close_status_code, close_msg)
+
+    def start_streaming(
+        self,
+        max_imu_samples: int = 1000,
+        max_analog_samples: int = 1000,
+        max_encoder_samples: int = 100,
+        max_power_samples: int = 10,
+        sensors=None,
+        *,
+        stats_interval: float | None = None,
+        record=None,
+        record_max_size: int | None = None,
+        record_max_duration: float | None = None,
+        queue_size: int = 1000,
+    ):
+        """
+        Start streaming.
+
+        The websocket thread only receives the messages and queues them. A
+        decoder thread decodes them and appends their samples to the
+        buffers, so that a slow decoding never delays the reception.
+
+        Parameters
+        ----------
+        max_imu_samples : int, optional
+            Maximum IMU data to keep in memory. The default is 1000.
+        max_analog_samples : int, optional
+            Maximum ADC data to keep in memory. The default is 1000.
+        max_encoder_samples : int, optional
+            Maximum encoder data to keep in memory. The default is 100.
+        max_power_samples : int, optional
+            Maximum Power data to keep in memory. The default is 10. These
+            maximums must be finite (np.inf raises a ValueError), because
+            the buffers are allocated in advance.
+        sensors : optional
+            Decode only these sensors, among "IMU", "Analog", "Encoder" and
+            "Power". The frames of the other sensors are stepped over using
+            only their header, and their channels are empty in fetch. The
+            default is to decode every sensor.
+        stats_interval : optional
+            If not None, log the statistics returned by stats every
+            stats_interval seconds, on the "nextwheel" logger at the INFO
+            level. The default is None.
+        record : optional
+            If not None, also write every message received, byte for byte,
+            to record_000.dat, record_001.dat, etc. (a .dat extension is
+            removed from record). The files can be read by read_dat. See
+            StreamRecorder; the recorder is the recorder attribute. An
+            error that stops the recording, such as a full disk, is raised
+            by stop_streaming. The default is None.
+        record_max_size : optional
+            Start a new file when the current one would exceed this size, in
+            bytes. The default is None (no limit).
+        record_max_duration : optional
+            Start a new file after this duration, in seconds. The default is
+            None (no limit).
+        queue_size : optional
+            The number of messages received but not decoded yet to keep.
+            When the queue is full, the new messages are dropped and counted
+            in stats. The default is 1000.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self._thread_is_running:
+            return
+
+        frame_types = _sensor_frame_types(sensors)
+        self._skipped_frame_types = {
+            frame_type
+            for frame_type in SENSOR_FRAME_TYPES.values()
+            if frame_type not in frame_types
+        }
+
+        self.max_imu_samples = max_imu_samples
+        self.max_analog_samples = max_analog_samples
+        self.max_encoder_samples = max_encoder_samples
+        self.max_power_samples = max_power_samples
+
+        url = f"ws://{self.IP}:81/"
+        relay_socket = None
+        if self.relay is not None and self.relay.startswith("ws://"):
+            url = self.relay
+        elif self.relay is not None:
+            if not hasattr(socket, "AF_UNIX"):
+                raise ValueError(
+                    f"The relay {self.relay} is not a ws:// URL, and Unix "
+                    "sockets are not available on this platform. Pass the "
+                    'URL of the relay instead, e.g. "ws://localhost:8081/".'
+                )
+            relay_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            relay_socket.connect(self.relay)
+            url = "ws://localhost/"
+
+        self._messages = queue.Queue(queue_size)
+        self._decoder = threading.Thread(
+            target=self._decode_messages, args=(self._messages,), daemon=True
+        )
+
+        self.ws = websocket.WebSocketApp(
+            url,
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_error=self._on_error,
+            on_close=self._on_close,
+            socket=relay_socket,
+        )
+
+        self.recorder = None
+        if record is not None:
+            self.recorder = StreamRecorder(
+                record,
+                max_size=record_max_size,
+                max_duration=record_max_duration,
+            )
+
+        with self._mutex:
+            self._stats.clear()
+        self._stats_stop = threading.Event()
+        if stats_interval is not None:
+            threading.Thread(
+                target=self._log_stats,
+                args=(stats_interval, self._stats_stop),
+                daemon=True,
+            ).start()
+
+        self._decoder.start()
         t = threading.Thread(target=self.ws.run_forever)  # type: ignore
         t.start()
         self._thread_is_running = True
 
-    def stop_streaming(self):
+    def stop_streaming(self):
+        """
+        Stop streaming via websocket.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.ws.close()
+        self._stats_stop.set()
+        decoder = self._decoder
+        if (
+            decoder is not None
+            and decoder.is_alive()
+            and decoder is not threading.current_thread()
+        ):
+            # Decode the messages already received, then stop the decoder
+            _stop_thread(decoder, self._messages)
+        self._thread_is_running = False
+        if self.recorder is not None:
+            # Raises the error that stopped the recording, if any
+            self.recorder._close()
+
+    def monitor(self) -> None:
+        """
+        Blocking function that monitors the sensors measurements.
+
+        This function shows the current sensor states in a simple GUI for
+        testing and monitoring. To log data, use NextWheel.fetch() instead.
+
+        """
+        # Don't import until needed.
+        import nextwheel.monitor as nwm  # noqa
+
+        self.start_streaming()
+        nwm.monitor(self)
+        self.stop_streaming()
+
+    def graphical_monitor(self) -> None:
+        """
+        Blocking function that monitors using Matplotlib.
+
+        Under development.
+
+        """
+        import matplotlib as mpl  # noqa
+        import matplotlib.pyplot as plt  # noqa
+        from matplotlib import animation  # noqa
+
+        is_running = [True]
+
+        def on_close(_):
+            is_running[0] = False
+
+        self.start_streaming()
+        plt.pause(0.5)
+
+        # Matplotlib defaults
+        mpl.rcParams["axes.prop_cycle"] = mpl.cycler(
+            color=["r", "g", "b", "c", "m", "y", "k", "tab:orange"]
+        )
+        mpl.rcParams["figure.figsize"] = [10, 5]
+        mpl.rcParams["figure.dpi"] = 75
+        mpl.rcParams["lines.linewidth"] = 1
+
+        # Create figure and plots
+        fig = plt.figure(figsize=(12, 8))
+        fig.canvas.mpl_connect("close_event", on_close)
+
+        adc_plot = plt.subplot(4, 1, 1)
+        adc_plot.set_title("ADC")
+        adc_lines = []
+        for i in range(6):
+            adc_lines.append(adc_plot.plot([])[0])
+        adc_plot.set_xlim(0, self.max_analog_samples)
+        adc_plot.set_ylim(0, 65536)
+        adc_plot.set_ylabel("Sampled value")
+
+        accel_plot = plt.subplot(4, 1, 2)
+        accel_plot.set_title("Accelerometers")
+        accel_lines = []
+        for i in range(3):
+            accel_lines.append(accel_plot.plot([])[0])
+        accel_plot.set_xlim(0, self.max_imu_samples)
+        accel_plot.set_ylim(-20, 20)
+        accel_plot.set_ylabel("m/s2")
+
+        gyro_plot = plt.subplot(4, 1, 3)
+        gyro_plot.set_title("Gyrometers")
+        gyro_lines = []
+        for i in range(3):
+            gyro_lines.append(gyro_plot.plot([])[0])
+        gyro_plot.set_xlim(0, self.max_imu_samples)
+        gyro_plot.set_ylim(-1000, 1000)
+        gyro_plot.set_ylabel("Unit to be defined")
+
+        encoder_plot = plt.subplot(4, 1, 4)
+        encoder_plot.set_title("Encoder")
+        encoder_line = encoder_plot.plot([])[0]
+        encoder_plot.set_xlim(0, self.max_encoder_samples)
+        encoder_plot.set_ylim(0, 4000)
+        encoder_plot.set_ylabel("Unit to be defined")
+
+        plt.tight_layout()
+
+        def on_timer(_):
+            self._mutex.acquire()
+            adc_history = self._histories["Analog"]
+            adc_values = np.zeros((self.max_analog_samples, 9))
+            adc_values[-len(adc_history):] = adc_history.to_array()
+
+            imu_history = self._histories["IMU"]
+            imu_values = np.zeros((self.max_imu_samples, 10))
+            imu_values[-len(imu_history):] = imu_history.to_array()
+
+            encoder_history = self._histories["Encoder"]
+            encoder_values = np.zeros((self.max_encoder_samples, 2))
+            encoder_values[-len(encoder_history):] = (
+                encoder_history.to_array() % 4000
+            )
+            self._mutex.release()
+
+            try:
+                for i in range(6):
+                    adc_lines[i].set_data(
+                        range(self.max_analog_samples), adc_values[:, i + 1]
+                    )
+            except ValueError:
+                pass
+
+            try:
+                for i in range(3):
+                    accel_lines[i].set_data(
+                        range(self.max_imu_samples), imu_values[:, i + 1]
+                    )
+
+                for i in range(3):
+                    gyro_lines[i].set_data(
+                        range(self.max_imu_samples), imu_values[:, i + 4]
+                    )
+            except ValueError:
+                pass
+
+            try:
+                encoder_line.set_data(
+                    range(self.max_encoder_samples), encoder_values[:, 1]
+                )
+            except ValueError:
+                pass
+
+        anim = animation.FuncAnimation(
+            fig,
+            on_timer,  # type: ignore
+            interval=33,
+            cache_frame_data=False,
+        )  # 30 ips
+
+        while is_running[0]:
+            plt.pause(0.5)
+
+        self.stop_streaming()
+
+    def fetch(self, dtype="float64") -> dict[str, dict[str, np.ndarray]]:
+        """
+        Fetch data and return a nested dictionary.
+
+        fetch returns the samples received since the previous fetch, at
+        most the latest max_*_samples of each sensor, and moves its own
+        position past them, so that each sample is fetched once. The
+        samples stay in the buffers: peek, latest, read_since and the
+        cursors of the other consumers are not affected.
+
+        Parameters
+        ----------
+        dtype : optional
+            The floating-point dtype of every channel but "Time", e.g.
+            "float32". The default is "float64".
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            A dictionary of multiple dictionaries that contain latest
+            informations on:
+                - IMU values
+                - Analog values
+                - Encoder values
+                - Power values
+        """
+        return self._format_data(*self._fetch_values(), dtype)
+
+    def _fetch_values(
+        self,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the samples received since the previous fetch.
+
+        Only the positions of fetch in the buffers are exchanged while the
+        decoder thread waits. The samples are copied, then converted by the
+        caller, after the lock is released.
+
+        Returns
+        -------
+        adc_values, imu_values, encoder_values, power_values
+            Arrays of samples where column 0 is the time, from the oldest.
+
+        """
+        with self._fetch_mutex:
+            self._acquire(self._lock_waits["fetch"])
+            spans = {
+                sensor: history.span(self._fetched[sensor])
+                for sensor, history in self._histories.items()
+            }
+            self._fetched = {
+                sensor: history.count
+                for sensor, history in self._histories.items()
+            }
+            self._mutex.release()
+
+            # The decoder thread keeps appending during the copy
+            values = {
+                sensor: np.concatenate(views)
+                for sensor, (_, views) in spans.items()
+            }
+
+            # Drop the samples that were overwritten during the copy, which
+            # are counted as evicted before being fetched.
+            self._acquire(self._lock_waits["fetch"])
+            for sensor, (first, _) in spans.items():
+                history = self._histories[sensor]
+                overwritten = min(
+                    history.count - history.capacity - first,
+                    len(values[sensor]),
+                )
+                if overwritten > 0:
+                    values[sensor] = values[sensor][overwritten:]
+                    self._stats.evicted[sensor] += overwritten
+            self._mutex.release()
+
+        return (
+            values["Analog"],
+            values["IMU"],
+            values["Encoder"],
+            values["Power"],
+        )
+
+    def peek(
+        self, n: int | None = None, *, dtype="float64"
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Return the latest samples without clearing them.
+
+        Unlike fetch, which returns each sample once, peek returns the
+        latest samples at every call, so that several consumers can read
+        the same stream at their own rate.
+
+        Parameters
+        ----------
+        n : optional
+            The number of samples of each sensor. The default is to return
+            the latest max_*_samples samples of each sensor.
+        dtype : optional
+            See fetch.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See fetch.
+
+        """
+        self._acquire(self._lock_waits["peek"])
+        values = {
+            sensor: history.to_array(n)
+            for sensor, history in self._histories.items()
+        }
+        self._mutex.release()
+
+        return self._format_data(
+            values["Analog"],
+            values["IMU"],
+            values["Encoder"],
+            values["Power"],
+            dtype,
+        )
+
+    def latest(self, dtype="float64") -> dict[str, dict[str, np.ndarray]]:
+        """
+        Return the latest sample of each sensor without clearing it.
+
+        This is a shortcut for peek(1). The arrays of a sensor are empty if
+        no sample was received yet.
+
+        Parameters
+        ----------
+        dtype : optional
+            See fetch.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See fetch.
+
+        """
+        return self.peek(1, dtype=dtype)
+
+    def cursor(self) -> dict[str, int]:
+        """
+        Return the current position in the stream, to use with read_since.
+
+        Returns
+        -------
+        dict[str, int]
+            The number of samples received for each sensor.
+
+        """
+        with self._mutex:
+            return {
+                sensor: history.count
+                for sensor, history in self._histories.items()
+            }
+
+    def read_since(
+        self, cursor: dict[str, int], dtype="float64"
+    ) -> tuple[dict[str, dict[str, np.ndarray]], dict[str, int]]:
+        """
+        Return the samples received since a position, without clearing them.
+
+        Each consumer keeps its own cursor, so that several consumers can
+        read every sample of the same stream at their own rate. Samples that
+        were overwritten since the cursor (more than max_*_samples samples
+        ago) are not returned.
+
+        Parameters
+        ----------
+        cursor
+            The position of the previous read, as returned by cursor or by
+            the previous read_since.
+        dtype : optional
+            See fetch.
+
+        Returns
+        -------
+        data : dict[str, dict[str, np.ndarray]]
+            See fetch.
+        cursor : dict[str, int]
+            The new position, to pass to the next read_since.
+
+        Exemple
+        -------
+        >>> cursor = nw.cursor()
+        >>> while True:
+        ...     data, cursor = nw.read_since(cursor)
+
+        """
+        self._acquire(self._lock_waits["peek"])
+        values = {
+            sensor: history.since(cursor[sensor])
+            for sensor, history in self._histories.items()
+        }
+        new_cursor = {
+            sensor: history.count
+            for sensor, history in self._histories.items()
+        }
+        self._mutex.release()
+
+        data = self._format_data(
+            values["Analog"],
+            values["IMU"],
+            values["Encoder"],
+            values["Power"],
+            dtype,
+        )
+        return data, new_cursor
+
+    def subscribe(
+        self,
+        callback: Callable[[dict], Any],
+        sensors=None,
+        *,
+        min_batch: int = 1,
+        max_latency: float = 0.01,
+        queue_size: int = 1000,
+        dtype="float64",
+    ) -> Subscription:
+        """
+        Call a function with the new samples, as soon as they are received.
+
+        The callback runs on a dispatcher thread of the subscription. It
+        receives batches of the samples received since its previous call,
+        so that there is no need to poll fetch.
+
+        Parameters
+        ----------
+        callback
+            The function to call. It receives a dictionary with the same
+            structure as given by fetch, restricted to the subscribed
+            sensors.
+        sensors : optional
+            The sensors to subscribe to, among "IMU", "Analog", "Encoder"
+            and "Power". The default is every sensor.
+        min_batch : optional
+            Wait for at least this number of samples of the subscribed
+            sensors before calling the callback, unless max_latency is
+            reached. The default is 1, i.e., call it for each message.
+        max_latency : optional
+            Call the callback at most this number of seconds after receiving
+            a sample, even if min_batch is not reached. The default is 0.01.
+        queue_size : optional
+            The number of messages that can wait for a slow callback. The
+            samples of the following messages are dropped and counted in
+            Subscription.dropped. The default is 1000.
+        dtype : optional
+            See fetch.
+
+        Returns
+        -------
+        Subscription
+            Pass it to unsubscribe to stop the subscription.
+
+        Exemple
+        -------
+        >>> def show(data):
+        ...     print(data["Analog"]["Force"][-1])
+        >>> subscription = nw.subscribe(show, ["Analog"], min_batch=20)
+
+        """
+        if sensors is None:
+            sensors = list(SENSOR_FRAME_TYPES)
+        _sensor_frame_types(sensors)  # Validate
+
+        subscription = Subscription(
+            callback,
+            self._format_data,
+            list(sensors),
+            min_batch,
+            max_latency,
+            queue_size,
+            dtype,
+        )
+        with self._mutex:
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stop a subscription created by subscribe.
+
+        The samples already queued are still passed to the callback. If the
+        delivery had stopped on an error, this error is raised.
+
+        Parameters
+        ----------
+        subscription
+            The subscription to stop.
+
+        """
+        with self._mutex:
+            self._subscriptions = tuple(
+                other
+                for other in self._subscriptions
+                if other is not subscription
+            )
+        subscription._cancel()
+
+    def publish(self, name: str | None = None) -> str:
+        """
+        Share the latest samples with other processes.
+
+        From now on, the samples of each message are also copied to ring
+        buffers in a shared memory block, where each sensor keeps its
+        latest max_*_samples samples, as set now. Other processes attach to
+        the block with SharedBuffers(name). Publishing again replaces the
+        block.
+
+        Parameters
+        ----------
+        name : optional
+            The name of the shared memory block. The default is a unique
+            name.
+
+        Returns
+        -------
+        str
+            The name of the shared memory block.
+
+        """
+        shared = SharedBuffers(
+            name,
+            capacities={
+                sensor: history.capacity
+                for sensor, history in self._histories.items()
+            },
+        )
+        shared._header["calibration_matrix"] = self.CALIBRATION_MATRIX
+        shared._header["calibration_offset"] = self.CALIBRATION_OFFSET
+        shared._header["time_zero"] = self.TIME_ZERO
+
+        with self._mutex:
+            previous, self._shared = self._shared, shared
+        if previous is not None:
+            previous.close()
+        return shared.name
+
+    def unpublish(self) -> None:
+        """Stop sharing the samples and free the shared memory block."""
+        with self._mutex:
+            shared, self._shared = self._shared, None
+        if shared is not None:
+            shared.close()
+
+    def set_time(self, unix_time: int) -> dict:
+        """
+        Set the time of the instrumented wheel.
+
+        Parameters
+        ----------
+        unix_time : int
+            Unix time in seconds.
+
+        Returns
+        -------
+        requests.Response
+
+        """
+        response = requests.post(
+            f"http://{self.IP}/config_set_time", params={"time": unix_time}
+        )
+        return json.loads(response.content)
+
+    def set_sensors_params(
+        self,
+        adc_sampling_rate: int,
+        imu_sampling_rate: int,
+        encoder_sampling_rate: int,
+        accelerometer_precision: int,
+        gyrometer_precision: int,
+    ) -> requests.Response:
+        """
+        Set the parameters of the instrumented wheel.
+
+        Parameters
+        ----------
+        adc_sampling_rate
+            Sampling rate for the forces in Hz. Valid values are 120, 240,
+            480, 960, 1000, 2000
+        imu_sampling_rate
+            Sampling rate for the IMU, in Hz. Valid values are 60, 120, 240.
+        encoder_sampling_rate
+            Sampling rate for the encoder, in Hz. Valid values are 60, 120, 240.
+        accelerometer_precision
+            Accelerometer range, in g. Value values are 2, 4, 8, 16.
+        gyrometer_precision
+            Gyrometer range, in degrees per second. Valid values are 250, 500,
+            1000, 2000.
+
+        Returns
+        -------
+        requests.Response
+
+        """
+        # TODO Validate params? We assume it is verified in the ESP32 firmware
+
+        response = requests.post(
+            f"http://{self.IP}/config_update",
+            params={
+                "adc_sampling_rate": adc_sampling_rate,
+                "imu_sampling_rate": imu_sampling_rate,
+                "encoder_sampling_rate": encoder_sampling_rate,
+                "accelerometer_precision": accelerometer_precision,
+                "gyrometer_precision": gyrometer_precision,
+            },
+        )
+        return response
+
+    def get_sensors_params(self) -> dict:
+        """
+        Get the parameters of the instrumented wheel sensors.
+
+        Returns
+        -------
+        dict
+            A dictionary in the form parameter:value.
+
+        """
+        response = requests.get(f"http://{self.IP}/config")
+        return json.loads(response.content)
+
+    def get_system_state(self) -> dict:
+        """
+        Get the system state of the instrumented wheel.
+
+        Returns
+        -------
+        dict
+            A dictionary in the form parameter:value
+
+        """
+        response = requests.get(f"http://{self.IP}/system_state")
+        return json.loads(response.content)
+
+    def start_recording(self) -> dict:
+        """
+        Start recording data on the instrumented wheel.
+
+        Returns
+        -------
+        dict
+
+        """
+        response = requests.get(f"http://{self.IP}/start_recording")
+        return json.loads(response.content)
+
+    def stop_recording(self) -> dict:
+        """
+        Stop recording data on the instrumented wheel.
+
+        Returns
+        -------
+        dict
+
+        """
+        response = requests.get(f"http://{self.IP}/stop_recording")
+        return json.loads(response.content)
+
+    def file_list(self) -> dict:
+        """
+        Get the list of files on the instrumented wheel.
+
+        Returns
+        -------
+        dict
+
+        """
+        response = requests.get(f"http://{self.IP}/file_list")
+        return json.loads(response.content)
+
+    def file_download(self, filename: str, save_path: str = ".") -> int:
+        """
+        Download a file from the instrumented wheel.
+
+        Parameters
+        ----------
+        filename
+            The name of the file to download
+        save_folder
+            Optional. Where to save the file. The default is the current
+            folder.
+
+        Returns
+        -------
+        int
+            The size of the file
+
+        """
+        param = {"file": filename}
+        response = requests.get(
+            f"http://{self.IP}/file_download", params=param, stream=True
+        )
+        if response.status_code == 200:
+            with open(os.path.join(save_path, filename), "wb") as f:
+                f.write(response.content)
+                # Return size...
+                return f.tell()
+
+        # filed download
+        return 0
+
+    def file_delete(self, filename: str) -> dict:
+        """
+        Delete a file from the instrumented wheel.
+
+        Parameters
+        ----------
+        filename
+            The name of the file to delete
+
+        Returns
+        -------
+        dict
+
+        """
+        response = requests.get(
+            f"http://{self.IP}/file_delete", params={"file": filename}
+        )
+        return json.loads(response.content)
+
+
+def _interpolate_samples(values: np.ndarray, time: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate every column of samples at once.
+
+    Parameters
+    ----------
+    values
+        Array of samples where column 0 is the time, sorted by time. Its time
+        range must include every time to interpolate.
+    time
+        The times to interpolate at.
+
+    Returns
+    -------
+    np.ndarray
+        The interpolated samples, where column 0 is time.
+
+    """
+    if len(values) == 1:
+        samples = np.repeat(values, len(time), axis=0)
+    else:
+        after = np.searchsorted(values[:, 0], time, side="right")
+        after = np.clip(after, 1, len(values) - 1)
+        previous = values[after - 1]
+        delta = values[after] - previous
+        weights = np.divide(
+            time - previous[:, 0],
+            delta[:, 0],
+            out=np.zeros(len(time)),
+            where=delta[:, 0] > 0,
+        )
+        samples = previous + weights[:, np.newaxis] * delta
+    samples[:, 0] = time
+    return samples
+
+
+def _align_samples(
+    arrays: list[np.ndarray],
+) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """
+    Align the samples of several wheels on the times of the first one.
+
+    Only the samples of the first wheel that every other wheel surrounds are
+    aligned. The other samples are returned as pending, to be aligned with
+    the next ones.
+
+    Parameters
+    ----------
+    arrays
+        For each wheel, an array of samples where column 0 is the time,
+        sorted by time.
+
+    Returns
+    -------
+    aligned
+        For each wheel, the samples at the aligned times.
+    pending
+        For each wheel, the samples needed to align the next ones.
+
+    """
+    reference = arrays[0]
+    if any(len(values) == 0 for values in arrays):
+        start = end = -np.inf  # Nothing can be aligned yet
+    else:
+        start = max(values[0, 0] for values in arrays)
+        end = min(values[-1, 0] for values in arrays)
+
+    first = np.searchsorted(reference[:, 0], start, side="left")
+    stop = max(np.searchsorted(reference[:, 0], end, side="right"), first)
+    time = reference[first:stop, 0]
+
+    # The next aligned time is at least the time of the latest reference
+    # sample, so the other wheels keep their samples from the one before.
+    if stop < len(reference):
+        next_time = reference[stop, 0]
+    elif stop > 0:
+        next_time = reference[stop - 1, 0]
+    else:
+        next_time = -np.inf
+
+    aligned = [reference[first:stop]]
+    pending = [reference[stop:]]
+    for values in arrays[1:]:
+        aligned.append(_interpolate_samples(values, time))
+        keep = np.searchsorted(values[:, 0], next_time, side="right")
+        pending.append(values[max(keep - 1, 0) :])
+    return aligned, pending
+
+
+class NextWheelGroup:
+    """
+    Communicate with several instrumented wheels at once.
+
+    The commands are sent to every wheel concurrently, and fetch aligns the
+    samples of every wheel on a shared timebase, for instance to analyze
+    the propulsion of the left and right wheels together.
+
+    Parameters
+    ----------
+    wheels
+        The wheels, as a dictionary of names and IP addresses or NextWheel
+        instances, or as a list of IP addresses that are then also the
+        names.
+    debug
+        Optional. Passed to the NextWheel instances created from the IP
+        addresses.
+
+    Exemple
+    -------
+    >>> from nextwheel import NextWheelGroup
+    >>> group = NextWheelGroup(
+    ...     {"Left": "192.168.1.10", "Right": "192.168.1.11"}
+    ... )
+    >>> group.set_time(int(time.time()))
+    >>> group.start_streaming()
+
+    >>> data = group.fetch()
+    >>> data["Left"]["Analog"]["Force"] - data["Right"]["Analog"]["Force"]
+
+    >>> group.stop_streaming()
+
+    """
+
+    def __init__(
+        self,
+        wheels: Mapping[str, "str | NextWheel"] | list[str],
+        *,
+        debug: bool = False,
+    ):
+        if not isinstance(wheels, Mapping):
+            wheels = {IP: IP for IP in wheels}
+        self.wheels = {
+            name: (
+                wheel
+                if isinstance(wheel, NextWheel)
+                else NextWheel(wheel, debug=debug)
+            )
+            for name, wheel in wheels.items()
+        }  # type: dict[str, NextWheel]
+        self._clear_pending()
+
+    def _clear_pending(self) -> None:
+        """Forget the samples not aligned yet and the shared time zero."""
+        # Shared time zero, the TIME_ZERO of the first wheel at the first
+        # fetch, in seconds.
+        self.TIME_ZERO = None  # type: float | None
+        # Samples received but not aligned yet, for each wheel and sensor,
+        # where column 0 is the time since the shared time zero.
+        self._pending = {
+            name: [
+                np.zeros((0, 9)),
+                np.zeros((0, 10)),
+                np.zeros((0, 2)),
+                np.zeros((0, 5)),
+            ]
+            for name in self.wheels
+        }  # type: dict[str, list[np.ndarray]]
+
+    def _call(self, method: str, *args, **kwargs) -> dict[str, Any]:
+        """Call a method of every wheel concurrently and return the results."""
+        with ThreadPoolExecutor(max_workers=len(self.wheels)) as executor:
+            futures = {
+                name: executor.submit(getattr(wheel, method), *args, **kwargs)
+                for name, wheel in self.wheels.items()
+            }
+        return {name: future.result() for name, future in futures.items()}
+
+    def start_streaming(self, **kwargs) -> None:
         """
-        Stop streaming via websocket.
+        Start streaming on every wheel.
 
-        Returns
-        -------
-        None.
+        Parameters
+        ----------
+        kwargs
+            Optional. See NextWheel.start_streaming. The name of each wheel
+            is appended to record, e.g. session_Left_000.dat.
 
         """
-        self.ws.close()
-        self._thread_is_running = False
-        try:
-            # If something has crashed somewhere, release the mutex for the
-            # next connection.
-            self._mutex.release()
-        except RuntimeError:
-            # No mutex was locked. That's fine.
-            pass
+        self._clear_pending()
+        record = kwargs.pop("record", None)
+        if record is None:
+            self._call("start_streaming", **kwargs)
+            return
 
-    def monitor(self) -> None:
+        stem, extension = os.path.splitext(os.fspath(record))
+        if extension != ".dat":
+            stem = os.fspath(record)
+        with ThreadPoolExecutor(max_workers=len(self.wheels)) as executor:
+            futures = [
+                executor.submit(
+                    wheel.start_streaming, record=f"{stem}_{name}", **kwargs
+                )
+                for name, wheel in self.wheels.items()
+            ]
+        for future in futures:
+            future.result()
+
+    def stop_streaming(self) -> None:
+        """Stop streaming on every wheel."""
+        self._call("stop_streaming")
+
+    def set_time(self, unix_time: int) -> dict[str, dict]:
         """
-        Blocking function that monitors the sensors measurements.
+        Set the time of every wheel.
 
-        This function shows the current sensor states in a simple GUI for
-        testing and monitoring. To log data, use NextWheel.fetch() instead.
+        Parameters
+        ----------
+        unix_time
+            Unix time in seconds.
+
+        Returns
+        -------
+        dict[str, dict]
+            The response of each wheel.
 
         """
-        # Don't import until needed.
-        import nextwheel.monitor as nwm  # noqa
+        return self._call("set_time", unix_time)
 
-        self.start_streaming()
-        nwm.monitor(self)
-        self.stop_streaming()
+    def start_recording(self) -> dict[str, dict]:
+        """Start recording on every wheel and return their responses."""
+        return self._call("start_recording")
 
-    def graphical_monitor(self) -> None:
+    def stop_recording(self) -> dict[str, dict]:
+        """Stop recording on every wheel and return their responses."""
+        return self._call("stop_recording")
+
+    def get_system_state(self) -> dict[str, dict]:
+        """Get the system state of every wheel."""
+        return self._call("get_system_state")
+
+    def fetch(
+        self, dtype="float64"
+    ) -> dict[str, dict[str, dict[str, np.ndarray]]]:
         """
-        Blocking function that monitors using Matplotlib.
+        Fetch the samples of every wheel, aligned on a shared timebase.
 
-        Under development.
+        The samples of each sensor of the other wheels are linearly
+        interpolated at the times of the samples of the first wheel, so
+        that every wheel has the same "Time". The samples that cannot be
+        aligned yet, because another wheel has not sent the samples that
+        follow them, are kept for the next fetch, up to the max_*_samples of
+        each wheel.
+
+        Parameters
+        ----------
+        dtype : optional
+            The floating-point dtype of every channel but "Time", e.g.
+            "float32". The default is "float64".
+
+        Returns
+        -------
+        dict[str, dict[str, dict[str, np.ndarray]]]
+            For each wheel, its samples as returned by NextWheel.fetch. The
+            time is in seconds since the TIME_ZERO attribute of the group.
 
         """
-        import matplotlib as mpl  # noqa
-        import matplotlib.pyplot as plt  # noqa
-        from matplotlib import animation  # noqa
+        wheels = list(self.wheels.values())
+        fetched = [wheel._fetch_values() for wheel in wheels]
+
+        # The TIME_ZERO of a wheel is 0 until its first CONFIG frame
+        if self.TIME_ZERO is None and wheels[0].TIME_ZERO != 0:
+            self.TIME_ZERO = wheels[0].TIME_ZERO
+        time_zero = (
+            wheels[0].TIME_ZERO if self.TIME_ZERO is None else self.TIME_ZERO
+        )
+        for wheel, values in zip(wheels, fetched):
+            # Express every time since the shared time zero
+            offset = wheel.TIME_ZERO - time_zero
+            if wheel.timebase == "us":
+                offset *= 1e6
+            for array in values:
+                array[:, 0] += offset
+
+        aligned = {name: [] for name in self.wheels}
+        sensors = ["Analog", "IMU", "Encoder", "Power"]
+        for i_sensor, sensor in enumerate(sensors):
+            arrays = [
+                np.concatenate((self._pending[name][i_sensor], new[i_sensor]))
+                for name, new in zip(self.wheels, fetched)
+            ]
+            sensor_aligned, pending = _align_samples(arrays)
+            for name, wheel, samples, remaining in zip(
+                self.wheels, wheels, sensor_aligned, pending
+            ):
+                capacity = wheel._histories[sensor].capacity
+                aligned[name].append(samples)
+                self._pending[name][i_sensor] = remaining[
+                    max(len(remaining) - capacity, 0) :
+                ].copy()
+
+        return {
+            name: wheel._format_data(*aligned[name], dtype)
+            for name, wheel in self.wheels.items()
+        }
 
-        is_running = [True]
 
-        def on_close(_):
-            is_running[0] = False
+# Sidecar index of the dat files, used for time-range reads. The index
+# summarizes the dat file in chunks of about INDEX_CHUNK_SIZE bytes.
+INDEX_VERSION = 1
+INDEX_CHUNK_SIZE = 1 << 20
+
+# Version of the layout of DatCache. Changing it invalidates every cache.
+CACHE_VERSION = 1
+CACHE_MAX_SIZE = 1 << 32
+
+# Frame type of each sensor, in the order of the columns of the index.
+SENSOR_FRAME_TYPES = {
+    "IMU": FrameType.IMU,
+    "Analog": FrameType.ADC,
+    "Encoder": FrameType.ENCODER,
+    "Power": FrameType.POWER,
+}
+
+
+def _sensor_frame_types(sensors) -> list[FrameType]:
+    """Return the frame types of some sensors, or of every sensor if None."""
+    if sensors is None:
+        sensors = SENSOR_FRAME_TYPES.keys()
+    for sensor in sensors:
+        if sensor not in SENSOR_FRAME_TYPES:
+            raise ValueError(
+                f"Unknown sensor {sensor}. Valid sensors are "
+                f"{list(SENSOR_FRAME_TYPES)}."
+            )
+    return [SENSOR_FRAME_TYPES[sensor] for sensor in sensors]
 
-        self.start_streaming()
-        plt.pause(0.5)
 
-        # Matplotlib defaults
-        mpl.rcParams["axes.prop_cycle"] = mpl.cycler(
-            color=["r", "g", "b", "c", "m", "y", "k", "tab:orange"]
+def _open_dat(filename, mmap: bool):
+    """Return the contents of a dat file, memory-mapped or read."""
+    # An empty file cannot be memory-mapped
+    if mmap and os.path.getsize(filename) > 0:
+        return np.memmap(filename, dtype=np.uint8, mode="r")
+    with open(filename, "rb") as fid:
+        return fid.read()
+
+
+def _duration_cuts(
+    stream, offsets: np.ndarray, chunk_start: int | None, duration: float
+) -> tuple[list[int], int | None]:
+    """
+    Find where to split a stream in chunks of a given duration.
+
+    Parameters
+    ----------
+    stream
+        The data stored in the dat file.
+    offsets
+        The position of its frames, as returned by _scan_frames.
+    chunk_start
+        The timestamp in us of the first frame of the current chunk, or None
+        if no chunk was started yet.
+    duration
+        The duration of each chunk, in seconds.
+
+    Returns
+    -------
+    cuts
+        The position of the first frame of each new chunk.
+    chunk_start
+        The timestamp in us of the first frame of the last chunk.
+
+    """
+    timestamps = _gather(
+        np.frombuffer(stream, dtype=np.uint8), offsets + 1, np.dtype("<u8")
+    )
+    if chunk_start is None and len(timestamps) > 0:
+        chunk_start = int(timestamps[0])
+
+    cuts = []  # type: list[int]
+    first = 0
+    while chunk_start is not None:
+        (late,) = np.nonzero(
+            timestamps[first:] >= chunk_start + duration * 1e6
         )
-        mpl.rcParams["figure.figsize"] = [10, 5]
-        mpl.rcParams["figure.dpi"] = 75
-        mpl.rcParams["lines.linewidth"] = 1
+        if len(late) == 0:
+            break
+        first += int(late[0])
+        cuts.append(int(offsets[first]))
+        chunk_start = int(timestamps[first])
+    return cuts, chunk_start
+
+
+def _build_index(filename) -> dict[str, np.ndarray]:
+    """Scan a dat file and summarize it. See index_dat."""
+    stat = os.stat(filename)
+    index = _FrameIndex.scan(_open_dat(filename, mmap=True))
+
+    # Split the file in chunks that start on a frame
+    all_offsets = np.sort(np.concatenate(list(index.offsets.values())))
+    starts = np.unique(
+        np.searchsorted(
+            all_offsets, np.arange(0, index.end, INDEX_CHUNK_SIZE)
+        )
+    )
+    chunk_offsets = np.append(
+        all_offsets[starts[starts < len(all_offsets)]], index.end
+    )
+
+    # Time range of each sensor in each chunk
+    time_min = np.full(
+        (len(chunk_offsets) - 1, len(SENSOR_FRAME_TYPES)), np.nan
+    )
+    time_max = time_min.copy()
+    for i_sensor, frame_type in enumerate(SENSOR_FRAME_TYPES.values()):
+        if len(index.offsets[frame_type]) == 0:
+            continue
+        time = index.time(frame_type)
+        chunks = (
+            np.searchsorted(
+                chunk_offsets, index.offsets[frame_type], side="right"
+            )
+            - 1
+        )
+        chunks, starts = np.unique(chunks, return_index=True)
+        time_min[chunks, i_sensor] = np.minimum.reduceat(time, starts)
+        time_max[chunks, i_sensor] = np.maximum.reduceat(time, starts)
+
+    return {
+        "version": np.array(INDEX_VERSION),
+        "size": np.array(stat.st_size),
+        "mtime_ns": np.array(stat.st_mtime_ns),
+        "chunk_offsets": chunk_offsets,
+        "time_min": time_min,
+        "time_max": time_max,
+        "config_offsets": index.offsets[FrameType.CONFIG],
+    }
+
+
+def index_dat(filename) -> dict[str, np.ndarray]:
+    """
+    Load or build the sidecar index of a dat file.
 
-        # Create figure and plots
-        fig = plt.figure(figsize=(12, 8))
-        fig.canvas.mpl_connect("close_event", on_close)
+    The index is stored next to the dat file, as filename + ".idx". It holds
+    the position of the CONFIG frames and, for chunks of about
+    INDEX_CHUNK_SIZE bytes, the position of the chunk and the time range of
+    each sensor in this chunk. It is built once, and rebuilt only if the dat
+    file's size or modification time changed. If the index cannot be saved
+    (e.g., read-only folder), it is returned without being saved.
 
-        adc_plot = plt.subplot(4, 1, 1)
-        adc_plot.set_title("ADC")
-        adc_lines = []
-        for i in range(6):
-            adc_lines.append(adc_plot.plot([])[0])
-        adc_plot.set_xlim(0, self.max_analog_samples)
-        adc_plot.set_ylim(0, 65536)
-        adc_plot.set_ylabel("Sampled value")
+    Parameters
+    ----------
+    filename
+        The name of the local dat file.
 
-        accel_plot = plt.subplot(4, 1, 2)
-        accel_plot.set_title("Accelerometers")
-        accel_lines = []
-        for i in range(3):
-            accel_lines.append(accel_plot.plot([])[0])
-        accel_plot.set_xlim(0, self.max_imu_samples)
-        accel_plot.set_ylim(-20, 20)
-        accel_plot.set_ylabel("m/s2")
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The index.
 
-        gyro_plot = plt.subplot(4, 1, 3)
-        gyro_plot.set_title("Gyrometers")
-        gyro_lines = []
-        for i in range(3):
-            gyro_lines.append(gyro_plot.plot([])[0])
-        gyro_plot.set_xlim(0, self.max_imu_samples)
-        gyro_plot.set_ylim(-1000, 1000)
-        gyro_plot.set_ylabel("Unit to be defined")
+    """
+    index_filename = f"{filename}.idx"
+    stat = os.stat(filename)
+
+    try:
+        with np.load(index_filename) as npz:
+            index = {key: npz[key] for key in npz.files}
+        if (
+            index["version"] == INDEX_VERSION
+            and index["size"] == stat.st_size
+            and index["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass  # Missing, unreadable or outdated: rebuild it.
+
+    index = _build_index(filename)
+    try:
+        with open(index_filename, "wb") as fid:
+            np.savez(fid, **index)
+    except OSError:
+        pass
+    return index
+
+
+def _read_time_range(
+    stream,
+    index: dict[str, np.ndarray],
+    t_start: float,
+    t_end: float,
+    frame_types: list[FrameType],
+) -> _FrameIndex:
+    """
+    Find the frames of a dat file in a given time range using its index.
 
-        encoder_plot = plt.subplot(4, 1, 4)
-        encoder_plot.set_title("Encoder")
-        encoder_line = encoder_plot.plot([])[0]
-        encoder_plot.set_xlim(0, self.max_encoder_samples)
-        encoder_plot.set_ylim(0, 4000)
-        encoder_plot.set_ylabel("Unit to be defined")
+    Only the chunks that may contain frames in this time range are scanned.
 
-        plt.tight_layout()
+    Parameters
+    ----------
+    stream
+        The contents of the dat file.
+    index
+        Its sidecar index, as returned by index_dat.
+    t_start, t_end
+        The time range, in seconds, inclusively.
+    frame_types
+        The data frame types to find.
 
-        def on_timer(_):
-            self._mutex.acquire()
-            adc_values = np.zeros((self.max_analog_samples, 9))
-            adc_values[-len(self._adc_values):] = np.array(self._adc_values)
+    Returns
+    -------
+    _FrameIndex
 
-            imu_values = np.zeros((self.max_imu_samples, 10))
-            imu_values[-len(self._imu_values):] = np.array(self._imu_values)
+    """
+    raw = np.frombuffer(stream, dtype=np.uint8)
+    chunk_offsets = index["chunk_offsets"]
+    columns = [
+        i_sensor
+        for i_sensor, frame_type in enumerate(SENSOR_FRAME_TYPES.values())
+        if frame_type in frame_types
+    ]
+    overlaps = (index["time_max"][:, columns] >= t_start) & (
+        index["time_min"][:, columns] <= t_end
+    )
+    chunks = np.flatnonzero(np.any(overlaps, axis=1))
+
+    # Scan each run of consecutive chunks
+    found = [np.zeros(0, dtype=np.int64)]
+    runs = np.split(chunks, np.flatnonzero(np.diff(chunks) > 1) + 1)
+    for run in runs:
+        if len(run) == 0:
+            continue
+        stop = chunk_offsets[run[-1] + 1]
+        offsets, _ = _scan_frames(raw[:stop], chunk_offsets[run[0]])
+        found.append(offsets)
+    offsets = np.concatenate(found)
+    types = raw[offsets]
+
+    frame_index = _FrameIndex(
+        raw,
+        {
+            frame_type: offsets[types == frame_type]
+            for frame_type in frame_types
+        }
+        | {FrameType.CONFIG: index["config_offsets"]},
+        end=int(chunk_offsets[-1]),
+    )
 
-            encoder_values = np.zeros((self.max_encoder_samples, 2))
-            encoder_values[-len(self._encoder_values):] = np.array(self._encoder_values) % 4000
-            self._mutex.release()
+    # Keep only the frames in the time range
+    for frame_type in frame_types:
+        time = frame_index.time(frame_type)
+        frame_index.offsets[frame_type] = frame_index.offsets[frame_type][
+            (time >= t_start) & (time <= t_end)
+        ]
+    return frame_index
 
-            try:
-                for i in range(6):
-                    adc_lines[i].set_data(
-                        range(self.max_analog_samples), adc_values[:, i + 1]
-                    )
-            except ValueError:
-                pass
 
-            try:
-                for i in range(3):
-                    accel_lines[i].set_data(
-                        range(self.max_imu_samples), imu_values[:, i + 1]
-                    )
+class DatCache:
+    """
+    On-disk cache of decoded dat files.
 
-                for i in range(3):
-                    gyro_lines[i].set_data(
-                        range(self.max_imu_samples), imu_values[:, i + 4]
+    Each decoded file is stored in its own folder of the cache directory, as
+    one .npy file per channel. A cached file is loaded by memory-mapping
+    these arrays, without reading or decoding the dat file. The entries are
+    identified by the dat file's path, size and modification time, and by
+    the decoder's calibration, timebase and dtype, so that a modified file or
+    a new calibration is decoded again. When the cache grows beyond max_size
+    bytes, the least recently used entries are deleted.
+
+    Parameters
+    ----------
+    directory
+        The cache directory. It is created if needed.
+    max_size
+        Optional. The maximal size of the cache, in bytes. The default is
+        CACHE_MAX_SIZE (4 GiB).
+
+    Exemple
+    -------
+    >>> from nextwheel import DatCache, read_dat
+    >>> cache = DatCache("~/nextwheel_cache")
+    >>> data = read_dat(filename, cache=cache)  # Decoded, then cached
+    >>> data = read_dat(filename, cache=cache)  # Memory-mapped from cache
+
+    """
+
+    def __init__(self, directory, max_size: int = CACHE_MAX_SIZE):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, filename, decoder: "DatDecoder") -> str:
+        """
+        Return the name of the entry of a dat file.
+
+        Parameters
+        ----------
+        filename
+            The name of the local dat file.
+        decoder
+            The decoder, whose calibration, timebase and dtype are part of
+            the key.
+
+        Returns
+        -------
+        str
+
+        """
+        stat = os.stat(filename)
+        digest = hashlib.sha1()
+        digest.update(
+            f"{CACHE_VERSION} {os.path.realpath(filename)} "
+            f"{stat.st_size} {stat.st_mtime_ns}".encode()
+        )
+        digest.update(np.asarray(decoder.CALIBRATION_MATRIX, float).tobytes())
+        digest.update(np.asarray(decoder.CALIBRATION_OFFSET, float).tobytes())
+        digest.update(f"{decoder.timebase} {decoder.dtype}".encode())
+        return digest.hexdigest()
+
+    def load(self, key: str) -> dict[str, dict[str, np.ndarray]] | None:
+        """
+        Memory-map a cached entry.
+
+        Parameters
+        ----------
+        key
+            The name of the entry, as returned by DatCache.key.
+
+        Returns
+        -------
+        dict[str, dict[str, np.ndarray]] | None
+            The cached data, with read-only memory-mapped arrays, or None if
+            this entry is not cached.
+
+        """
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, "channels.json"), "r") as fid:
+                channels = json.load(fid)
+            data = {}  # type: dict[str, dict[str, np.ndarray]]
+            for sensor, channel in channels:
+                data.setdefault(sensor, {})[channel] = np.load(
+                    os.path.join(path, f"{sensor}.{channel}.npy"),
+                    mmap_mode="r",
+                )
+        except (OSError, ValueError):
+            return None  # Not cached, or being evicted
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def save(self, key: str, data: dict[str, dict[str, np.ndarray]]) -> None:
+        """
+        Cache decoded data, then evict the least recently used entries.
+
+        Parameters
+        ----------
+        key
+            The name of the entry, as returned by DatCache.key.
+        data
+            A dictionary with the same structure as given by NextWheel.fetch.
+
+        """
+        # Write in a temporary folder, then rename it, so that an entry is
+        # never seen incomplete.
+        temp_path = tempfile.mkdtemp(prefix=".", dir=self.directory)
+        try:
+            channels = []
+            for sensor in data:
+                for channel, values in data[sensor].items():
+                    np.save(
+                        os.path.join(temp_path, f"{sensor}.{channel}.npy"),
+                        values,
                     )
-            except ValueError:
-                pass
+                    channels.append([sensor, channel])
+            with open(os.path.join(temp_path, "channels.json"), "w") as fid:
+                json.dump(channels, fid)
+            os.rename(temp_path, os.path.join(self.directory, key))
+        except OSError:
+            # Already cached by another process, or cache unavailable
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
 
+        self.evict(keep=key)
+
+    def evict(self, keep: str = "") -> None:
+        """
+        Delete the least recently used entries until the cache fits max_size.
+
+        Parameters
+        ----------
+        keep
+            Optional. The name of an entry that must not be deleted.
+
+        """
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
             try:
-                encoder_line.set_data(
-                    range(self.max_encoder_samples), encoder_values[:, 1]
+                size = sum(
+                    channel.stat().st_size
+                    for channel in os.scandir(entry.path)
                 )
-            except ValueError:
-                pass
+                entries.append((entry.stat().st_mtime_ns, size, entry))
+            except OSError:
+                continue  # Evicted by another process
+            total_size += size
+
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total_size <= self.max_size:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total_size -= size
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and not entry.name.startswith("."):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def read_dat(
+    filename,
+    *,
+    mmap: bool = False,
+    t_start: float | None = None,
+    t_end: float | None = None,
+    sensors=None,
+    workers: int = 1,
+    calibration: dict | str | None = None,
+    cache: "DatCache | str | None" = None,
+    timebase: str = "s",
+    dtype="float64",
+) -> dict:
+    """
+    Read a dat file downloaded from the instrumented wheel.
+
+    This is a shortcut for DatDecoder(calibration, cache=cache,
+    timebase=timebase, dtype=dtype).read_dat(filename, ...). To read many
+    files, create one DatDecoder and reuse it.
+
+    Parameters
+    ----------
+    filename, mmap, t_start, t_end, sensors, workers
+        See DatDecoder.read_dat.
+    calibration
+        Optional. The force calibration. See DatDecoder. The default is to
+        keep the raw ADC values.
+    cache
+        Optional. A DatCache, or the name of its directory. See DatDecoder.
+        The default is to decode the file without caching it.
+    timebase
+        Optional. "s" or "us". See DatDecoder. The default is "s".
+    dtype
+        Optional. A floating-point dtype or "raw". See DatDecoder. The
+        default is "float64".
+
+    Returns
+    -------
+    dict
+        A dictionary with the same structure as given by NextWheel.fetch.
+
+    """
+    decoder = DatDecoder(
+        calibration, cache=cache, timebase=timebase, dtype=dtype
+    )
+    return decoder.read_dat(
+        filename,
+        mmap=mmap,
+        t_start=t_start,
+        t_end=t_end,
+        sensors=sensors,
+        workers=workers,
+    )
+
+
+def iter_dat(
+    filename,
+    *,
+    chunk_size: int = 1 << 24,
+    duration: float | None = None,
+    sensors=None,
+    calibration: dict | str | None = None,
+    timebase: str = "s",
+    dtype="float64",
+) -> Iterator[dict]:
+    """
+    Read a dat file by chunks, with constant memory.
+
+    This is a shortcut for DatDecoder(calibration, timebase=timebase,
+    dtype=dtype).iter_dat(filename, ...).
+
+    Parameters
+    ----------
+    filename, chunk_size, duration, sensors
+        See DatDecoder.iter_dat.
+    calibration
+        Optional. The force calibration. See DatDecoder. The default is to
+        keep the raw ADC values.
+    timebase
+        Optional. "s" or "us". See DatDecoder. The default is "s".
+    dtype
+        Optional. A floating-point dtype or "raw". See DatDecoder. The
+        default is "float64".
+
+    Yields
+    ------
+    dict
+        A dictionary with the same structure as given by NextWheel.fetch.
+
+    """
+    decoder = DatDecoder(calibration, timebase=timebase, dtype=dtype)
+    return decoder.iter_dat(
+        filename, chunk_size=chunk_size, duration=duration, sensors=sensors
+    )
+
+
+def encode_frames(
+    frame_type: FrameType, timestamps: np.ndarray, payloads
+) -> np.ndarray:
+    """
+    Encode frames of one type, as written by the firmware.
+
+    Parameters
+    ----------
+    frame_type
+        The type of the frames (any type but FrameType.SUPERFRAME).
+    timestamps
+        The timestamp of each frame, in microseconds.
+    payloads
+        The payload of each frame, as a structured array of
+        PAYLOAD_DTYPES[frame_type], or a dictionary of its fields.
+
+    Returns
+    -------
+    np.ndarray
+        A structured array of frames with a "header" and a "payload" field.
+        Its bytes are the encoded frames (see np.ndarray.tobytes).
 
-        anim = animation.FuncAnimation(
-            fig,
-            on_timer,  # type: ignore
-            interval=33,
-            cache_frame_data=False,
-        )  # 30 ips
+    """
+    payload_dtype = PAYLOAD_DTYPES[frame_type]
+    frames = np.zeros(
+        len(timestamps),
+        dtype=np.dtype([("header", HEADER_DTYPE), ("payload", payload_dtype)]),
+    )
+    frames["header"]["type"] = frame_type
+    frames["header"]["timestamp"] = timestamps
+    frames["header"]["size"] = payload_dtype.itemsize
+    if isinstance(payloads, Mapping):
+        for field, values in payloads.items():
+            frames["payload"][field] = values
+    else:
+        frames["payload"] = payloads
+    return frames
+
+
+def _interleave_frames(
+    frames: list[np.ndarray], superframe_size: int = 0
+) -> np.ndarray:
+    """
+    Write frames of different types in the order of their timestamps.
 
-        while is_running[0]:
-            plt.pause(0.5)
+    Parameters
+    ----------
+    frames
+        Arrays of frames, as returned by encode_frames. Frames with the same
+        timestamp are written in the order of this list.
+    superframe_size
+        Optional. If not 0, group the frames in superframes of this number
+        of frames, as in the stream sent by the wheel.
 
-        self.stop_streaming()
+    Returns
+    -------
+    np.ndarray
+        The encoded stream, as a uint8 array.
 
-    def fetch(self) -> dict[str, dict[str, np.ndarray]]:
-        """
-        Fetch data and return a nested dictionary. Clear the buffer.
+    """
+    header_length = HEADER_DTYPE.itemsize
+    timestamps = np.concatenate(
+        [type_frames["header"]["timestamp"] for type_frames in frames]
+    )
+    sizes = np.concatenate(
+        [
+            np.full(len(type_frames), type_frames.dtype.itemsize)
+            for type_frames in frames
+        ]
+    )
+    order = np.argsort(timestamps, kind="stable")
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+
+    # Position of each frame, sorted by rank
+    positions = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(sizes[order], out=positions[1:])
+    if superframe_size > 0:
+        groups = np.arange(len(order)) // superframe_size
+        positions[:-1] += header_length * (groups + 1)
+        positions[-1] += header_length * (
+            -(-len(order) // superframe_size)
+        )
 
-        Returns
-        -------
-        data : dict[str, dict[str, np.ndarray]]
-            A dictionary of multiple dictionaries that contain latest
-            informations on:
-                - IMU values
-                - Analog values
-                - Encoder values
-                - Power values
-        """
-        self._mutex.acquire()
+    stream = np.zeros(positions[-1], dtype=np.uint8)
 
-        # Concatenate all samples in big numpy arrays
-        adc_values = np.array(self._adc_values)
-        imu_values = np.array(self._imu_values)
-        encoder_values = np.array(self._encoder_values)
-        power_values = np.array(self._power_values)
+    def write(records: np.ndarray, offsets: np.ndarray) -> None:
+        """Copy fixed-size records at arbitrary positions of stream."""
+        itemsize = records.dtype.itemsize
+        targets = np.ndarray(
+            shape=(max(len(stream) - itemsize + 1, 0),),
+            dtype=np.dtype((np.void, itemsize)),
+            buffer=stream,
+            strides=(1,),
+        )
+        targets[offsets] = records.view(np.dtype((np.void, itemsize)))
+
+    first = 0
+    for type_frames in frames:
+        stop = first + len(type_frames)
+        write(type_frames, positions[ranks[first:stop]])
+        first = stop
+
+    if superframe_size > 0:
+        starts = np.arange(0, len(order), superframe_size)
+        superframes = np.zeros(len(starts), dtype=HEADER_DTYPE)
+        superframes["type"] = FrameType.SUPERFRAME
+        superframes["timestamp"] = timestamps[order[starts]]
+        superframes["size"] = np.minimum(
+            superframe_size, len(order) - starts
+        )
+        write(superframes, positions[starts] - header_length)
+
+    return stream
+
+
+def _config_frames(config: GlobalConfig, timestamp: int) -> np.ndarray:
+    """Encode the CONFIG frame of a configuration."""
+    return encode_frames(
+        FrameType.CONFIG,
+        np.array([timestamp]),
+        {
+            "accel_range": config.accel_range,
+            "gyro_range": config.gyro_range,
+            "mag_range": config.mag_range,
+            "imu_sampling_rate": getattr(
+                config, "imu_sampling_rate", config.imu_rate
+            ),
+            "adc_sampling_rate": getattr(
+                config, "adc_sampling_rate", config.adc_rate
+            ),
+            "encoder_sampling_rate": getattr(
+                config, "encoder_sampling_rate", config.encoder_rate
+            ),
+        },
+    )
+
+
+def _imu_config(imu: Mapping, config: GlobalConfig | None) -> GlobalConfig:
+    """
+    Return the configuration of raw IMU samples, from their scales.
 
-        # Reset the buffers
-        self._adc_values = []
-        self._imu_values = []
-        self._encoder_values = []
-        self._power_values = []
+    Parameters
+    ----------
+    imu
+        The IMU dictionary of samples read with dtype="raw", with the
+        "AccScale", "GyroScale" and "MagScale" channels. Missing channels
+        are ignored.
+    config
+        Optional. The configuration given to encode_dat. The default is
+        GlobalConfig() with the ranges of the scales.
 
-        self._mutex.release()
+    Returns
+    -------
+    GlobalConfig
+        config, or a copy of GlobalConfig() with the ranges of the scales.
 
-        has_imu = len(imu_values) > 0
-        has_adc = len(adc_values) > 0
-        has_enc = len(encoder_values) > 0
-        has_pow = len(power_values) > 0
+    Raises
+    ------
+    ValueError
+        If the scales do not match config, change within the samples, or
+        match no range.
 
-        if len(adc_values) > 0:
-            adc_values[:, 1:7] = (
-                np.dot(self.CALIBRATION_MATRIX, adc_values[:, 1:7].T).T
-                - self.CALIBRATION_OFFSET
+    """
+    ranges = {
+        "accel": ("AccScale", (2, 4, 8, 16)),
+        "gyro": ("GyroScale", (125, 250, 500, 1000, 2000)),
+        "mag": ("MagScale", (2500,)),
+    }
+    derived = GlobalConfig() if config is None else copy.copy(config)
+    for field, (name, candidates) in ranges.items():
+        scales = np.unique(np.asarray(imu.get(name, [])))
+        if len(scales) == 0:
+            continue
+        if len(scales) > 1:
+            raise ValueError(
+                f"The IMU {field} range changes within the samples. Encode "
+                "each part with its configuration."
             )
+        for candidate in candidates:
+            setattr(derived, f"{field}_range", candidate)
+            scale = getattr(derived, f"convert_{field}_values")(np.ones(1))
+            if np.isclose(scale[0], scales[0]):
+                break
+        else:
+            raise ValueError(
+                f"{name} {scales[0]} does not match any {field} range."
+            )
+        if config is not None and candidate != getattr(
+            config, f"{field}_range"
+        ):
+            raise ValueError(
+                f"{name} is for a {field} range of {candidate}, but config "
+                f"has a range of {getattr(config, f'{field}_range')}."
+            )
+    return config if config is not None else derived
 
-        # Output
-        data = {
-            "IMU": {
-                "Time": imu_values[:, 0] if has_imu > 0 else np.array([]),
-                "Acc": imu_values[:, 1:4] if has_imu > 0 else np.array([]),
-                "Gyro": imu_values[:, 4:7] if has_imu > 0 else np.array([]),
-                "Mag": imu_values[:, 7:] if has_imu > 0 else np.array([]),
-            },
-            "Analog": {
-                "Time": adc_values[:, 0] if has_adc > 0 else np.array([]),
-                "Force": adc_values[:, 1:7] if has_adc > 0 else np.array([]),
-                "Spare": adc_values[:, 7:] if has_adc > 0 else np.array([]),
-            },
-            "Encoder": {
-                "Time": encoder_values[:, 0] if has_enc > 0 else np.array([]),
-                "Angle": encoder_values[:, 1] if has_enc > 0 else np.array([]),
-            },
-            "Power": {
-                "Time": power_values[:, 0] if has_pow > 0 else np.array([]),
-                "Voltage": power_values[:, 1] if has_pow > 0 else np.array([]),
-                "Current": power_values[:, 2] if has_pow > 0 else np.array([]),
-                "Power": power_values[:, 3] if has_pow > 0 else np.array([]),
-            },
-        }
 
-        return data
+def encode_dat(
+    data: Mapping,
+    *,
+    config: GlobalConfig | None = None,
+    time_zero: int = 0,
+    superframe_size: int = 0,
+    include_config: bool = True,
+) -> bytes:
+    """
+    Encode samples in the binary format of the instrumented wheel.
 
-    def set_time(self, unix_time: int) -> dict:
-        """
-        Set the time of the instrumented wheel.
+    This is the inverse of DatDecoder.read_dat without calibration: the
+    samples are either raw (as read with dtype="raw") or converted
+    (as read with the default dtype and no calibration). Converted IMU
+    values are converted back to integers using config, and the other
+    channels are rounded to the type of their payload. Raw IMU samples keep
+    their integers, and the ranges of their "AccScale", "GyroScale" and
+    "MagScale" channels are written in the CONFIG frame.
 
-        Parameters
-        ----------
-        unix_time : int
-            Unix time in seconds.
+    Parameters
+    ----------
+    data
+        A dictionary with the same structure as given by NextWheel.fetch.
+        Missing sensors or channels are written as empty or zero. The "Time"
+        channels are either float seconds or integer microseconds since
+        time_zero.
+    config
+        Optional. The configuration written in the CONFIG frame and used to
+        convert the IMU values, e.g., DatDecoder.config after reading the
+        source file. Its ranges must match the scales of raw IMU samples,
+        else a ValueError is raised. The default is GlobalConfig(), with the
+        ranges of the scales of raw IMU samples.
+    time_zero
+        Optional. The timestamp of the CONFIG frame, in microseconds. The
+        default is 0.
+    superframe_size
+        Optional. If not 0, group the frames in superframes of this number
+        of frames (at most 255), as in the stream sent by the wheel. The
+        default is 0, as in the files recorded by the wheel.
+    include_config
+        Optional. If False, do not write the CONFIG frame, e.g., to encode
+        the continuation of a recording. The default is True.
 
-        Returns
-        -------
-        requests.Response
+    Returns
+    -------
+    bytes
+        The encoded frames.
 
-        """
-        response = requests.post(
-            f"http://{self.IP}/config_set_time", params={"time": unix_time}
+    """
+    if "IMU" in data:
+        config = _imu_config(data["IMU"], config)
+    elif config is None:
+        config = GlobalConfig()
+    if not 0 <= superframe_size <= 255:
+        raise ValueError("superframe_size must be between 0 and 255.")
+
+    def timestamps(sensor: str) -> np.ndarray:
+        time = np.asarray(data[sensor]["Time"])
+        if time.dtype.kind in "iu":
+            return time.astype(np.int64) + time_zero
+        return np.round(time * 1e6).astype(np.int64) + time_zero
+
+    def channel(sensor: str, name: str, dtype, scale=None) -> np.ndarray:
+        values = np.asarray(data[sensor].get(name, 0))
+        if values.dtype.kind == "f" and np.dtype(dtype).kind in "iu":
+            if scale is not None:
+                values = values / scale
+            values = np.round(values)
+        return values.astype(dtype)
+
+    frames = []
+    if include_config:
+        frames.append(_config_frames(config, time_zero))
+
+    sensors = [
+        sensor
+        for sensor in SENSOR_FRAME_TYPES
+        if sensor in data and len(data[sensor]["Time"]) > 0
+    ]
+    if "Analog" in sensors:
+        frames.append(
+            encode_frames(
+                FrameType.ADC,
+                timestamps("Analog"),
+                {
+                    "force": channel("Analog", "Force", "<u2"),
+                    "spare": channel("Analog", "Spare", "<u2"),
+                },
+            )
+        )
+    if "IMU" in sensors:
+        frames.append(
+            encode_frames(
+                FrameType.IMU,
+                timestamps("IMU"),
+                {
+                    "accel": channel(
+                        "IMU",
+                        "Acc",
+                        "<i2",
+                        config.convert_accel_values(np.ones(1)),
+                    ),
+                    "gyro": channel(
+                        "IMU",
+                        "Gyro",
+                        "<i2",
+                        config.convert_gyro_values(np.ones(1)),
+                    ),
+                    "mag": channel(
+                        "IMU",
+                        "Mag",
+                        "<i2",
+                        config.convert_mag_values(np.ones(1)),
+                    ),
+                },
+            )
+        )
+    if "Encoder" in sensors:
+        frames.append(
+            encode_frames(
+                FrameType.ENCODER,
+                timestamps("Encoder"),
+                {"angle": channel("Encoder", "Angle", "<i8")},
+            )
+        )
+    if "Power" in sensors:
+        frames.append(
+            encode_frames(
+                FrameType.POWER,
+                timestamps("Power"),
+                {
+                    "voltage": channel("Power", "Voltage", "<f4"),
+                    "current": channel("Power", "Current", "<f4"),
+                    "power": channel("Power", "Power", "<f4"),
+                },
+            )
         )
-        return json.loads(response.content)
 
-    def set_sensors_params(
-        self,
-        adc_sampling_rate: int,
-        imu_sampling_rate: int,
-        encoder_sampling_rate: int,
-        accelerometer_precision: int,
-        gyrometer_precision: int,
-    ) -> requests.Response:
-        """
-        Set the parameters of the instrumented wheel.
+    if len(frames) == 0:
+        return b""
+    return _interleave_frames(frames, superframe_size).tobytes()
 
-        Parameters
-        ----------
-        adc_sampling_rate
-            Sampling rate for the forces in Hz. Valid values are 120, 240,
-            480, 960, 1000, 2000
-        imu_sampling_rate
-            Sampling rate for the IMU, in Hz. Valid values are 60, 120, 240.
-        encoder_sampling_rate
-            Sampling rate for the encoder, in Hz. Valid values are 60, 120, 240.
-        accelerometer_precision
-            Accelerometer range, in g. Value values are 2, 4, 8, 16.
-        gyrometer_precision
-            Gyrometer range, in degrees per second. Valid values are 250, 500,
-            1000, 2000.
 
-        Returns
-        -------
-        requests.Response
+def write_dat(
+    filename,
+    data: Mapping,
+    *,
+    config: GlobalConfig | None = None,
+    time_zero: int = 0,
+    superframe_size: int = 0,
+) -> None:
+    """
+    Write samples to a dat file, in the format recorded by the wheel.
 
-        """
-        # TODO Validate params? We assume it is verified in the ESP32 firmware
+    The file can then be read with read_dat. See encode_dat for the
+    parameters.
 
-        response = requests.post(
-            f"http://{self.IP}/config_update",
-            params={
-                "adc_sampling_rate": adc_sampling_rate,
-                "imu_sampling_rate": imu_sampling_rate,
-                "encoder_sampling_rate": encoder_sampling_rate,
-                "accelerometer_precision": accelerometer_precision,
-                "gyrometer_precision": gyrometer_precision,
-            },
+    Parameters
+    ----------
+    filename
+        The name of the dat file to write.
+    data, config, time_zero, superframe_size
+        See encode_dat.
+
+    """
+    with open(filename, "wb") as fid:
+        fid.write(
+            encode_dat(
+                data,
+                config=config,
+                time_zero=time_zero,
+                superframe_size=superframe_size,
+            )
         )
-        return response
 
-    def get_sensors_params(self) -> dict:
-        """
-        Get the parameters of the instrumented wheel sensors.
 
-        Returns
-        -------
-        dict
-            A dictionary in the form parameter:value.
+# Decoder of each worker process of read_dat_many
+_worker_decoder = None  # type: DatDecoder | None
 
-        """
-        response = requests.get(f"http://{self.IP}/config")
-        return json.loads(response.content)
+# Alignment of each array in the shared memory blocks of the worker processes
+SHARED_ALIGNMENT = 64
 
-    def get_system_state(self) -> dict:
-        """
-        Get the system state of the instrumented wheel.
+# Minimal size of the range of a dat file decoded by each worker process of
+# read_dat
+PARALLEL_MIN_SIZE = 1 << 22
 
-        Returns
-        -------
-        dict
-            A dictionary in the form parameter:value
 
-        """
-        response = requests.get(f"http://{self.IP}/system_state")
-        return json.loads(response.content)
+def _init_worker(
+    calibration: dict | str | None,
+    cache: "DatCache | str | None",
+    timebase: str,
+    dtype,
+) -> None:
+    """Create the decoder of a worker process of read_dat_many."""
+    global _worker_decoder
+    _worker_decoder = DatDecoder(
+        calibration, cache=cache, timebase=timebase, dtype=dtype
+    )
 
-    def start_recording(self) -> dict:
-        """
-        Start recording data on the instrumented wheel.
 
-        Returns
-        -------
-        dict
+def _process_pool(**kwargs) -> ProcessPoolExecutor:
+    """Create a pool of worker processes that may return shared arrays."""
+    # Share one resource tracker with the workers, so that the shared memory
+    # they create is tracked until it is freed by the main process.
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(**kwargs)
 
-        """
-        response = requests.get(f"http://{self.IP}/start_recording")
-        return json.loads(response.content)
 
-    def stop_recording(self) -> dict:
-        """
-        Stop recording data on the instrumented wheel.
+def _share_arrays(arrays: list[np.ndarray]) -> tuple[str | None, list]:
+    """
+    Copy arrays into a single new shared memory block.
 
-        Returns
-        -------
-        dict
+    Parameters
+    ----------
+    arrays
+        The arrays to share.
 
-        """
-        response = requests.get(f"http://{self.IP}/stop_recording")
-        return json.loads(response.content)
+    Returns
+    -------
+    name
+        The name of the shared memory block, or None if every array is empty.
+    layout
+        A list of (dtype, shape, offset) for each array.
 
-    def file_list(self) -> dict:
-        """
-        Get the list of files on the instrumented wheel.
+    """
+    layout = []
+    size = 0
+    for values in arrays:
+        layout.append((values.dtype, values.shape, size))
+        size += -(-values.nbytes // SHARED_ALIGNMENT) * SHARED_ALIGNMENT
 
-        Returns
-        -------
-        dict
+    if size == 0:
+        return None, layout
 
-        """
-        response = requests.get(f"http://{self.IP}/file_list")
-        return json.loads(response.content)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    for values, (dtype, shape, offset) in zip(arrays, layout):
+        target = np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+        target[...] = values
+        del target  # Release shm.buf before closing
+    shm.close()
+    return shm.name, layout
 
-    def file_download(self, filename: str, save_path: str = ".") -> int:
-        """
-        Download a file from the instrumented wheel.
 
-        Parameters
-        ----------
-        filename
-            The name of the file to download
-        save_folder
-            Optional. Where to save the file. The default is the current
-            folder.
+def _receive_arrays(name: str | None, layout: list) -> list[np.ndarray]:
+    """
+    Copy the arrays shared by _share_arrays and free the shared memory.
 
-        Returns
-        -------
-        int
-            The size of the file
+    Parameters
+    ----------
+    name, layout
+        As returned by _share_arrays.
 
-        """
-        param = {"file": filename}
-        response = requests.get(
-            f"http://{self.IP}/file_download", params=param, stream=True
-        )
-        if response.status_code == 200:
-            with open(os.path.join(save_path, filename), "wb") as f:
-                f.write(response.content)
-                # Return size...
-                return f.tell()
+    Returns
+    -------
+    list[np.ndarray]
+        The shared arrays.
 
-        # filed download
-        return 0
+    """
+    if name is None:
+        return [np.empty(shape, dtype) for dtype, shape, _ in layout]
 
-    def file_delete(self, filename: str) -> dict:
-        """
-        Delete a file from the instrumented wheel.
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return [
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=offset).copy()
+            for dtype, shape, offset in layout
+        ]
+    finally:
+        shm.close()
+        shm.unlink()
 
-        Parameters
-        ----------
-        filename
-            The name of the file to delete
 
-        Returns
-        -------
-        dict
+def _discard_shared(futures: list[Future]) -> None:
+    """
+    Cancel the pending tasks and free the memory of the unread results.
 
-        """
-        response = requests.get(
-            f"http://{self.IP}/file_delete", params={"file": filename}
-        )
-        return json.loads(response.content)
+    The result of each task must start with the name of its shared memory
+    block, as returned by _share_arrays.
+    """
+    for future in futures:
+        if not future.cancel() and future.exception() is None:
+            name = future.result()[0]
+            if name is not None:
+                shm = shared_memory.SharedMemory(name=name)
+                shm.close()
+                shm.unlink()
 
 
-def read_dat(filename) -> dict:
+def _read_dat_shared(filename, kwargs: dict) -> tuple[str | None, list, list]:
     """
-    Read a dat file downloaded from the instrumented wheel.
+    Read a dat file in a worker process of read_dat_many.
 
     Parameters
     ----------
     filename
         The name of the local file to read.
+    kwargs
+        The keyword arguments of DatDecoder.read_dat.
 
     Returns
     -------
-    dict
-        A dictionary with the same structure as given by NextWheel.fetch.
+    name, layout
+        The arrays of the data, shared using _share_arrays.
+    keys
+        The (sensor, channel) of each array.
 
     """
-    # Create a dummy wheel to parse the data
-    nw = NextWheel("0.0.0.0")
-    nw.max_analog_samples = np.Inf
-    nw.max_encoder_samples = np.Inf
-    nw.max_imu_samples = np.Inf
-    nw.max_power_samples = np.Inf
+    data = _worker_decoder.read_dat(filename, **kwargs)
+    keys = [(sensor, channel) for sensor in data for channel in data[sensor]]
+    name, layout = _share_arrays(
+        [data[sensor][channel] for sensor, channel in keys]
+    )
+    return name, layout, keys
+
+
+def _receive_data(name: str | None, layout: list, keys: list) -> dict:
+    """Rebuild the data read by _read_dat_shared."""
+    data = {}  # type: dict[str, dict[str, np.ndarray]]
+    for (sensor, channel), values in zip(keys, _receive_arrays(name, layout)):
+        data.setdefault(sensor, {})[channel] = values
+    return data
+
+
+def _decode_range(
+    filename,
+    start: int,
+    stop: int,
+    frame_types: list[FrameType],
+    timebase: str,
+) -> tuple[str | None, list, list[int], np.ndarray, np.ndarray, int]:
+    """
+    Decode a range of a dat file in a worker process of read_dat.
 
-    offset = 0
-    with open(filename, "rb") as fid:
-        stream = fid.read()
-        
-    while (new_offset := nw._parse_message(stream, offset)) > offset:
-        offset = new_offset
-        
+    The state before the range is unknown, so its frames are decoded as if
+    TIME_ZERO was 0 and the configuration was the default one until the
+    first CONFIG frame of the range. The raw IMU payloads of these first
+    frames are also returned so that read_dat can convert them with the
+    right configuration.
+
+    Parameters
+    ----------
+    filename
+        The name of the local file to read.
+    start
+        The position of the first frame of the range.
+    stop
+        The end of the range.
+    frame_types
+        The data frame types to decode.
+    timebase
+        The unit of the time. See _FrameIndex.values.
+
+    Returns
+    -------
+    name, layout
+        The ADC, IMU, encoder and power values (see DatDecoder._decode_index)
+        followed by the raw IMU payloads that precede the first CONFIG
+        frame, shared using _share_arrays.
+    heads
+        The number of ADC, IMU, encoder and power frames that precede the
+        first CONFIG frame.
+    config_timestamps, config_payloads
+        The timestamp and payload of each CONFIG frame of the range.
+    end
+        The position following the last frame of the range.
+
+    """
+    raw = _open_dat(filename, mmap=True)
+    index = _FrameIndex.scan(raw[:stop], start).select(frame_types)
+
+    value_types = [
+        FrameType.ADC,
+        FrameType.IMU,
+        FrameType.ENCODER,
+        FrameType.POWER,
+    ]
+    heads = [
+        int(np.count_nonzero(index.segments(frame_type) == 0))
+        for frame_type in value_types
+    ]
+    imu_heads = index.payload(FrameType.IMU)[: heads[1]]
+
+    name, layout = _share_arrays(
+        [index.values(frame_type, timebase) for frame_type in value_types]
+        + [imu_heads]
+    )
+    return (
+        name,
+        layout,
+        heads,
+        index.timestamps(FrameType.CONFIG),
+        index.payload(FrameType.CONFIG),
+        index.end,
+    )
+
+
+def read_dat_many(
+    filenames,
+    *,
+    workers: int | None = None,
+    ordered: bool = True,
+    t_start: float | None = None,
+    t_end: float | None = None,
+    sensors=None,
+    calibration: dict | str | None = None,
+    cache: "DatCache | str | None" = None,
+    timebase: str = "s",
+    dtype="float64",
+) -> list[dict] | Iterator[tuple[Any, dict]]:
+    """
+    Read many dat files in parallel, on a pool of processes.
+
+    Each file is decoded in a worker process by a DatDecoder that is reused
+    for every file of this worker. The decoded arrays are sent back through
+    shared memory instead of being pickled.
+
+    Parameters
+    ----------
+    filenames
+        The names of the local files to read.
+    workers
+        Optional. The number of worker processes. The default is the number
+        of processors.
+    ordered
+        Optional. If True, wait for every file and return a list of data in
+        the same order as filenames. If False, return an iterator of
+        (filename, data) in the order in which the files are decoded. The
+        default is True.
+    t_start, t_end, sensors
+        Optional. See DatDecoder.read_dat.
+    calibration
+        Optional. The force calibration. See DatDecoder. The default is to
+        keep the raw ADC values.
+    cache
+        Optional. A DatCache, or the name of its directory. See DatDecoder.
+        The default is to decode the files without caching them.
+    timebase
+        Optional. "s" or "us". See DatDecoder. The default is "s".
+    dtype
+        Optional. A floating-point dtype or "raw". See DatDecoder. The
+        default is "float64".
+
+    Returns
+    -------
+    list[dict] | Iterator[tuple[Any, dict]]
+        Each data is a dictionary with the same structure as given by
+        NextWheel.fetch.
+
+    """
+    filenames = list(filenames)
+    kwargs = {"t_start": t_start, "t_end": t_end, "sensors": sensors}
+    _sensor_frame_types(sensors)  # Fail early on invalid options
+    DatDecoder(timebase=timebase, dtype=dtype)
+
+    def read() -> Iterator[tuple[int, dict]]:
+        with _process_pool(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(calibration, cache, timebase, dtype),
+        ) as executor:
+            futures = {
+                executor.submit(_read_dat_shared, filename, kwargs): i
+                for i, filename in enumerate(filenames)
+            }
+            pending = set(futures)
+            try:
+                for future in as_completed(futures):
+                    pending.remove(future)
+                    yield futures[future], _receive_data(*future.result())
+            finally:
+                _discard_shared(list(pending))
+
+    if not ordered:
+        return ((filenames[i], data) for i, data in read())
 
-    return nw.fetch()
+    results = dict(read())
+    return [results[i] for i in range(len(filenames))]
@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2023 NextWheel Developers
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This Python module provides an asyncio client for the instrumented wheel.
+
+Unlike NextWheel, which receives the stream on a thread, AsyncNextWheel runs
+on the event loop, so that many wheels can be served by a single thread. It
+only uses the standard library: the REST API of the wheel is requested with
+plain HTTP/1.1 and the stream is received with a minimal websocket client.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import urllib.parse
+from typing import AsyncIterator
+
+import numpy as np
+import nextwheel
+
+# Ports of the REST API and of the websocket stream of the wheel
+HTTP_PORT = 80
+WEBSOCKET_PORT = 81
+
+# Time to wait for the wheel before raising asyncio.TimeoutError, in seconds
+TIMEOUT = 10.0
+
+# Websocket opcodes (RFC 6455)
+_CONTINUATION = 0x0
+_TEXT = 0x1
+_BINARY = 0x2
+_CLOSE = 0x8
+_PING = 0x9
+_PONG = 0xA
+
+# Appended to the key of the websocket handshake (RFC 6455)
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _parse_response(response: bytes) -> tuple[int, bytes]:
+    """
+    Return the status code and the body of an HTTP/1.1 response.
+
+    Parameters
+    ----------
+    response
+        The whole response, until the server closed the connection.
+
+    Returns
+    -------
+    status
+        The status code, e.g., 200.
+    body
+        The body, decoded if it was sent by chunks.
+
+    """
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        status = int(lines[0].split()[1])
+    except (IndexError, ValueError):
+        raise ConnectionError(f"Invalid HTTP response: {lines[0]}")
+
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []  # type: list[bytes]
+        while True:
+            size_line, _, body = body.partition(b"\r\n")
+            size = int(size_line.split(b";")[0], 16)
+            if size == 0:
+                break
+            chunks.append(body[:size])
+            body = body[size + 2 :]
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = body[: int(headers["content-length"])]
+    return status, body
+
+
+def _mask(payload: bytes, mask: bytes) -> bytes:
+    """Mask or unmask the payload of a websocket frame."""
+    key = np.resize(np.frombuffer(mask, dtype=np.uint8), len(payload))
+    return (np.frombuffer(payload, dtype=np.uint8) ^ key).tobytes()
+
+
+class _WebSocket:
+    """
+    Minimal websocket connection, enough to receive and relay the stream.
+
+    Use _WebSocket.connect to open a connection to a server, or
+    _WebSocket.accept to accept the connection of a client.
+
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        *,
+        client: bool = True,
+    ):
+        self._reader = reader
+        self._writer = writer
+        self._client = client
+        self.closed = False
+
+    @classmethod
+    async def connect(
+        cls,
+        host: str,
+        port: int,
+        path: str = "/",
+        *,
+        timeout: float | None = None,
+    ) -> "_WebSocket":
+        """
+        Open a websocket connection and perform the handshake.
+
+        The connection and the handshake each raise asyncio.TimeoutError
+        after timeout seconds, if timeout is not None.
+        """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n"
+                "\r\n"
+            ).encode()
+        )
+        await writer.drain()
+
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), timeout
+            )
+        except asyncio.TimeoutError:
+            writer.close()
+            raise
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        lines = head.decode("latin-1").split("\r\n")
+        if len(lines[0].split()) < 2 or lines[0].split()[1] != "101":
+            writer.close()
+            raise ConnectionError(f"Websocket handshake failed: {lines[0]}")
+        if f"sec-websocket-accept: {accept}".lower() not in (
+            line.lower() for line in lines
+        ):
+            writer.close()
+            raise ConnectionError("Websocket handshake failed: bad accept key")
+        return cls(reader, writer)
+
+    @classmethod
+    async def accept(
+        cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> "_WebSocket":
+        """Perform the handshake of a client that opened a connection."""
+        head = await reader.readuntil(b"\r\n\r\n")
+        headers = {}
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "sec-websocket-key" not in headers:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+            writer.close()
+            raise ConnectionError("Not a websocket handshake")
+
+        accept = base64.b64encode(
+            hashlib.sha1(
+                (headers["sec-websocket-key"] + _WEBSOCKET_GUID).encode()
+            ).digest()
+        ).decode()
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n"
+                "\r\n"
+            ).encode()
+        )
+        await writer.drain()
+        return cls(reader, writer, client=False)
+
+    async def _send(self, opcode: int, payload: bytes = b"") -> None:
+        """Send a frame. Frames sent by a client must be masked."""
+        length = len(payload)
+        masked = 0x80 if self._client else 0
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, masked | length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, masked | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, masked | 127, length)
+        if self._client:
+            mask = os.urandom(4)
+            self._writer.write(header + mask + _mask(payload, mask))
+        else:
+            self._writer.write(header + payload)
+        await self._writer.drain()
+
+    async def send(self, message: bytes | str) -> None:
+        """Send a message, as binary for bytes or as text for str."""
+        if isinstance(message, str):
+            await self._send(_TEXT, message.encode())
+        else:
+            await self._send(_BINARY, message)
+
+    async def receive(
+        self, timeout: float | None = None
+    ) -> bytes | str | None:
+        """
+        Receive the next message.
+
+        Pings are answered and fragmented messages are reassembled.
+
+        Parameters
+        ----------
+        timeout
+            Optional. If no message is received within this time, in
+            seconds, close the connection and raise asyncio.TimeoutError.
+            The default is None (wait forever).
+
+        Returns
+        -------
+        bytes | str | None
+            The message (bytes for binary messages, str for text messages),
+            or None if the connection was closed.
+
+        """
+        if timeout is None:
+            return await self._receive()
+        try:
+            return await asyncio.wait_for(self._receive(), timeout)
+        except asyncio.TimeoutError:
+            self.closed = True
+            self._writer.close()
+            raise
+
+    async def _receive(self) -> bytes | str | None:
+        """Receive the next message. See receive."""
+        if self.closed:
+            return None
+        message = bytearray()
+        message_opcode = _BINARY
+        try:
+            while True:
+                first, second = await self._reader.readexactly(2)
+                opcode = first & 0x0F
+                length = second & 0x7F
+                if length == 126:
+                    (length,) = struct.unpack(
+                        "!H", await self._reader.readexactly(2)
+                    )
+                elif length == 127:
+                    (length,) = struct.unpack(
+                        "!Q", await self._reader.readexactly(8)
+                    )
+                mask = None
+                if second & 0x80:
+                    mask = await self._reader.readexactly(4)
+                payload = await self._reader.readexactly(length)
+                if mask is not None:
+                    payload = _mask(payload, mask)
+
+                if opcode == _PING:
+                    await self._send(_PONG, payload)
+                    continue
+                if opcode == _PONG:
+                    continue
+                if opcode == _CLOSE:
+                    await self.close(payload[:2])
+                    return None
+
+                if opcode != _CONTINUATION:
+                    message_opcode = opcode
+                    message = bytearray()
+                message += payload
+                if first & 0x80:  # Final fragment
+                    if message_opcode == _TEXT:
+                        return message.decode()
+                    return bytes(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            self._writer.close()
+            return None
+
+    async def close(self, code: bytes = struct.pack("!H", 1000)) -> None:
+        """Close the connection."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send(_CLOSE, code)
+        except ConnectionError:
+            pass
+        self._writer.close()
+
+
+class AsyncNextWheel(nextwheel.DatDecoder):
+    """
+    Asyncio client of the instrumented wheel.
+
+    This class offers the REST methods of NextWheel as coroutines, and
+    receives the stream with an async iterator instead of a thread, so that
+    many wheels can be served by a single event loop.
+
+    Parameters
+    ----------
+    IP
+        The IP address of the instrumented wheel.
+    calibration
+        Optional. The force calibration. See DatDecoder. The default is to
+        keep the raw ADC values; use load_calibration to download the
+        calibration of the wheel.
+    timebase, dtype
+        Optional. See DatDecoder.
+    http_port, websocket_port
+        Optional. The ports of the REST API and of the stream. The defaults
+        are 80 and 81.
+    timeout
+        Optional. The time to wait for the wheel, in seconds, before raising
+        asyncio.TimeoutError: to connect, between two reads of a response
+        of the REST API, and between two messages of the stream. None
+        waits forever. The default is 10.
+
+    Exemple
+    -------
+    >>> from nextwheel.aio import AsyncNextWheel
+
+    >>> async def main():
+    ...     wheel = AsyncNextWheel("xx.xx.xx.xx")
+    ...     await wheel.load_calibration()
+    ...     async for data in wheel.stream(sensors=["Analog"]):
+    ...         print(data["Analog"]["Force"][-1])
+
+    """
+
+    def __init__(
+        self,
+        IP: str,
+        calibration: dict | str | None = None,
+        *,
+        timebase: str = "s",
+        dtype="float64",
+        http_port: int = HTTP_PORT,
+        websocket_port: int = WEBSOCKET_PORT,
+        timeout: float | None = TIMEOUT,
+    ):
+        super().__init__(calibration, timebase=timebase, dtype=dtype)
+        self.IP = IP
+        self.http_port = http_port
+        self.websocket_port = websocket_port
+        self.timeout = timeout
+
+    async def _request(
+        self, method: str, path: str, params: dict | None = None
+    ) -> tuple[int, bytes]:
+        """
+        Send a request to the REST API of the wheel.
+
+        Parameters
+        ----------
+        method
+            "GET" or "POST".
+        path
+            The path of the request, e.g., "/file_list".
+        params
+            Optional. The parameters passed in the query string.
+
+        Returns
+        -------
+        status
+            The status code of the response.
+        body
+            The body of the response.
+
+        """
+        if params:
+            path += "?" + urllib.parse.urlencode(params)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.IP, self.http_port), self.timeout
+        )
+        try:
+            writer.write(
+                (
+                    f"{method} {path} HTTP/1.1\r\n"
+                    f"Host: {self.IP}\r\n"
+                    "Connection: close\r\n"
+                    "Content-Length: 0\r\n"
+                    "\r\n"
+                ).encode()
+            )
+            await writer.drain()
+            # Read by blocks, so that a long download does not time out
+            # as long as the wheel keeps sending
+            blocks = []  # type: list[bytes]
+            while block := await asyncio.wait_for(
+                reader.read(1 << 16), self.timeout
+            ):
+                blocks.append(block)
+        finally:
+            writer.close()
+        return _parse_response(b"".join(blocks))
+
+    async def _get_json(self, path: str, params: dict | None = None) -> dict:
+        """Send a GET request and decode its json response."""
+        _, body = await self._request("GET", path, params)
+        return json.loads(body)
+
+    async def set_time(self, unix_time: int) -> dict:
+        """
+        Set the time of the instrumented wheel.
+
+        Parameters
+        ----------
+        unix_time : int
+            Unix time in seconds.
+
+        Returns
+        -------
+        dict
+
+        """
+        _, body = await self._request(
+            "POST", "/config_set_time", {"time": unix_time}
+        )
+        return json.loads(body)
+
+    async def set_sensors_params(
+        self,
+        adc_sampling_rate: int,
+        imu_sampling_rate: int,
+        encoder_sampling_rate: int,
+        accelerometer_precision: int,
+        gyrometer_precision: int,
+    ) -> int:
+        """
+        Set the parameters of the instrumented wheel.
+
+        Parameters
+        ----------
+        adc_sampling_rate, imu_sampling_rate, encoder_sampling_rate,
+        accelerometer_precision, gyrometer_precision
+            See NextWheel.set_sensors_params.
+
+        Returns
+        -------
+        int
+            The status code of the response.
+
+        """
+        status, _ = await self._request(
+            "POST",
+            "/config_update",
+            {
+                "adc_sampling_rate": adc_sampling_rate,
+                "imu_sampling_rate": imu_sampling_rate,
+                "encoder_sampling_rate": encoder_sampling_rate,
+                "accelerometer_precision": accelerometer_precision,
+                "gyrometer_precision": gyrometer_precision,
+            },
+        )
+        return status
+
+    async def get_sensors_params(self) -> dict:
+        """Get the parameters of the instrumented wheel sensors."""
+        return await self._get_json("/config")
+
+    async def get_system_state(self) -> dict:
+        """Get the system state of the instrumented wheel."""
+        return await self._get_json("/system_state")
+
+    async def start_recording(self) -> dict:
+        """Start recording data on the instrumented wheel."""
+        return await self._get_json("/start_recording")
+
+    async def stop_recording(self) -> dict:
+        """Stop recording data on the instrumented wheel."""
+        return await self._get_json("/stop_recording")
+
+    async def file_list(self) -> dict:
+        """Get the list of files on the instrumented wheel."""
+        return await self._get_json("/file_list")
+
+    async def file_delete(self, filename: str) -> dict:
+        """Delete a file from the instrumented wheel."""
+        return await self._get_json("/file_delete", {"file": filename})
+
+    async def file_download(self, filename: str, save_path: str = ".") -> int:
+        """
+        Download a file from the instrumented wheel.
+
+        Parameters
+        ----------
+        filename
+            The name of the file to download
+        save_path
+            Optional. Where to save the file. The default is the current
+            folder.
+
+        Returns
+        -------
+        int
+            The size of the file, or 0 if the download failed.
+
+        """
+        status, body = await self._request(
+            "GET", "/file_download", {"file": filename}
+        )
+        if status != 200:
+            return 0
+        with open(os.path.join(save_path, filename), "wb") as f:
+            f.write(body)
+        return len(body)
+
+    async def load_calibration(self) -> bool:
+        """
+        Download and use the force calibration of the instrumented wheel.
+
+        Returns
+        -------
+        bool
+            True if the calibration was found, False if the raw ADC values
+            are kept.
+
+        """
+        try:
+            status, body = await self._request(
+                "GET", "/file_download", {"file": "Calibration.json"}
+            )
+            if status != 200:
+                return False
+            calibration = json.loads(body)
+            matrix = np.array(calibration["Matrix"])
+            offset = np.array(calibration["Offset"])
+        except (OSError, ValueError, KeyError, asyncio.TimeoutError):
+            return False
+        self.CALIBRATION = calibration
+        self.CALIBRATION_MATRIX = matrix
+        self.CALIBRATION_OFFSET = offset
+        return True
+
+    async def stream(
+        self, sensors=None
+    ) -> AsyncIterator[dict[str, dict[str, np.ndarray]]]:
+        """
+        Receive the stream of the instrumented wheel.
+
+        Each websocket message is decoded in bulk as it is received. The
+        connection is closed when the iteration stops.
+
+        Parameters
+        ----------
+        sensors
+            Optional. The sensors to decode, among "IMU", "Analog",
+            "Encoder" and "Power". The frames of the other sensors are
+            skipped. The default is every sensor.
+
+        Yields
+        ------
+        dict[str, dict[str, np.ndarray]]
+            The samples of each message that holds samples of the requested
+            sensors, with the same structure as given by NextWheel.fetch,
+            restricted to these sensors, in the timebase and dtype of the
+            decoder.
+
+        """
+        if sensors is None:
+            sensors = list(nextwheel.SENSOR_FRAME_TYPES)
+        frame_types = nextwheel._sensor_frame_types(sensors)
+
+        websocket = await _WebSocket.connect(
+            self.IP, self.websocket_port, timeout=self.timeout
+        )
+        try:
+            while True:
+                message = await websocket.receive(self.timeout)
+                if message is None:
+                    return
+                if type(message) is not bytes:
+                    continue
+
+                # Skip the corrupted frames, as NextWheel does
+                index = nextwheel._FrameIndex.scan(
+                    message,
+                    0,
+                    self.TIME_ZERO,
+                    self._config,
+                    skip_invalid=True,
+                )
+                data = self._format_index(index, frame_types)
+                if all(len(data[sensor]["Time"]) == 0 for sensor in sensors):
+                    continue
+                yield {sensor: data[sensor] for sensor in sensors}
+        finally:
+            await websocket.close()
@@ -59,8 +59,6 @@ def _gui_app(conn, cwd: str):
 
 def monitor(nw):
     """Implement NextWheel.monitor(). nw is the class instance."""
-    data = nw.fetch()  # Non-updated data: show the last data.
-
     parent_conn, child_conn = mp.Pipe()
     p = mp.Process(target=_gui_app, args=(child_conn, os.getcwd()))
     p.start()
@@ -98,8 +96,8 @@ def monitor(nw):
         #     else:
         #         text += f"    Recording to {current_state['filename']}\n"
 
-        # Get data
-        data = nw.fetch()
+        # Get data, without taking it from the other consumers
+        data = nw.latest()
 
         try:
             voltage = data["Power"]["Voltage"][-1]
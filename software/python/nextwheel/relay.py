@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2023 NextWheel Developers
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This Python module provides a relay that shares the stream of a wheel.
+
+The wheel serves few websocket clients, over a limited Wi-Fi bandwidth. The
+relay holds a single connection to the wheel and sends the same messages to
+any number of local clients, over a websocket on localhost or on a Unix
+socket. Point NextWheel to the relay with NextWheel(IP, relay=...).
+
+To run a relay from the command line:
+
+    python -m nextwheel.relay xx.xx.xx.xx --port 8081
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+
+import nextwheel
+from nextwheel.aio import TIMEOUT, WEBSOCKET_PORT, _WebSocket
+
+# Default port of the relay on localhost
+RELAY_PORT = 8081
+
+
+class Relay:
+    """
+    Share the stream of a wheel with any number of local clients.
+
+    The connection to the wheel is opened when the first client connects,
+    and closed when the last one disconnects. Each message is queued for
+    each client, so that a slow client never delays the others. When the
+    queue of a client is full, the new messages are dropped for this client
+    and counted. The last CONFIG frame received is sent first to the new
+    clients, so that they get the time zero and the configuration of the
+    stream.
+
+    When the wheel sends nothing for timeout seconds, or closes the
+    connection, the relay reconnects to it. The clients are told with a text
+    message, {"event": "timeout"} or {"event": "disconnected"}, and then
+    {"event": "connected"} once the connection is back. NextWheel and
+    AsyncNextWheel ignore these text messages.
+
+    Parameters
+    ----------
+    IP
+        The IP address of the instrumented wheel.
+    port
+        Optional. Serve the clients on this port of localhost, or not on a
+        port if None. The default is RELAY_PORT.
+    path
+        Optional. Also serve the clients on a Unix socket at this path, where
+        Unix sockets are available (not on Windows). The default is None.
+    websocket_port
+        Optional. The port of the stream of the wheel. The default is 81.
+    queue_size
+        Optional. The number of messages queued for each client. The default
+        is 1000.
+    reconnect_delay
+        Optional. The time to wait before reconnecting to the wheel after an
+        error, in seconds. The default is 1.
+    timeout
+        Optional. Reconnect to the wheel when connecting or waiting for a
+        message takes longer than this time, in seconds, or never if None.
+        The default is nextwheel.aio.TIMEOUT.
+
+    Attributes
+    ----------
+    clients
+        The number of clients connected.
+    messages
+        The number of messages received from the wheel.
+    dropped
+        The number of messages dropped for slow clients.
+
+    Exemple
+    -------
+    >>> from nextwheel.relay import Relay
+    >>> Relay("xx.xx.xx.xx", path="/tmp/nextwheel.sock").run()
+
+    """
+
+    def __init__(
+        self,
+        IP: str,
+        *,
+        port: int | None = RELAY_PORT,
+        path: str | None = None,
+        websocket_port: int = WEBSOCKET_PORT,
+        queue_size: int = 1000,
+        reconnect_delay: float = 1.0,
+        timeout: float | None = TIMEOUT,
+    ):
+        self.IP = IP
+        self.port = port
+        self.path = path
+        self.websocket_port = websocket_port
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+
+        self.messages = 0
+        self.dropped = 0
+        self._queues = set()  # type: set[asyncio.Queue]
+        self._upstream = None  # type: asyncio.Task | None
+        self._config_frame = None  # type: bytes | None
+
+    @property
+    def clients(self) -> int:
+        """The number of clients connected."""
+        return len(self._queues)
+
+    def run(self) -> None:
+        """Run the relay until interrupted."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self) -> None:
+        """Serve the clients until cancelled."""
+        servers = []
+        if self.port is not None:
+            servers.append(
+                await asyncio.start_server(
+                    self._serve_client, "127.0.0.1", self.port
+                )
+            )
+        if self.path is not None and not hasattr(socket, "AF_UNIX"):
+            raise ValueError(
+                "Unix sockets are not available on this platform. Serve the "
+                "clients on a port instead."
+            )
+        if self.path is not None:
+            servers.append(
+                await asyncio.start_unix_server(self._serve_client, self.path)
+            )
+        try:
+            await asyncio.gather(
+                *[server.serve_forever() for server in servers]
+            )
+        finally:
+            for server in servers:
+                server.close()
+            if self._upstream is not None:
+                self._upstream.cancel()
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    async def _relay(self) -> None:
+        """Receive the messages of the wheel and queue them for each client."""
+        while True:
+            try:
+                websocket = await _WebSocket.connect(
+                    self.IP, self.websocket_port, timeout=self.timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._notify("connected")
+            event = "disconnected"
+            try:
+                while (
+                    message := await websocket.receive(self.timeout)
+                ) is not None:
+                    self.messages += 1
+                    if isinstance(message, bytes):
+                        self._keep_config(message)
+                    self._queue(message)
+            except asyncio.TimeoutError:
+                event = "timeout"
+            finally:
+                await websocket.close()
+            self._notify(event)
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _queue(self, message: bytes | str) -> None:
+        """Queue a message for each client, or count it as dropped."""
+        for messages in self._queues:
+            try:
+                messages.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def _notify(self, event: str) -> None:
+        """Tell the clients about the connection to the wheel."""
+        self._queue(json.dumps({"event": event}))
+
+    def _keep_config(self, message: bytes) -> None:
+        """Keep the last CONFIG frame of a message, if any."""
+        index = nextwheel._FrameIndex.scan(message, skip_invalid=True)
+        offsets = index.offsets[nextwheel.FrameType.CONFIG]
+        if len(offsets) > 0:
+            offset = int(offsets[-1])
+            size = nextwheel.HEADER_DTYPE.itemsize + message[offset + 9]
+            self._config_frame = message[offset : offset + size]
+
+    async def _serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Send the messages of the wheel to a client, until it leaves."""
+        try:
+            websocket = await _WebSocket.accept(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+
+        messages = asyncio.Queue(self.queue_size)  # type: asyncio.Queue
+        if self._config_frame is not None:
+            messages.put_nowait(self._config_frame)
+        self._queues.add(messages)
+        if self._upstream is None or self._upstream.done():
+            self._upstream = asyncio.ensure_future(self._relay())
+
+        sender = asyncio.ensure_future(self._send(websocket, messages))
+        try:
+            # Answer the pings and wait for the client to close
+            while await websocket.receive() is not None:
+                pass
+        finally:
+            self._queues.discard(messages)
+            sender.cancel()
+            await websocket.close()
+            if len(self._queues) == 0 and self._upstream is not None:
+                self._upstream.cancel()
+                self._upstream = None
+
+    async def _send(
+        self, websocket: _WebSocket, messages: asyncio.Queue
+    ) -> None:
+        """Send the queued messages to a client."""
+        try:
+            while True:
+                await websocket.send(await messages.get())
+        except ConnectionError:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Share the stream of a wheel with local clients."
+    )
+    parser.add_argument("IP", help="IP address of the wheel")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=RELAY_PORT,
+        help=f"port of the relay on localhost (default {RELAY_PORT})",
+    )
+    parser.add_argument("--path", help="path of an additional Unix socket")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=TIMEOUT,
+        help=(
+            "reconnect when the wheel sends nothing for this time, in "
+            f"seconds (default {TIMEOUT})"
+        ),
+    )
+    args = parser.parse_args()
+    Relay(
+        args.IP, port=args.port, path=args.path, timeout=args.timeout
+    ).run()
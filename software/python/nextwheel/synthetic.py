@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2023 NextWheel Developers
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This Python module generates synthetic recordings of the instrumented wheel.
+
+The recordings have the same binary format as the files recorded by the
+wheel, so that they can be used to test and benchmark the readers without a
+wheel.
+"""
+
+import numpy as np
+import nextwheel
+
+# Duration of the samples generated and written at once, in seconds.
+CHUNK_DURATION = 10.0
+
+
+def _sample_times(
+    rate: float, start: float, stop: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the samples of a sensor in a time range.
+
+    Parameters
+    ----------
+    rate
+        The sampling rate, in Hz.
+    start, stop
+        The time range, in seconds. The start is included.
+
+    Returns
+    -------
+    time
+        The time of each sample, in seconds.
+    timestamps
+        The time of each sample, in integer microseconds.
+
+    """
+    if rate <= 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    samples = np.arange(np.ceil(start * rate), np.ceil(stop * rate))
+    timestamps = np.round(samples * 1e6 / rate).astype(np.int64)
+    return timestamps / 1e6, timestamps
+
+
+def generate_chunk(
+    start: float,
+    stop: float,
+    config: nextwheel.GlobalConfig,
+    rng: np.random.Generator,
+    *,
+    adc_rate: float,
+    imu_rate: float,
+    encoder_rate: float,
+    power_rate: float,
+) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Generate the raw samples of a wheel that rolls at constant speed.
+
+    Parameters
+    ----------
+    start, stop
+        The time range to generate, in seconds.
+    config
+        The configuration, used to express the IMU values in raw integers.
+    rng
+        The random number generator used for the noise.
+    adc_rate, imu_rate, encoder_rate, power_rate
+        The sampling rate of each sensor, in Hz.
+
+    Returns
+    -------
+    dict[str, dict[str, np.ndarray]]
+        The samples, in the raw format of read_dat(dtype="raw") with
+        timebase="us".
+
+    """
+    speed = 2 * np.pi * 0.5  # Wheel angular speed, in rad/s
+
+    # Forces and moments: one cycle per revolution, around mid-range
+    time, timestamps = _sample_times(adc_rate, start, stop)
+    phases = np.arange(6) * np.pi / 3
+    forces = 32768 + 8000 * np.sin(speed * time[:, np.newaxis] + phases)
+    forces += rng.normal(0, 50, forces.shape)
+    analog = {
+        "Time": timestamps,
+        "Force": np.clip(np.round(forces), 0, 65535).astype(np.uint16),
+        "Spare": np.zeros((len(time), 2), dtype=np.uint16),
+    }
+
+    # IMU: gravity rotates in the wheel plane, constant angular velocity
+    time, timestamps = _sample_times(imu_rate, start, stop)
+    n_imu = len(time)
+    acc = np.zeros((n_imu, 3))
+    acc[:, 0] = nextwheel.GRAVITY * np.sin(speed * time)
+    acc[:, 1] = nextwheel.GRAVITY * np.cos(speed * time)
+    gyro = np.zeros((n_imu, 3))
+    gyro[:, 2] = np.degrees(speed)
+    mag = np.zeros((n_imu, 3))
+    mag[:, 0] = 20 * np.cos(speed * time)
+    mag[:, 1] = -20 * np.sin(speed * time)
+    mag[:, 2] = 40
+
+    def to_int16(values: np.ndarray, convert) -> np.ndarray:
+        values = values / convert(np.ones(1))
+        values += rng.normal(0, 2, values.shape)
+        return np.clip(np.round(values), -32768, 32767).astype(np.int16)
+
+    imu = {
+        "Time": timestamps,
+        "Acc": to_int16(acc, config.convert_accel_values),
+        "Gyro": to_int16(gyro, config.convert_gyro_values),
+        "Mag": to_int16(mag, config.convert_mag_values),
+    }
+
+    # Encoder: 4000 counts per revolution
+    time, timestamps = _sample_times(encoder_rate, start, stop)
+    encoder = {
+        "Time": timestamps,
+        "Angle": np.round(4000 * speed * time / (2 * np.pi)).astype(
+            np.int64
+        ),
+    }
+
+    # Power: slowly discharging battery
+    time, timestamps = _sample_times(power_rate, start, stop)
+    voltage = (12.6 - 1e-4 * time).astype(np.float32)
+    current = (0.5 + 0.01 * rng.standard_normal(len(time))).astype(
+        np.float32
+    )
+    power = {
+        "Time": timestamps,
+        "Voltage": voltage,
+        "Current": current,
+        "Power": voltage * current,
+    }
+
+    return {"IMU": imu, "Analog": analog, "Encoder": encoder, "Power": power}
+
+
+def generate_dat(
+    filename,
+    duration: float,
+    *,
+    adc_rate: float = 2000,
+    imu_rate: float = 240,
+    encoder_rate: float = 240,
+    power_rate: float = 1,
+    superframe_size: int = 0,
+    time_zero: int = 1_700_000_000_000_000,
+    seed: int | None = None,
+) -> None:
+    """
+    Write a synthetic recording of a wheel that rolls at constant speed.
+
+    The recording is generated and written by chunks of CHUNK_DURATION
+    seconds, so that recordings larger than memory can be generated.
+
+    Parameters
+    ----------
+    filename
+        The name of the dat file to write.
+    duration
+        The duration of the recording, in seconds.
+    adc_rate, imu_rate, encoder_rate, power_rate
+        Optional. The sampling rate of each sensor, in Hz. Use 0 to omit a
+        sensor. The defaults are 2000, 240, 240 and 1.
+    superframe_size
+        Optional. If not 0, group the frames in superframes of this number of
+        frames, as in the stream sent by the wheel. The default is 0, as in
+        the files recorded by the wheel.
+    time_zero
+        Optional. The timestamp of the CONFIG frame that starts the
+        recording, in microseconds. The default is in November 2023.
+    seed
+        Optional. The seed of the noise, for reproducible recordings. The
+        default is to use a random seed.
+
+    Exemple
+    -------
+    >>> from nextwheel.synthetic import generate_dat
+    >>> generate_dat("synthetic.dat", 3600)  # One hour, about 230 MB
+
+    """
+    rng = np.random.default_rng(seed)
+    config = nextwheel.GlobalConfig()
+    config.imu_sampling_rate = round(imu_rate)
+    config.adc_sampling_rate = round(adc_rate)
+    config.encoder_sampling_rate = round(encoder_rate)
+
+    with open(filename, "wb") as fid:
+        start = 0.0
+        include_config = True
+        while include_config or start < duration:
+            stop = min(start + CHUNK_DURATION, duration)
+            data = generate_chunk(
+                start,
+                stop,
+                config,
+                rng,
+                adc_rate=adc_rate,
+                imu_rate=imu_rate,
+                encoder_rate=encoder_rate,
+                power_rate=power_rate,
+            )
+            fid.write(
+                nextwheel.encode_dat(
+                    data,
+                    config=config,
+                    time_zero=time_zero,
+                    superframe_size=superframe_size,
+                    include_config=include_config,
+                )
+            )
+            include_config = False
+            start = stop
@@ -0,0 +1,49 @@
+"""Tests of the memory used by read_dat on memory-mapped files."""
+
+import os
+import tracemalloc
+
+import pytest
+
+import nextwheel
+from nextwheel.synthetic import generate_dat
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    """A synthetic recording of about 4 MB."""
+    filename = str(tmp_path_factory.mktemp("dat") / "recording.dat")
+    generate_dat(filename, 60, adc_rate=2000, seed=0)
+    return filename
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    """Scan and decode by blocks that are small relative to the file."""
+    monkeypatch.setattr(nextwheel, "SCAN_RANGE_SIZE", 1 << 19)
+    monkeypatch.setattr(nextwheel, "DECODE_BLOCK_FRAMES", 1 << 11)
+
+
+def test_mmap_index_is_small(recording, small_blocks):
+    tracemalloc.start()
+    try:
+        data = nextwheel.read_dat(recording, mmap=True)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(data["Analog"]["Time"]) > 0
+    assert peak < 0.5 * os.path.getsize(recording)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_mmap_channel_is_decoded_in_place(recording, small_blocks, dtype):
+    data = nextwheel.read_dat(recording, mmap=True, dtype=dtype)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        forces = data["Analog"]["Force"]
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    assert forces.dtype == dtype
+    assert peak < 1.2 * forces.nbytes
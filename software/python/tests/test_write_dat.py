@@ -0,0 +1,56 @@
+"""Tests of encode_dat and write_dat."""
+
+import numpy as np
+import pytest
+
+import nextwheel
+from nextwheel import DatDecoder, GlobalConfig, encode_dat, write_dat
+
+
+def _imu_data(n: int = 100) -> dict:
+    """Return raw IMU samples at 240 Hz."""
+    rng = np.random.default_rng(0)
+    return {
+        "IMU": {
+            "Time": np.arange(n, dtype=np.int64) * 4167,
+            "Acc": rng.integers(-30000, 30000, (n, 3), dtype=np.int16),
+            "Gyro": rng.integers(-30000, 30000, (n, 3), dtype=np.int16),
+            "Mag": rng.integers(-3000, 3000, (n, 3), dtype=np.int16),
+        }
+    }
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A dat file with non-default accelerometer and gyroscope ranges."""
+    config = GlobalConfig()
+    config.accel_range = 4
+    config.gyro_range = 500
+    filename = tmp_path / "source.dat"
+    write_dat(filename, _imu_data(), config=config)
+    return filename
+
+
+@pytest.mark.parametrize("pass_config", [False, True])
+def test_raw_round_trip_keeps_ranges(source, tmp_path, pass_config):
+    decoder = DatDecoder(dtype="raw", timebase="us")
+    raw = decoder.read_dat(source, t_start=0.1)
+    assert decoder.config.accel_range == 4
+    assert decoder.config.gyro_range == 500
+
+    cropped = tmp_path / "cropped.dat"
+    config = decoder.config if pass_config else None
+    write_dat(cropped, raw, config=config)
+
+    expected = nextwheel.read_dat(source, t_start=0.1, timebase="us")
+    data = nextwheel.read_dat(cropped, timebase="us")
+    for channel in ("Time", "Acc", "Gyro", "Mag"):
+        np.testing.assert_array_equal(
+            data["IMU"][channel], expected["IMU"][channel]
+        )
+
+
+def test_raw_scales_must_match_config(source):
+    raw = nextwheel.read_dat(source, dtype="raw")
+    with pytest.raises(ValueError, match="AccScale"):
+        encode_dat(raw, config=GlobalConfig())